@@ -6,7 +6,7 @@ import geopandas as gpd
 
 from folium import plugins
 import streamlit as st
-from shiny import App, ui, render, reactive
+from shiny import App, ui, render, reactive, run_app
 from shiny.types import FileInfo
 import asyncio
 from pathlib import Path
@@ -14,13 +14,21 @@ import numpy as np
 from typing import List, Dict, Optional, Tuple
 import json
 from shinywidgets import render_widget, output_widget
-from folium.plugins import Draw
-from utils.functions import get_display_data, create_folium_map, create_trends_plot, create_contribution_choropleth, create_summary_dataframe, create_article_plot, create_top_trends_plot, create_empty_plot, create_gdp_plot, create_researchers_plot, create_cs_expansion_plot, create_china_us_dual_axis_plot
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from utils.data_store import get_data_store
+from utils.geometry import get_geometry_registry
+from utils.tiles import TILES_URL, create_tile_app, get_tile_store
+from utils.topology import TOPOLOGY_DIR, TOPOLOGY_URL, choropleth_geojson_url, create_boundaries_app
+from utils.functions import TRENDS_PLOT_COLUMNS, SUMMARY_COLUMNS, get_display_data, get_contribution_averages, get_top_trends_data, render_map_html, changed_map_selection, get_map_selection_updates, resolve_map_click, resolve_map_area, create_trends_plot, create_contribution_choropleth, get_summary_data, create_article_plot, create_top_trends_plot, create_empty_plot, create_gdp_plot, create_researchers_plot, create_cs_expansion_plot, create_china_us_dual_axis_plot
 import functools
 from functools import lru_cache
 
-# Global cache for expensive operations
-@lru_cache(maxsize=128)
+# Columns of the display data used by the trends plot and summary table
+DISPLAY_COLUMNS = TRENDS_PLOT_COLUMNS + SUMMARY_COLUMNS
+
+# Global cache for expensive operations (entries only hold DISPLAY_COLUMNS)
+@lru_cache(maxsize=256)
 def cached_get_display_data(
     selected_isos_tuple: tuple,
     year_range: tuple,
@@ -32,57 +40,21 @@ def cached_get_display_data(
     # Convert back to list for compatibility
     selected_isos = list(selected_isos_tuple) if selected_isos_tuple else []
     
-    # Only load data when actually needed
-    df = pd.read_parquet("./data/data.parquet")
-    country_list = load_country_list()
-    
     return get_display_data(
-        df=df,
+        store=get_data_store(),
         selected_isos=selected_isos,
         year_range=year_range,
         chemical_category=chemical_category,
         display_mode=display_mode,
         region_filter=region_filter,
-        country_list=country_list
-    )
-
-@lru_cache(maxsize=1)
-def load_country_list():
-    """Cached country list loading"""
-    df = pd.read_parquet("./data/data.parquet")
-    return (
-        df[df['is_collab'] == False]
-        .drop_duplicates(subset=['country', 'iso2c', 'lat', 'lng', 'cc', 'region'])
-        .dropna(subset=['country', 'iso2c'])
-        .query("country != '' and iso2c != ''")
-        .fillna({'region': 'Other'})
-        .sort_values('country')
-        .reset_index(drop=True)
+        columns=DISPLAY_COLUMNS
     )
 
 # Main application
 def create_app():
-    # Load minimal data for UI initialization only
+    # Load the shared data store once; every render function reuses it
     try:
-        # Only read metadata for UI, not full dataset
-        df_sample = pd.read_parquet("./data/data.parquet", columns=['chemical', 'year', 'region'])
-        
-        unique_chemicals = df_sample['chemical'].dropna().unique().tolist()
-        chemical_categories = sorted([chem for chem in unique_chemicals if chem and str(chem).strip()])
-        chemical_categories = list(dict.fromkeys(chemical_categories))
-
-        unique_regions = df_sample['region'].fillna('Other').unique().tolist()
-        regions = ['All'] + sorted(list(set(region for region in unique_regions if region and str(region).strip() and region != 'All')))
-        
-        min_year = int(df_sample['year'].min())
-        max_year = int(df_sample['year'].max())
-        
-        initial_data = {
-            'chemical_categories': chemical_categories,
-            'regions': regions,
-            'min_year': min_year,
-            'max_year': max_year
-        }
+        initial_data = get_data_store().ui_metadata()
         
     except Exception as e:
         print(f"Error loading initial data for UI: {e}")
@@ -93,6 +65,12 @@ def create_app():
             'max_year': 2022
         }
 
+    # Load the country boundaries once too, before the first map needs them
+    try:
+        get_geometry_registry()
+    except Exception as e:
+        print(f"Error loading country boundaries: {e}")
+
     app_ui = ui.page_navbar(
                 ui.nav_panel(
                     "Dashboard", 
@@ -219,7 +197,9 @@ def create_app():
                                 ui.card_header("Interactive Map & Selection"),
                                 ui.row(
                                     ui.column(9,
-                                        ui.output_ui("map_output")
+                                        ui.output_ui("map_output"),
+                                        # Applies selection updates to the rendered map
+                                        ui.head_content(ui.tags.script(src="map_selection.js"))
                                     ),
                                     ui.column(3,
                                         ui.div(
@@ -269,7 +249,10 @@ def create_app():
                                         "This plot shows the global or regional snapshot of the chemical space contributions by countries, highlighting the average contributions based on the year range selected (defaults to 1996-2022).",
                                         style="font-size: 0.9em; color: #666; text-align: center;"
                                     ), 
-                                    output_widget("contribution_map")
+                                    output_widget("contribution_map"),
+                                    # Keeps plotly.js from downloading its world map when the
+                                    # choropleths are drawn from the local GeoJSON
+                                    *([ui.head_content(ui.tags.script(src="plotly_geo_assets.js"))] if choropleth_geojson_url() else [])
                                     ),
                                 ui.nav_panel("📋 Data Table", ui.output_data_frame("summary_table"))
                             )
@@ -337,15 +320,15 @@ def create_app():
 
 
     def server(input, output, session):
+        # Shared, already-loaded data store injected into every render function
+        store = get_data_store()
+
         # Reactive values
         selected_countries = reactive.Value([])
-        
-        # Cached reactive for country list
-        @reactive.Calc
-        def country_list():
-            return load_country_list()
-        
 
+        # Selection drawn on the current map; later changes are sent as style updates
+        shown_on_map = set()
+        
         # Optimized reactive for main data
         @reactive.Calc
         def filtered_data():
@@ -377,9 +360,12 @@ def create_app():
                 )
 
         @reactive.Effect
-        @reactive.event(input.map_click_iso)
+        @reactive.event(input.map_click)
         def _handle_map_click():
-            clicked_iso = input.map_click_iso()
+            click = input.map_click()
+            clicked_iso = resolve_map_click(
+                store.countries_in_region(input.region_filter()), click['lat'], click['lng']
+            )
             if clicked_iso:
                 current_selection = list(selected_countries())
                 if clicked_iso in current_selection:
@@ -388,6 +374,16 @@ def create_app():
                     current_selection.append(clicked_iso)
                 selected_countries.set(current_selection)
 
+        @reactive.Effect
+        @reactive.event(input.map_area)
+        def _handle_map_area():
+            """Add the countries inside a drawn lasso or rectangle in one update"""
+            area_isos = resolve_map_area(store.countries_in_region(input.region_filter()), input.map_area())
+            current_selection = list(selected_countries())
+            added = [iso for iso in area_isos if iso not in current_selection]
+            if added:
+                selected_countries.set(current_selection + added)
+
         @reactive.Effect
         @reactive.event(input.clear_selection)
         def _clear_all_selections():
@@ -409,13 +405,7 @@ def create_app():
             current_region = input.region_filter()
             
             # Get available countries in current region
-            all_countries = country_list()
-            if current_region != "All":
-                available_countries = all_countries[
-                    all_countries['region'] == current_region
-                ]
-            else:
-                available_countries = all_countries
+            available_countries = store.countries_in_region(current_region)
             
             available_count = len(available_countries)
             
@@ -431,18 +421,35 @@ def create_app():
         def map_output():
             """Render the interactive map with region filtering"""
             # Apply region filter to countries shown on map
-            all_countries = country_list()
-            current_region_filter = input.region_filter()
-            
-            if current_region_filter != "All":
-                filtered_countries = all_countries[
-                    all_countries['region'] == current_region_filter
-                ]
-            else:
-                filtered_countries = all_countries
-            
-            m = create_folium_map(filtered_countries, selected_countries.get())
-            return ui.HTML(m._repr_html_())
+            region = input.region_filter()
+            filtered_countries = store.countries_in_region(region)
+
+            # The map is only rendered again when the region changes; selection
+            # changes are applied in place by _push_map_selection
+            with reactive.isolate():
+                selected = selected_countries.get()
+            shown_on_map.clear()
+            shown_on_map.update(selected)
+
+            # Identical maps (e.g. the default one of every new session) are
+            # rendered once and shared across sessions
+            return ui.HTML(render_map_html(filtered_countries, selected, region))
+
+        @reactive.Effect
+        async def _push_map_selection():
+            """Restyle the countries whose selection changed on the rendered map"""
+            selected = selected_countries.get()
+            changed = changed_map_selection(shown_on_map, selected)
+            if not changed:
+                return
+            shown_on_map.clear()
+            shown_on_map.update(selected)
+
+            with reactive.isolate():
+                filtered_countries = store.countries_in_region(input.region_filter())
+            updates = get_map_selection_updates(filtered_countries, changed, list(selected))
+            if updates:
+                await session.send_custom_message("map_selection", {"updates": updates})
             
         @output  
         @render_widget
@@ -455,7 +462,7 @@ def create_app():
             if current_mode == "find_collaborations" and len(selected) < 2:
                 return create_empty_plot(
                     "🤝 Select at least 2 countries to find collaborations.\n"
-                    "Click on countries in the map above."
+                    "Click on countries in the map above, or draw a lasso or rectangle around them."
                 )
             
             data = filtered_data()
@@ -472,30 +479,18 @@ def create_app():
         def contribution_map():
             """Fixed contribution choropleth map"""
             try:
-                # Load data for all countries in region
-                df = pd.read_parquet("./data/data.parquet")
-                countries_for_choropleth = country_list()
-                
+                # Use all countries in region from the shared store
                 current_region_filter = input.region_filter()
-                if current_region_filter != "All":
-                    countries_for_choropleth = countries_for_choropleth[
-                        countries_for_choropleth['region'] == current_region_filter
-                    ]
                 
-                isos_for_choropleth = countries_for_choropleth['iso2c'].unique().tolist()
-                
-                if not isos_for_choropleth:
+                if store.countries_in_region(current_region_filter).empty:
                      return create_empty_plot(f"No countries found for region: {current_region_filter}")
         
-                # Filter data for choropleth - use all available data, not just selected countries
-                choropleth_data = get_display_data(
-                    df=df,
-                    selected_isos=isos_for_choropleth,  # Use all countries in region
+                # Per-country averages over the year range from the prefix-sum index
+                choropleth_data = get_contribution_averages(
+                    store=store,
                     year_range=input.years(),
                     chemical_category=input.chemical_category(),
-                    display_mode="compare_individuals",
-                    region_filter=current_region_filter,
-                    country_list=countries_for_choropleth
+                    region_filter=current_region_filter
                 )
                 
                 if choropleth_data.empty:
@@ -506,7 +501,7 @@ def create_app():
                 # print(f"Countries with data: {choropleth_data['iso2c'].nunique()}")
                 # print(f"Value range: {choropleth_data['total_percentage'].min():.2f} - {choropleth_data['total_percentage'].max():.2f}")
                     
-                return create_contribution_choropleth(choropleth_data)
+                return create_contribution_choropleth(choropleth_data, aggregated=True)
                 
             except Exception as e:
                 print(f"Error in contribution_map: {str(e)}")
@@ -525,14 +520,22 @@ def create_app():
                     message = "No data available for current selections."
                 return pd.DataFrame({"Message": [message]})
                 
-            return create_summary_dataframe(data, input.display_mode_input())
+            return get_summary_data(
+                store,
+                data,
+                selected_isos=sorted(selected_countries.get()),
+                year_range=tuple(input.years()),
+                chemical_category=input.chemical_category(),
+                display_mode=input.display_mode_input(),
+                region_filter=input.region_filter()
+            )
 
         # Article plot outputs with lazy loading
         @output
         @render_widget
         def country_cs_plot():
             try:
-                article_data = load_article_data()
+                article_data = store.article
                 if article_data.empty:
                     return create_empty_plot("No article data available")
                 
@@ -548,28 +551,17 @@ def create_app():
         @render_widget
         def article_top_collabs_plot():
             try:
-                df = pd.read_parquet("./data/data.parquet")
                 is_collab = input.top_data_type_filter() == "collabs"
                 chem_filter = input.top_collabs_chem_filter()
                 
-                filtered_data = df[
-                    (df['is_collab'] == is_collab) & 
-                    (df['chemical'] == chem_filter)
-                ]
+                # Top 10 from the precomputed leaderboard index
+                top_data = get_top_trends_data(store, is_collab, chem_filter, top_n=10)
                 
-                if filtered_data.empty:
+                if top_data.empty:
                     return create_empty_plot("No data available")
-                    
-                # Get top 10
-                top_data = (
-                    filtered_data.groupby('country')['percentage']
-                    .mean()
-                    .sort_values(ascending=False)
-                    .head(10)
-                )
                 
                 return create_top_trends_plot(
-                    filtered_data[filtered_data['country'].isin(top_data.index)],
+                    top_data,
                     f"Top 10 {'Collaborations' if is_collab else 'Countries'}: {chem_filter} 'Chemicals'" 
                 )
             except Exception as e:
@@ -579,7 +571,7 @@ def create_app():
         @render_widget
         def article_gdp_plot():
             try:
-                article_data = load_article_data()
+                article_data = store.article
                 if article_data.empty:
                     return create_dummy_gdp_plot()
                 
@@ -595,7 +587,7 @@ def create_app():
         @render_widget
         def article_researchers_plot():
             try:
-                article_data = load_article_data()
+                article_data = store.article
                 if article_data.empty:
                     return create_dummy_researchers_plot()
                 
@@ -611,7 +603,7 @@ def create_app():
         @render_widget
         def article_cs_expansion_plot():
             try:
-                article_data = load_article_data()
+                article_data = store.article
                 if article_data.empty:
                     return create_dummy_cs_expansion_plot()
                 
@@ -627,7 +619,7 @@ def create_app():
         @render_widget
         def china_us_plot():
             try:
-                article_data = load_article_data()
+                article_data = store.article
                 if article_data.empty:
                     return create_dummy_cs_expansion_plot() # Or create_empty_plot("No data for China-US plot")
                 
@@ -640,29 +632,22 @@ def create_app():
                 # Consider logging the error e
                 return create_dummy_cs_expansion_plot() # Or create_empty_plot(f"Error: {str(e)}")
         
-    return App(app_ui, server)
-
-# Cached helper functions
-@lru_cache(maxsize=1)
-def load_article_data():
-    """Load and cache article data"""
-    try:
-        df = pd.read_parquet("./data/data.parquet")
-        article_columns_map = {'source': 'source', 'year_x': 'year', 'country_x': 'country', 'percentage_x': 'value', 'cc': 'cc'}
-        required_raw_cols = list(article_columns_map.keys())
+    shiny_app = App(app_ui, server, static_assets=Path(__file__).parent / "www")
 
-        if all(col in df.columns for col in required_raw_cols):
-            article_data_raw = df[required_raw_cols].copy()
-            article_data = article_data_raw.rename(columns=article_columns_map)
-            article_data = article_data.dropna(subset=['value', 'source'])
-            article_data = article_data[article_data['source'] != ""]
-            return article_data
-        return pd.DataFrame()
-    except Exception:
-        return pd.DataFrame()
+    # Country boundaries are served next to the Shiny app with long-lived
+    # cache headers, and so are the basemap tiles of the local tile store
+    routes = []
+    if Path(TOPOLOGY_DIR).is_dir():
+        routes.append(Mount(f"/{TOPOLOGY_URL}", app=create_boundaries_app()))
+    tile_store = get_tile_store()
+    if tile_store is not None:
+        routes.append(Mount(f"/{TILES_URL}", app=create_tile_app(tile_store)))
+    if not routes:
+        return shiny_app
+    return Starlette(routes=[*routes, Mount("/", app=shiny_app)])
 
 # Create and run the app
 app = create_app()
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    run_app(app)
\ No newline at end of file
@@ -0,0 +1,352 @@
+"""
+Original pandas implementation of the explorer queries
+
+Kept as the reference the query backends are checked against: the data
+comes straight from data.parquet and every function is the version that
+predates the DataStore and the query backends.
+"""
+
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+
+def load_country_data(data_path: str = "./data/data.parquet") -> Dict:
+    """
+    Load and prepare initial data
+    
+    Args:
+        data_path: Path to the parquet file
+        
+    Returns:
+        Dictionary containing processed data objects
+    """
+    try:
+        # Read parquet file
+        df = pd.read_parquet(data_path)
+        
+        # Process country list  
+        country_list = (
+            df[df['is_collab'] == False]
+            .drop_duplicates(subset=['country', 'iso2c', 'lat', 'lng', 'cc', 'region'])
+            .dropna(subset=['country', 'iso2c'])
+            .query("country != '' and iso2c != ''")
+            .copy()
+        )
+        
+        # Handle missing regions
+        country_list['region'] = country_list['region']
+        country_list = country_list.sort_values('country').reset_index(drop=True)
+        # Get chemical categories - Modified to remove empty values
+        chemical_categories = (
+            sorted(df['chemical']
+                  .dropna()
+                  .unique()
+                  .tolist())
+        )
+        # Remove any empty strings
+        chemical_categories = [c for c in chemical_categories if c and str(c).strip()]
+        # Remove duplicates while preserving order
+        chemical_categories = list(dict.fromkeys(chemical_categories))
+         
+        # Get regions
+        regions = sorted(country_list['region'].unique().tolist())
+        
+        # Get year range
+        min_year = int(df['year'].min())
+        max_year = int(df['year'].max())
+        
+        # Process article data (adjust column names as needed)
+        article_columns = ['source', 'year_x', 'country_x', 'percentage_x']
+        if all(col in df.columns for col in article_columns):
+            article_data = df[article_columns].dropna().copy()
+            article_data.columns = ['source', 'year', 'country', 'value']
+        else:
+            article_data = pd.DataFrame()
+            
+        return {
+            'data': df,
+            'country_list': country_list,
+            'chemical_categories': chemical_categories,  # Updated list
+            'regions': regions,
+            'min_year': min_year,
+            'max_year': max_year,
+            'article_data': article_data
+        }
+        
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        return {}
+
+def get_display_data(
+    df: pd.DataFrame,
+    selected_isos: List[str],
+    year_range: Tuple[int, int],
+    chemical_category: str,
+    display_mode: str,
+    region_filter: str = "All",
+    country_list: pd.DataFrame = None
+) -> pd.DataFrame:
+    """
+    Optimized data fetching with early filtering and lazy evaluation
+    """
+    if df.empty:
+        return pd.DataFrame()
+    
+    # Early exit for collaboration mode without sufficient selection
+    if display_mode == "find_collaborations" and len(selected_isos) < 2:
+        return pd.DataFrame()
+    
+    # Apply filters progressively for efficiency
+    # Start with most selective filters first
+    filtered_df = df[
+        (df['year'] >= year_range[0]) & 
+        (df['year'] <= year_range[1])
+    ]
+    
+    # Chemical filter
+    filtered_df = filtered_df[filtered_df['chemical'] == chemical_category]
+    
+    # Early exit if no data after initial filtering
+    if filtered_df.empty:
+        return pd.DataFrame()
+
+    if display_mode in ["individual", "compare_individuals"]:
+        if not selected_isos:
+            return pd.DataFrame()
+
+        # Filter for individual countries only
+        result = filtered_df[
+            (filtered_df['is_collab'] == False) & 
+            (filtered_df['iso2c'].isin(selected_isos))
+        ].copy()
+        
+        # Apply region filter efficiently
+        if region_filter != "All" and 'region' in result.columns:
+            result = result[result['region'] == region_filter]
+            
+        if result.empty:
+            return pd.DataFrame()
+
+        # Add metadata efficiently
+        if country_list is not None:
+            country_meta = country_list[['iso2c', 'country', 'cc', 'region']].drop_duplicates(subset=['iso2c'])
+            result = result.merge(country_meta, on='iso2c', how='left', suffixes=('_orig', '_meta'))
+            
+            # Use metadata preferentially
+            for col in ['country', 'cc', 'region']:
+                meta_col = f'{col}_meta'
+                if meta_col in result.columns:
+                    result[col] = result[meta_col].fillna(result.get(f'{col}_orig', ''))
+                    
+        result['plot_group'] = result.get('country', result['iso2c'])
+        result['plot_color'] = result.get('cc', '#808080')
+        
+    elif display_mode == "find_collaborations":
+        # Optimized collaboration filtering
+        collab_df = filtered_df[filtered_df['is_collab'] == True].copy()
+        
+        if collab_df.empty:
+            return pd.DataFrame()
+
+        # Efficient collaboration filtering using vectorized operations
+        selected_set = set(selected_isos)
+        
+        def has_all_partners(iso_string):
+            if pd.isna(iso_string):
+                return False
+            partners = set(str(iso_string).split('-'))
+            return selected_set.issubset(partners)
+        
+        mask = collab_df['iso2c'].apply(has_all_partners)
+        result = collab_df[mask].copy()
+
+        if result.empty:
+            return pd.DataFrame()
+            
+        # Add collaboration metadata
+        result['partners'] = result['iso2c'].str.split('-')
+        result['collab_size'] = result['partners'].str.len()
+        
+        # Vectorized collaboration type assignment
+        result['collab_type'] = result['collab_size'].map({
+            2: "Bilateral",
+            3: "Trilateral", 
+            4: "4-country"
+        }).fillna("5-country+")
+        
+        result['plot_group'] = result['country']
+        result['plot_color_group'] = result['collab_type']
+    else:
+        return pd.DataFrame()
+        
+    # Standardize columns efficiently
+    if not result.empty:
+        # Handle numeric conversions
+        for col in ['year']:
+            if col in result.columns:
+                result[col] = pd.to_numeric(result[col], errors='coerce')
+        
+        # Standardize percentage column
+        percentage_cols = ['percentage', 'value', 'value_raw', 'percentage_x']
+        for col in percentage_cols:
+            if col in result.columns:
+                result['total_percentage'] = pd.to_numeric(result[col], errors='coerce')
+                break
+        
+        # Drop rows with invalid data
+        result = result.dropna(subset=['year', 'total_percentage'])
+
+    return result
+
+
+
+def calculate_top_contributors(
+    df: pd.DataFrame,
+    year_range: Tuple[int, int],
+    chemical_category: str,
+    region_filter: str = "All", 
+    country_list: pd.DataFrame = None,
+    top_n: int = 10,
+    ignore_year_filter: bool = False
+) -> pd.DataFrame:
+    """
+    Calculate top contributing countries based on filters
+    
+    Args:
+        df: Main data DataFrame
+        year_range: Year range tuple
+        chemical_category: Chemical category filter
+        region_filter: Region filter
+        country_list: Country metadata
+        top_n: Number of top contributors to return
+        ignore_year_filter: Whether to ignore year filter
+        
+    Returns:
+        DataFrame with top contributors
+    """
+    # Base query for solo contributions
+    query_df = df[df['is_collab'] == False].copy()
+    
+    # Apply filters
+    if not ignore_year_filter:
+        query_df = query_df[
+            (query_df['year'] >= year_range[0]) & 
+            (query_df['year'] <= year_range[1])
+        ]
+        
+    if chemical_category != "All":
+        query_df = query_df[query_df['chemical'] == chemical_category]
+        
+    if region_filter != "All":
+        query_df = query_df[query_df['region'] == region_filter]
+        
+    # Calculate top contributors
+    top_data = (
+        query_df.groupby('iso2c')['percentage']
+        .mean()
+        .reset_index()
+        .sort_values('percentage', ascending=False)
+        .head(top_n)
+        .reset_index(drop=True)
+    )
+    
+    top_data['rank'] = range(1, len(top_data) + 1)
+    
+    # Add country names if available
+    if country_list is not None:
+        top_data = top_data.merge(
+            country_list[['iso2c', 'country']], 
+            on='iso2c', 
+            how='left'
+        )
+    return top_data[['rank', 'iso2c', 'country', 'percentage']].rename(
+        columns={'percentage': 'avg_percentage'}
+    )
+
+def create_summary_dataframe(data: pd.DataFrame, mode: str) -> pd.DataFrame:
+    """Create summary statistics table"""
+    value_column = 'total_percentage' # Expect this from get_display_data
+
+    if value_column not in data.columns or data.empty:
+        return pd.DataFrame({'Error': [f"Missing '{value_column}' column or no data for summary."]})
+    
+    if mode == "find_collaborations":
+        required_cols = ['plot_group', 'chemical', 'collab_type', value_column]
+        if not all(col in data.columns for col in required_cols):
+            missing = [col for col in required_cols if col not in data.columns]
+            return pd.DataFrame({'Error': [f"Summary data for collaborations missing: {missing}"]})
+        
+        summary = (
+            data.groupby(['plot_group', 'chemical', 'collab_type'])
+            .agg(
+                avg_percentage=(value_column, 'mean'),
+                max_percentage=(value_column, 'max'),
+                years_present=('year', 'nunique') # Count distinct years
+            )
+            .round(2)
+            .reset_index()
+        )
+        summary.columns = ['Collaboration', 'Chemical', 'Type', 'Avg %', 'Max %', 'Years Present']
+    elif mode == "compare_individuals":
+        required_cols = ['country', 'iso2c', 'chemical', value_column]
+        if not all(col in data.columns for col in required_cols):
+            missing = [col for col in required_cols if col not in data.columns]
+            return pd.DataFrame({'Error': [f"Summary data for individuals missing: {missing}"]})
+
+        summary = (
+            data.groupby(['country', 'iso2c', 'chemical'])
+            .agg(
+                avg_percentage=(value_column, 'mean'),
+                max_percentage=(value_column, 'max'),
+                years_present=('year', 'nunique') # Count distinct years
+            )
+            .round(2)
+            .reset_index()
+        )
+        summary.columns = ['Country', 'ISO', 'Chemical', 'Avg %', 'Max %', 'Years Present']
+    else:
+        return pd.DataFrame({'Message': [f"Summary not available for display mode: {mode}"]})
+        
+    return summary
+
+
+def contribution_averages(
+    df: pd.DataFrame,
+    country_list: pd.DataFrame,
+    year_range: Tuple[int, int],
+    chemical_category: str,
+    region_filter: str = "All"
+) -> pd.DataFrame:
+    """Per-country averages drawn by the contribution choropleth (app.py and create_contribution_choropleth)"""
+    countries_for_choropleth = country_list
+    if region_filter != "All":
+        countries_for_choropleth = countries_for_choropleth[
+            countries_for_choropleth['region'] == region_filter
+        ]
+
+    isos_for_choropleth = countries_for_choropleth['iso2c'].unique().tolist()
+    if not isos_for_choropleth:
+        return pd.DataFrame()
+
+    data = get_display_data(
+        df=df,
+        selected_isos=isos_for_choropleth,
+        year_range=year_range,
+        chemical_category=chemical_category,
+        display_mode="compare_individuals",
+        region_filter=region_filter,
+        country_list=countries_for_choropleth
+    )
+    if 'total_percentage' not in data.columns or data.empty:
+        return pd.DataFrame()
+
+    avg_data = (
+        data.groupby(['iso3c', 'country'], as_index=False)
+        .agg({
+            'total_percentage': 'mean',
+            'region': 'first'
+        })
+        .round(2)
+    )
+    return avg_data.dropna(subset=['total_percentage'])
@@ -0,0 +1,18 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# The app reads its data from paths relative to the repository root
+sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture(autouse=True, scope="session")
+def repo_root_cwd():
+    cwd = os.getcwd()
+    os.chdir(REPO_ROOT)
+    yield REPO_ROOT
+    os.chdir(cwd)
@@ -0,0 +1,75 @@
+"""
+Vendored copies of the selection map's scripts and stylesheets
+"""
+
+import folium
+import pytest
+
+from utils import assets
+from utils.assets import fetch_assets, use_vendored_assets, vendored_url
+from utils.functions import map_asset_urls
+
+CSS = b"""
+.icon { background: url("../images/icon.png"); }
+.font { src: url(../fonts/font.woff2?v=1) format("woff2"), url('../fonts/font.eot?#iefix'); }
+.inline { background: url(data:image/png;base64,AAAA); }
+.remote { background: url(https://example.org/remote.png); }
+"""
+
+FILES = {
+    'https://cdn.example.org/lib@1.0/css/lib.css': CSS,
+    'https://cdn.example.org/lib@1.0/images/icon.png': b'png',
+    'https://cdn.example.org/lib@1.0/fonts/font.woff2': b'woff2',
+    'https://cdn.example.org/lib@1.0/js/lib.js': b'js',
+}
+
+
+@pytest.fixture
+def fake_cdn(monkeypatch):
+    def fetch(url):
+        if url not in FILES:
+            raise OSError(f"404 {url}")
+        return FILES[url]
+    monkeypatch.setattr(assets, '_fetch', fetch)
+
+
+def test_fetch_assets_mirrors_urls_and_stylesheet_references(fake_cdn, tmp_path, capsys):
+    copied = fetch_assets(['https://cdn.example.org/lib@1.0/css/lib.css', 'https://cdn.example.org/lib@1.0/js/lib.js'], str(tmp_path))
+    assert set(copied) == set(FILES)
+    assert (tmp_path / "cdn.example.org/lib@1.0/fonts/font.woff2").read_bytes() == b'woff2'
+    assert (tmp_path / "cdn.example.org/lib@1.0/css/lib.css").read_bytes() == CSS
+    # Optional font formats may be missing; data and absolute URLs are left alone
+    assert "font.eot" in capsys.readouterr().out
+    assert not (tmp_path / "example.org").exists()
+
+
+def test_fetch_assets_requires_the_listed_assets(fake_cdn, tmp_path):
+    with pytest.raises(OSError):
+        fetch_assets(['https://cdn.example.org/missing.js'], str(tmp_path))
+
+
+def test_vendored_url(fake_cdn, tmp_path):
+    url = 'https://cdn.example.org/lib@1.0/js/lib.js'
+    assert vendored_url(url, str(tmp_path)) == url
+    fetch_assets([url], str(tmp_path))
+    assert vendored_url(url, str(tmp_path)) == "vendor/cdn.example.org/lib@1.0/js/lib.js"
+
+
+def test_map_uses_the_local_copies(tmp_path):
+    for url in map_asset_urls():
+        path = tmp_path / assets._vendor_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    m = use_vendored_assets(folium.Map(tiles=None), str(tmp_path))
+    html = m.get_root().render()
+    assert "vendor/cdn.jsdelivr.net/npm/leaflet@" in html
+    for url in map_asset_urls():
+        assert url not in html
+    # The class defaults are left alone
+    assert folium.Map.default_js[0][1].startswith("https://")
+
+
+def test_map_asset_urls_are_pinned():
+    urls = map_asset_urls()
+    assert any('leaflet.draw' in url for url in urls)
+    assert all(url.startswith("https://") for url in urls)
@@ -0,0 +1,171 @@
+"""
+Query backends against the original pandas implementation
+
+Every backend answers get_display_data, calculate_top_contributors, the
+choropleth averages and the summary table for random selections, regions,
+year ranges and chemicals; the answers must match tests/baseline.py, which
+computes them from data.parquet the way the app did before the DataStore.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import baseline
+from utils.backends import QUERY_BACKEND_ENV, PandasBackend, check_backend_parity
+from utils.data_store import DataStore
+from utils.functions import (
+    TABLES_DIR,
+    calculate_top_contributors,
+    get_contribution_averages,
+    get_display_data,
+    get_summary_data,
+)
+
+BACKENDS = ['pandas', 'duckdb', 'polars']
+SEEDS = range(12)
+
+# Columns the app reads from the display rows, per display mode
+DISPLAY_COLUMNS = {
+    'compare_individuals': ['iso2c', 'iso3c', 'country', 'region', 'cc', 'year', 'chemical',
+                            'total_percentage', 'plot_group', 'plot_color'],
+    'find_collaborations': ['iso2c', 'country', 'year', 'chemical', 'total_percentage',
+                            'collab_type', 'plot_group', 'plot_color_group'],
+}
+NUMERIC_COLUMNS = {'year', 'total_percentage', 'avg_percentage', 'Avg %', 'Max %', 'Years Present'}
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return baseline.load_country_data()
+
+
+@pytest.fixture(scope="module", params=BACKENDS)
+def store(request):
+    if request.param != 'pandas':
+        pytest.importorskip(request.param)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv(QUERY_BACKEND_ENV, request.param)
+        store = DataStore.from_tables(TABLES_DIR)
+        assert store.backend.name == request.param
+    return store
+
+
+def random_query(reference, seed):
+    """Random year range, chemical, region and country selection (mostly from the region)"""
+    rng = np.random.default_rng(seed)
+    first, last = sorted(rng.integers(reference['min_year'], reference['max_year'], endpoint=True, size=2))
+    chemical = str(rng.choice(reference['chemical_categories']))
+    region = str(rng.choice(['All', 'All'] + reference['regions']))
+    countries = reference['country_list']
+    in_region = countries if region == 'All' else countries[countries['region'] == region]
+    isos = list(rng.choice(in_region['iso2c'].unique(), size=min(rng.integers(1, 8), in_region['iso2c'].nunique()), replace=False))
+    isos.append(rng.choice(countries['iso2c'].unique()))
+    return (int(first), int(last)), chemical, region, [str(iso) for iso in dict.fromkeys(isos)]
+
+
+def random_partners(reference, seed, year_range, chemical):
+    """Members of a random collaboration with rows in the year range, so that the search has hits"""
+    rng = np.random.default_rng(seed)
+    df = reference['data']
+    collabs = df.loc[
+        (df['is_collab'] == True) & (df['chemical'] == chemical) & df['year'].between(*year_range), 'iso2c'
+    ].dropna().unique()
+    if len(collabs) == 0:
+        return ['CN', 'US']
+    members = str(rng.choice(collabs)).split('-')
+    return [str(iso) for iso in rng.choice(members, size=rng.integers(2, len(members), endpoint=True), replace=False)]
+
+
+def assert_same_rows(actual: pd.DataFrame, expected: pd.DataFrame, columns, keys, atol: float = 0):
+    if expected.empty:
+        assert actual.empty
+        return
+    assert not actual.empty
+    actual = actual[columns].sort_values(keys).reset_index(drop=True)
+    expected = expected[columns].sort_values(keys).reset_index(drop=True)
+    assert len(actual) == len(expected)
+    for col in columns:
+        if col in NUMERIC_COLUMNS:
+            np.testing.assert_allclose(actual[col].astype(float), expected[col].astype(float), rtol=1e-5, atol=atol, err_msg=col)
+        else:
+            assert actual[col].astype(str).tolist() == expected[col].astype(str).tolist(), col
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_individual_display_data(store, reference, seed):
+    year_range, chemical, region, isos = random_query(reference, seed)
+    expected = baseline.get_display_data(
+        reference['data'], isos, year_range, chemical, 'compare_individuals', region, reference['country_list']
+    )
+    actual = get_display_data(store, isos, year_range, chemical, 'compare_individuals', region)
+    assert_same_rows(actual, expected, DISPLAY_COLUMNS['compare_individuals'], ['iso2c', 'year'])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_collaboration_display_data(store, reference, seed):
+    year_range, chemical, _, _ = random_query(reference, seed)
+    isos = random_partners(reference, seed, year_range, chemical)
+    expected = baseline.get_display_data(reference['data'], isos, year_range, chemical, 'find_collaborations')
+    actual = get_display_data(store, isos, year_range, chemical, 'find_collaborations')
+    assert_same_rows(actual, expected, DISPLAY_COLUMNS['find_collaborations'], ['iso2c', 'year'])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_top_contributors(store, reference, seed):
+    year_range, chemical, region, _ = random_query(reference, seed)
+    for chemical in (chemical, 'All'):
+        expected = baseline.calculate_top_contributors(
+            reference['data'], year_range, chemical, region, reference['country_list']
+        ).drop_duplicates(subset=['rank'])
+        actual = calculate_top_contributors(store, year_range, chemical, region)
+        assert actual['iso2c'].tolist() == expected['iso2c'].tolist()
+        assert actual['rank'].tolist() == expected['rank'].tolist()
+        np.testing.assert_allclose(actual['avg_percentage'], expected['avg_percentage'], rtol=1e-5)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_contribution_averages(store, reference, seed):
+    year_range, chemical, region, _ = random_query(reference, seed)
+    expected = baseline.contribution_averages(
+        reference['data'], reference['country_list'], year_range, chemical, region
+    )
+    actual = get_contribution_averages(store, year_range, chemical, region)
+    # The choropleth rounded its averages to two decimals
+    assert_same_rows(actual, expected, ['iso3c', 'country', 'region', 'total_percentage'], ['iso3c'], atol=0.005)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("display_mode", ['compare_individuals', 'find_collaborations'])
+def test_summary_table(store, reference, display_mode, seed):
+    year_range, chemical, region, isos = random_query(reference, seed)
+    if display_mode == 'find_collaborations':
+        isos, region = random_partners(reference, seed, year_range, chemical), "All"
+    expected = baseline.create_summary_dataframe(
+        baseline.get_display_data(reference['data'], isos, year_range, chemical, display_mode, region, reference['country_list']),
+        display_mode
+    )
+    data = get_display_data(store, isos, year_range, chemical, display_mode, region)
+    actual = get_summary_data(store, data, isos, year_range, chemical, display_mode, region)
+    assert list(actual.columns) == list(expected.columns)
+    if 'Error' in expected.columns:
+        return
+    # Both round to two decimals, from float32 and float64 values respectively
+    assert_same_rows(actual, expected, list(expected.columns), list(expected.columns[:3]), atol=0.01)
+
+
+def test_explicit_backend(store):
+    # The backend passed in answers the query instead of the store's
+    isos, year_range = ['CN', 'US'], (2000, 2010)
+    rows = get_display_data(store, isos, year_range, 'All', 'find_collaborations', backend=PandasBackend(store))
+    expected = get_display_data(store, isos, year_range, 'All', 'find_collaborations')
+    assert set(zip(rows['iso2c'].astype(str), rows['year'])) == set(zip(expected['iso2c'].astype(str), expected['year']))
+
+
+@pytest.mark.parametrize("name", ['duckdb', 'polars'])
+def test_check_backend_parity_leaves_store_alone(name):
+    pytest.importorskip(name)
+    store = DataStore.from_tables(TABLES_DIR)
+    backend = store.backend
+    assert check_backend_parity(store, name) == []
+    assert store.backend is backend
@@ -0,0 +1,158 @@
+"""
+Byte-bounded LRU cache of the rendered maps shared across sessions
+"""
+
+import threading
+
+import pytest
+
+import utils.functions
+from utils.cache import ByteLRUCache
+from utils.data_store import DataStore
+from utils.functions import TABLES_DIR, _map_view, render_map_html
+from utils.geometry import tier_for_zoom
+
+
+@pytest.fixture
+def cache():
+    return ByteLRUCache(max_bytes=10, sizeof=len)
+
+
+def test_byte_budget(cache):
+    cache.put('a', 'aaaa')
+    cache.put('b', 'bbbb')
+    assert cache.current_bytes == 8 and len(cache) == 2
+    cache.put('c', 'cc')
+    assert cache.current_bytes == 10 and len(cache) == 3
+    # One more byte evicts the oldest entry
+    cache.put('d', 'd')
+    assert cache.get('a') is None
+    assert cache.current_bytes == 7
+    assert cache.current_bytes <= cache.max_bytes
+
+
+def test_eviction_order(cache):
+    cache.put('a', 'aaa')
+    cache.put('b', 'bbb')
+    cache.put('c', 'ccc')
+    # Reading 'a' makes 'b' the least recently used
+    assert cache.get('a') == 'aaa'
+    cache.put('d', 'ddd')
+    assert cache.get('b') is None
+    assert [cache.get(key) for key in 'acd'] == ['aaa', 'ccc', 'ddd']
+    # A value needing more room evicts several entries, oldest first
+    cache.put('e', 'eeeeeee')
+    assert cache.get('a') is None and cache.get('c') is None
+    assert cache.get('d') == 'ddd' and cache.get('e') == 'eeeeeee'
+
+
+def test_replacing_a_value(cache):
+    cache.put('a', 'aaaa')
+    cache.put('a', 'aa')
+    assert cache.get('a') == 'aa'
+    assert cache.current_bytes == 2 and len(cache) == 1
+
+
+def test_value_larger_than_budget(cache):
+    calls = []
+
+    def create():
+        calls.append(1)
+        return 'x' * 11
+
+    assert cache.get_or_create('big', create) == 'x' * 11
+    assert cache.get_or_create('big', create) == 'x' * 11
+    # Returned but never stored
+    assert len(calls) == 2
+    assert len(cache) == 0 and cache.current_bytes == 0
+    # Nor does it leave an older value for the key behind
+    cache.put('a', 'aaa')
+    cache.put('a', 'y' * 11)
+    assert cache.get('a') is None and cache.current_bytes == 0
+
+
+def test_stats(cache):
+    assert cache.stats() == {'entries': 0, 'bytes': 0, 'max_bytes': 10, 'hits': 0, 'misses': 0, 'evictions': 0}
+    cache.get_or_create('a', lambda: 'aaaa')
+    cache.get_or_create('a', lambda: 'not created')
+    cache.get_or_create('b', lambda: 'bbbb')
+    cache.get_or_create('c', lambda: 'cccc')
+    assert cache.get('a') is None
+    assert cache.stats() == {'entries': 2, 'bytes': 8, 'max_bytes': 10, 'hits': 1, 'misses': 4, 'evictions': 1}
+    # Clearing drops the entries and keeps the counters
+    cache.clear()
+    assert cache.stats() == {'entries': 0, 'bytes': 0, 'max_bytes': 10, 'hits': 1, 'misses': 4, 'evictions': 1}
+
+
+def test_concurrent_puts():
+    cache = ByteLRUCache(max_bytes=1000, sizeof=len)
+
+    def fill(thread):
+        for i in range(500):
+            cache.put((thread, i % 50), 'x' * (i % 30 + 1))
+            cache.get((thread, (i * 7) % 50))
+
+    threads = [threading.Thread(target=fill, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.current_bytes == sum(len(cache.get(key)) for key in list(cache._entries))
+    assert cache.current_bytes <= cache.max_bytes
+
+
+# Rendered maps
+
+@pytest.fixture(scope="module")
+def country_list():
+    return DataStore.from_tables(TABLES_DIR).country_list
+
+
+@pytest.fixture
+def map_cache(monkeypatch):
+    cache = ByteLRUCache(max_bytes=2**24)
+    monkeypatch.setattr(utils.functions, 'MAP_HTML_CACHE', cache)
+    return cache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    # Maps built, by selection
+    built = []
+    create_folium_map = utils.functions.create_folium_map
+
+    def counting(country_list, selected):
+        built.append(sorted(selected))
+        return create_folium_map(country_list, selected)
+
+    monkeypatch.setattr(utils.functions, 'create_folium_map', counting)
+    return built
+
+
+def test_render_map_html_key(country_list, map_cache, renders):
+    europe = country_list[country_list['region'] == 'Europe']
+    html = render_map_html(europe, ['FR', 'DE'], 'Europe')
+    # The same selection in another order is the same map
+    assert render_map_html(europe, ['DE', 'FR'], 'Europe') is html
+    assert renders == [['DE', 'FR']]
+    tier = tier_for_zoom(_map_view(europe)[2])
+    assert list(map_cache._entries) == [('Europe', frozenset({'FR', 'DE'}), tier)]
+    assert map_cache.stats()['hits'] == 1 and map_cache.stats()['misses'] == 1
+
+    # Another selection or region is another map
+    assert render_map_html(europe, ['FR'], 'Europe') != html
+    asia = country_list[country_list['region'] == 'Asia']
+    render_map_html(asia, ['FR', 'DE'], 'Asia')
+    assert renders == [['DE', 'FR'], ['FR'], ['DE', 'FR']]
+    assert len(map_cache) == 3
+    assert map_cache.current_bytes <= map_cache.max_bytes
+
+
+def test_render_map_html_tier(country_list, map_cache, renders):
+    # Fewer countries zoom the map in: same region and selection, another tier
+    europe = country_list[country_list['region'] == 'Europe']
+    benelux = europe[europe['iso2c'].isin(['BE', 'NL', 'LU'])]
+    assert tier_for_zoom(_map_view(benelux)[2]) != tier_for_zoom(_map_view(europe)[2])
+    render_map_html(europe, ['BE'], 'Europe')
+    render_map_html(benelux, ['BE'], 'Europe')
+    assert len(renders) == 2 and len(map_cache) == 2
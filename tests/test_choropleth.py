@@ -0,0 +1,40 @@
+"""
+Contribution choropleth input: display rows or per-country averages
+"""
+
+import numpy as np
+import pytest
+
+from utils.data_store import DataStore
+from utils.functions import TABLES_DIR, create_contribution_choropleth, get_contribution_averages, get_display_data
+
+
+@pytest.fixture(scope="module")
+def store():
+    return DataStore.from_tables(TABLES_DIR)
+
+
+def data_trace(fig):
+    return next(trace for trace in fig.data if trace.showscale)
+
+
+@pytest.mark.parametrize("region", ["All", "Europe"])
+def test_rows_and_averages_draw_the_same_map(store, region):
+    isos = store.countries_in_region(region)['iso2c'].unique().tolist()
+    rows = get_display_data(store, isos, (2005, 2015), 'Organic', 'compare_individuals', region)
+    averages = get_contribution_averages(store, (2005, 2015), 'Organic', region)
+
+    from_rows = data_trace(create_contribution_choropleth(rows))
+    from_averages = data_trace(create_contribution_choropleth(averages, aggregated=True))
+    by_rows = dict(zip(from_rows.locations, from_rows.z))
+    by_averages = dict(zip(from_averages.locations, from_averages.z))
+    assert by_rows.keys() == by_averages.keys()
+    np.testing.assert_allclose([by_averages[iso] for iso in by_rows], list(by_rows.values()), atol=0.011)
+
+
+def test_rows_are_averaged_per_country(store):
+    rows = get_display_data(store, ['CN', 'US', 'DE'], (2000, 2010), 'Organic', 'compare_individuals')
+    expected = rows.groupby(rows['iso3c'].astype(str))['total_percentage'].mean().round(2)
+    trace = data_trace(create_contribution_choropleth(rows))
+    assert sorted(trace.locations) == sorted(expected.index)
+    np.testing.assert_allclose([expected[iso] for iso in trace.locations], trace.z)
@@ -0,0 +1,232 @@
+"""
+Selection map built by create_folium_map
+"""
+
+import json
+import re
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+import utils.functions
+import utils.tiles
+from utils.data_store import DataStore
+from utils.functions import (
+    TABLES_DIR,
+    _country_styles,
+    _map_view,
+    changed_map_selection,
+    create_folium_map,
+    get_map_selection_updates,
+    prepare_map_countries,
+)
+from utils.geometry import GeometryRegistry, get_geometry_registry, tier_for_zoom
+from utils.tiles import TILES_ENV, TILES_URL, get_tile_store
+from utils.topology import TOPOLOGY_DECODER_URL
+
+
+@pytest.fixture(scope="module")
+def country_list():
+    return DataStore.from_tables(TABLES_DIR).country_list
+
+
+@pytest.fixture
+def europe(country_list):
+    return country_list[country_list['region'] == 'Europe']
+
+
+@pytest.fixture
+def no_tile_store(monkeypatch, tmp_path):
+    # Neither CS_EXPLORER_TILES nor a default store in the working directory
+    monkeypatch.delenv(TILES_ENV, raising=False)
+    monkeypatch.setattr(utils.tiles, 'DEFAULT_TILE_PATHS', (str(tmp_path / "none.mbtiles"),))
+    get_tile_store.cache_clear()
+    yield
+    get_tile_store.cache_clear()
+
+
+@pytest.fixture
+def no_registry(monkeypatch):
+    def unavailable():
+        raise FileNotFoundError("no boundaries")
+    monkeypatch.setattr(utils.functions, 'get_geometry_registry', unavailable)
+
+
+def render(country_list, selected):
+    return create_folium_map(country_list, selected).get_root().render()
+
+
+def embedded_features(html):
+    match = re.search(r'\.addData\((\{"type": "FeatureCollection".*?\})\);\n', html)
+    return json.loads(match.group(1))['features']
+
+
+def test_map_html(europe, no_tile_store):
+    html = render(europe, ['FR'])
+    # Country layer, filled from the tier's TopoJSON boundaries
+    tier = tier_for_zoom(_map_view(europe)[2])
+    assert 'L.geoJson(null' in html
+    assert f'<script src="{TOPOLOGY_DECODER_URL}"></script>' in html
+    assert re.search(rf'fetch\("boundaries/{tier}\.topo\.json\?v=[0-9a-f]+"\)', html)
+    # Selection script and drawing tools
+    assert "'map_click'" in html and "'map_area'" in html
+    assert 'window.countryMap' in html
+    assert 'L.Control.Draw' in html
+    # Online basemap without a local tile store
+    assert 'tile.openstreetmap.org/{z}/{x}/{y}.png' in html
+    assert f'Region: Europe ({len(europe)} countries)' in html
+    assert 'approximate location markers' not in html
+
+
+def test_map_html_local_tiles(europe, monkeypatch, tmp_path, no_tile_store):
+    (tmp_path / "tiles" / "0" / "0").mkdir(parents=True)
+    (tmp_path / "tiles" / "0" / "0" / "0.png").write_bytes(b'tile')
+    monkeypatch.setenv(TILES_ENV, str(tmp_path / "tiles"))
+    html = render(europe, [])
+    assert f'"{TILES_URL}/{{z}}/{{x}}/{{y}}"' in html
+    assert 'tile.openstreetmap.org' not in html
+
+
+def test_map_html_embeds_only_countries_without_shapes(country_list, no_tile_store):
+    asia = country_list[country_list['region'] == 'Asia']
+    features = embedded_features(render(asia, ['SG']))
+    # Singapore and Hong Kong have no shape: circles at their location
+    isos = {feature['id'] for feature in features}
+    assert {'SG', 'HK'} <= isos and 'CN' not in isos
+    assert all(feature['geometry']['type'] == 'Point' for feature in features)
+    singapore = next(feature for feature in features if feature['id'] == 'SG')
+    assert singapore['properties']['selected'] and singapore['properties']['approximate']
+
+
+def test_map_html_without_registry(europe, no_registry, no_tile_store):
+    html = render(europe, [])
+    # Every country is a marker, with a note about the missing shapes
+    assert 'approximate location markers' in html
+    assert 'fetch(' not in html
+    assert TOPOLOGY_DECODER_URL not in html
+    features = embedded_features(html)
+    assert len(features) == europe['iso2c'].nunique()
+    assert {feature['geometry']['type'] for feature in features} == {'Point'}
+
+
+# Selection updates
+
+@pytest.mark.parametrize("shown, selected, changed", [
+    (set(), [], []),                          # initial state, nothing selected
+    (set(), ['FR'], ['FR']),                  # selected before the map was drawn
+    ({'FR'}, ['FR', 'DE'], ['DE']),           # added
+    ({'FR', 'DE'}, ['FR'], ['DE']),           # removed
+    ({'FR', 'DE'}, ['DE', 'FR'], []),         # unchanged, in another order
+    ({'FR', 'DE'}, ['IT', 'DE'], ['FR', 'IT']),
+    ({'FR'}, [], ['FR']),                     # cleared
+])
+def test_changed_map_selection(shown, selected, changed):
+    assert changed_map_selection(shown, selected) == changed
+
+
+def rendered_styles(country_list, selected):
+    """Style of every country on a map drawn from scratch with a selection"""
+    prepared = prepare_map_countries(country_list, selected, get_geometry_registry(), 'regional')
+    return dict(zip(prepared['iso2c'], prepared['style'].map(json.loads)))
+
+
+def test_map_selection_updates(europe):
+    updates = {update['iso']: update for update in get_map_selection_updates(europe, ['DE', 'FR'], ['FR', 'IT'])}
+    assert {iso: update['selected'] for iso, update in updates.items()} == {'DE': False, 'FR': True}
+    # Restyled countries look like on a map drawn with the new selection
+    styles = rendered_styles(europe, ['FR', 'IT'])
+    for iso, update in updates.items():
+        assert update['style'] == styles[iso]
+    france = updates['FR']['style']
+    assert france['fillColor'] == europe.loc[europe['iso2c'] == 'FR', 'cc'].iloc[0]
+    assert france['weight'] == 2 and france['fillOpacity'] == 0.8
+    assert updates['DE']['style']['fillColor'] == '#83928e'
+
+
+def test_map_selection_updates_unchanged(europe):
+    assert get_map_selection_updates(europe, [], ['FR']) == []
+    # Countries that are not on the map are not sent
+    assert get_map_selection_updates(europe, ['CN', 'US'], ['CN']) == []
+
+
+def test_map_selection_updates_markers(country_list, no_registry):
+    updates = get_map_selection_updates(country_list, ['SG', 'FR'], ['SG'])
+    assert {update['iso'] for update in updates} == {'SG', 'FR'}
+    # Without shapes every country is a marker
+    assert {update['style']['color'] for update in updates} == {'#525756'}
+
+
+# Prepared countries
+
+@pytest.fixture(scope="module")
+def registry():
+    world = gpd.GeoDataFrame({
+        'iso_a2': ['AA', 'bb', 'EE'],
+        'geometry': [box(0, 0, 10, 10), box(10, 0, 20, 10), box(30, 0, 40, 10)],
+    }, crs="EPSG:4326")
+    return GeometryRegistry(world)
+
+
+@pytest.fixture
+def countries():
+    return pd.DataFrame({
+        'country': ['Aland', 'Aland', 'Bland', 'Cland', 'Dland', 'Eland'],
+        'iso2c': ['AA', 'AA', ' BB', 'CC', 'DD', 'EE'],
+        'lat': [5.0, 5.0, 5.0, -12.5, np.nan, np.nan],
+        'lng': [5.0, 5.0, 15.0, 45.25, np.nan, np.nan],
+        'cc': ['#111111', '#111111', '#222222', '#333333', '#444444', '#555555'],
+        'region': ['North', 'North', None, 'South', 'South', 'South'],
+    })
+
+
+def test_prepare_map_countries_join(countries, registry):
+    prepared = prepare_map_countries(countries, ['AA', 'CC'], registry, 'global').set_index('iso2c')
+    # One row per country; the one without a shape or a location is dropped
+    assert prepared.index.tolist() == ['AA', ' BB', 'CC', 'EE']
+    # Codes are matched on their normalized form
+    assert prepared['shape_iso'].tolist() == ['AA', 'bb', None, 'EE']
+    assert prepared['approximate'].tolist() == [False, False, True, False]
+    assert prepared['selected'].tolist() == [True, False, True, False]
+    # Shapes at the requested tier, points at the country's location
+    assert prepared.loc['AA', 'geometry'] == registry.get('AA', 'global').geojson
+    assert json.loads(prepared.loc['EE', 'geometry'])['type'] == 'Polygon'
+    assert json.loads(prepared.loc['CC', 'geometry']) == {'type': 'Point', 'coordinates': [45.25, -12.5]}
+
+
+def test_prepare_map_countries_properties(countries, registry):
+    prepared = prepare_map_countries(countries, ['AA', 'CC'], registry, 'global').set_index('iso2c')
+    properties = prepared['properties'].map(json.loads)
+    assert properties['AA'] == {
+        'iso': 'AA', 'name': 'Aland', 'region': 'North', 'selected': True, 'color': '#111111',
+        'approximate': False, 'style': json.loads(prepared.loc['AA', 'style']),
+    }
+    assert properties[' BB']['region'] == 'Unknown'
+    assert properties['CC']['approximate'] is True
+    for iso, props in properties.items():
+        assert props['style'] == json.loads(prepared.loc[iso, 'style'])
+
+
+def test_prepare_map_countries_without_registry(countries):
+    prepared = prepare_map_countries(countries, [], None)
+    # Every country with a location is a point
+    assert prepared['iso2c'].tolist() == ['AA', ' BB', 'CC']
+    assert prepared['approximate'].all()
+    assert prepared['shape_iso'].isna().all()
+    assert {json.loads(geometry)['type'] for geometry in prepared['geometry']} == {'Point'}
+
+
+def test_country_styles():
+    styles = _country_styles(
+        np.array([True, True, False, False]),
+        np.array([False, True, False, True]),
+        np.array(['#111111', '#222222', '#333333', '#444444'], dtype=object)
+    ).to_dict('records')
+    assert styles == [
+        {'fillColor': '#111111', 'color': 'white', 'weight': 2, 'fillOpacity': 0.8, 'dashArray': '0'},
+        {'fillColor': '#222222', 'color': '#525756', 'weight': 1, 'fillOpacity': 0.8, 'dashArray': '0'},
+        {'fillColor': '#83928e', 'color': 'white', 'weight': 1, 'fillOpacity': 0.5, 'dashArray': '5, 5'},
+        {'fillColor': '#83928e', 'color': '#525756', 'weight': 1, 'fillOpacity': 0.5, 'dashArray': '0'},
+    ]
@@ -0,0 +1,200 @@
+"""
+Boundary store freshness checks and the country geometry registry
+"""
+
+import shutil
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Point, box
+
+from utils.geometry import (
+    BOUNDARY_SOURCES,
+    DEFAULT_TIER,
+    SIMPLIFY_TIERS,
+    GeometryRegistry,
+    boundary_store_available,
+    boundary_store_current,
+    read_boundary_store,
+    tier_for_zoom,
+    write_boundary_store,
+)
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    store = tmp_path_factory.mktemp("boundaries") / "boundaries.parquet"
+    write_boundary_store(BOUNDARY_SOURCES, str(store))
+    return str(store)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    # Fresh copies of the sources for every test to modify
+    copies = []
+    for source in BOUNDARY_SOURCES:
+        copy = tmp_path / source.rsplit('/', 1)[-1]
+        shutil.copyfile(source, copy)
+        copies.append(str(copy))
+    return copies
+
+
+def test_store_matches_its_sources(store, sources):
+    assert boundary_store_available(store, sources)
+    assert boundary_store_current(store, sources)
+
+
+def test_missing_store(tmp_path, sources):
+    assert not boundary_store_available(str(tmp_path / "missing.parquet"), sources)
+    assert not boundary_store_current(str(tmp_path / "missing.parquet"), sources)
+
+
+def test_resized_source(store, sources):
+    with open(sources[1], 'a') as f:
+        f.write("\n")
+    assert not boundary_store_available(store, sources)
+    assert not boundary_store_current(store, sources)
+
+
+def test_removed_source(store, sources):
+    assert not boundary_store_available(store, sources[:1])
+
+
+def test_same_size_edit_is_found_by_the_digest_check(store, sources):
+    # The start-up check only compares sizes; the build check reads the files
+    with open(sources[0], 'r+b') as f:
+        first = f.read(1)
+        f.seek(0)
+        f.write(b' ' if first != b' ' else b'\n')
+    assert boundary_store_available(store, sources)
+    assert not boundary_store_current(store, sources)
+
+
+# Registry
+
+@pytest.fixture(scope="module")
+def registry():
+    world = gpd.GeoDataFrame({
+        'iso_a2': ['AA', 'BB', 'cc', '-99', 'DD', 'BB'],
+        'iso3c': ['AAA', 'BBB', 'CCC', '-99', 'DDD', 'BBB'],
+        'name': ['Circle', 'Old square', 'Lower case', 'No code', 'Island', 'Square'],
+        'geometry': [
+            Point(5, 5).buffer(5, quad_segs=64),
+            box(0, 0, 1, 1),
+            box(20, 0, 30, 10),
+            box(40, 0, 50, 10),
+            box(60, 0, 60.01, 0.01),
+            box(10, 0, 20, 10),
+        ],
+    }, crs="EPSG:4326")
+    return GeometryRegistry(world)
+
+
+def test_registry_lookups(registry):
+    # Rows without a code are dropped; a repeated code keeps its last row
+    assert len(registry) == 4
+    assert [entry.iso2c for entry in registry] == ['AA', 'cc', 'DD', 'BB']
+    assert registry.tiers == tuple(SIMPLIFY_TIERS)
+    assert registry.get('BB').name == 'Square'
+    assert registry.get('AA').iso3c == 'AAA'
+    # Codes are found in any case
+    assert registry.get('CC').iso2c == 'cc'
+    assert registry.get('aa').iso2c == 'AA'
+    assert 'bb' in registry and 'ZZ' not in registry
+    assert registry.get('ZZ') is None
+    with pytest.raises(KeyError):
+        registry.get('AA', 'street')
+
+
+def test_registry_centroids_and_bounds(registry):
+    # Taken from the unsimplified shapes, the same in every tier
+    for tier in registry.tiers:
+        entry = registry.get('BB', tier)
+        assert entry.centroid == pytest.approx((5.0, 15.0))
+        assert entry.bounds == (10.0, 0.0, 20.0, 10.0)
+        assert registry.get('AA', tier).centroid == pytest.approx((5.0, 5.0), abs=1e-6)
+
+
+def test_registry_simplified_shapes(registry):
+    vertices = {tier: shapely.get_num_coordinates(registry.get('AA', tier).geometry) for tier in registry.tiers}
+    assert vertices['global'] < vertices['continental'] <= vertices['regional'] < 257
+    for tier, (tolerance, decimals) in SIMPLIFY_TIERS.items():
+        entry = registry.get('AA', tier)
+        coords = shapely.get_coordinates(entry.geometry)
+        np.testing.assert_array_equal(coords, np.round(coords, decimals))
+        # Close to the unsimplified circle
+        assert abs(entry.geometry.area - Point(5, 5).buffer(5, quad_segs=64).area) < 25 * tolerance
+        assert shapely.equals(shapely.from_geojson(entry.geojson), entry.geometry)
+    # A shape collapsing at a tier keeps its unsimplified geometry
+    island = registry.get('DD', 'global').geometry
+    assert not island.is_empty
+    assert island.equals(box(60, 0, 60.01, 0.01))
+
+
+def test_registry_frame(registry):
+    frame = registry.frame('global')
+    assert frame.index.tolist() == ['AA', 'CC', 'DD', 'BB']
+    assert frame['iso2c'].tolist() == ['AA', 'cc', 'DD', 'BB']
+    assert frame.loc['BB', 'geojson'] == registry.get('BB', 'global').geojson
+    # Built once per tier
+    assert registry.frame('global') is frame
+    assert registry.frame() is not frame
+
+
+@pytest.mark.parametrize("lat, lng, isos", [
+    (5.0, 5.0, ['AA']),
+    (5.0, 15.0, ['BB']),
+    (5.0, 10.0, ['AA', 'BB']),   # on the shared border
+    (0.2, 0.2, []),              # inside AA's bounding box, outside the circle
+    (5.0, 45.0, []),             # the shape without a code
+    (-5.0, -5.0, []),
+])
+def test_registry_locate(registry, lat, lng, isos):
+    assert sorted(registry.locate(lat, lng)) == isos
+
+
+def test_registry_within(registry):
+    # BB has 10% of its area in the area, cc none of it
+    area = box(-1, -1, 11, 11)
+    assert registry.within(area) == ['AA']
+    assert sorted(registry.within(area, min_share=0.1)) == ['AA', 'BB']
+    # Exactly half of AA and cc: min_share is inclusive
+    assert sorted(registry.within(box(5, 0, 25, 10))) == ['AA', 'BB', 'cc']
+    assert registry.within(box(5, 0, 25, 10), min_share=0.51) == ['BB']
+    assert registry.within(box(100, 0, 110, 10)) == []
+
+
+def test_registry_from_store(store):
+    registry = GeometryRegistry.from_store(store)
+    world, simplified = read_boundary_store(store)
+    rebuilt = GeometryRegistry(world)
+    # Shapes read from the store are the ones the registry would simplify
+    assert len(simplified) == len(SIMPLIFY_TIERS)
+    for tier in SIMPLIFY_TIERS:
+        for iso in ('FR', 'US', 'CN', 'NO'):
+            assert registry.get(iso, tier).geojson == rebuilt.get(iso, tier).geojson
+    assert registry.locate(48.85, 2.35) == ['FR']
+    assert registry.get('FR', DEFAULT_TIER).iso3c == 'FRA'
+
+
+# Zoom tiers
+
+@pytest.mark.parametrize("zoom, tier", [
+    (0, 'global'),
+    (1, 'global'),
+    (2, 'global'),
+    (3, 'continental'),
+    (4, 'regional'),
+    (5, 'regional'),
+    (18, 'regional'),
+])
+def test_tier_for_zoom(zoom, tier):
+    assert tier_for_zoom(zoom) == tier
+    assert tier in SIMPLIFY_TIERS
+
+
+def test_tiers_coarsen_as_zoom_decreases():
+    tolerances = [SIMPLIFY_TIERS[tier_for_zoom(zoom)][0] for zoom in range(8)]
+    assert tolerances == sorted(tolerances, reverse=True)
@@ -0,0 +1,310 @@
+"""
+Query indexes of utils/indexes.py against plain pandas answers
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.indexes import CollabMembershipIndex, LeaderboardIndex, NationalCube
+
+
+def round_trip(index):
+    return type(index).from_state(index.state())
+
+
+def national_frame(seed: int = 0) -> pd.DataFrame:
+    """National view with gaps: not every country reports every chemical and year"""
+    rng = np.random.default_rng(seed)
+    countries = pd.DataFrame({
+        'iso2c': ['CN', 'DE', 'FR', 'JP', 'US', 'ZA'],
+        'country': ['China', 'Germany', 'France', 'Japan', 'United States', 'South Africa'],
+        'iso3c': ['CHN', 'DEU', 'FRA', 'JPN', 'USA', 'ZAF'],
+        'region': ['Asia', 'Europe', 'Europe', 'Asia', 'North America', 'Africa'],
+        'cc': ['#c00', '#0c0', '#00c', '#cc0', '#0cc', '#c0c'],
+        'lat': [35.0, 51.0, 46.0, 36.0, 38.0, -29.0],
+        'lng': [103.0, 10.0, 2.0, 138.0, -97.0, 24.0],
+    })
+    rows = pd.MultiIndex.from_product(
+        [['All', 'Organic', 'Rare-Earths'], countries['iso2c'], range(2000, 2011)],
+        names=['chemical', 'iso2c', 'year']
+    ).to_frame(index=False)
+    rows = rows[rng.random(len(rows)) < 0.7]
+    national = rows.merge(countries, on='iso2c')
+    national['percentage'] = rng.random(len(national)).astype(np.float32) * 10
+    national['year'] = national['year'].astype(np.int16)
+    for col in ['iso2c', 'chemical', 'country', 'iso3c', 'region', 'cc']:
+        national[col] = national[col].astype('category')
+    # A country category without rows, as left by the region join
+    national['iso2c'] = national['iso2c'].cat.add_categories(['XX'])
+    return national.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def naive_rows(national, chemical, isos, year_range, region_filter="All"):
+    rows = national[
+        (national['chemical'] == chemical) &
+        national['iso2c'].isin(isos) &
+        national['year'].between(*year_range)
+    ]
+    if region_filter != "All":
+        rows = rows[rows['region'] == region_filter]
+    return rows
+
+
+# Collaboration membership bitmasks
+
+# 70 member countries, so the masks need two 64-bit words
+MANY = [f"C{i:02d}" for i in range(70)]
+COLLABS = {
+    'CN-US': ['CN', 'US'],
+    'CN-JP-US': ['CN', 'JP', 'US'],
+    'DE-FR-GB': ['DE', 'FR', 'GB'],
+    'FR-GB': ['FR', 'GB'],
+    'MANY': MANY,
+    'C00-C69': ['C00', 'C69'],
+}
+
+
+@pytest.fixture
+def membership():
+    members = pd.DataFrame(
+        [(collab, member) for collab, collab_members in COLLABS.items() for member in collab_members]
+        + [('CN-US', None)],
+        columns=['iso2c', 'member']
+    )
+    # Category order differs from the membership table order
+    return CollabMembershipIndex(pd.Index(sorted(COLLABS)), members)
+
+
+def expected(predicate):
+    return np.array([predicate(set(COLLABS[collab])) for collab in sorted(COLLABS)])
+
+
+@pytest.mark.parametrize("isos", [['CN'], ['CN', 'US'], ['US', 'CN', 'US'], ['FR', 'GB'], ['C00', 'C69'], ['C63', 'C64'], MANY])
+def test_membership_contains_all(membership, isos):
+    np.testing.assert_array_equal(membership.contains_all(isos), expected(lambda members: set(isos) <= members))
+
+
+@pytest.mark.parametrize("isos", [['JP'], ['DE', 'US'], ['C69', 'XX'], ['XX']])
+def test_membership_contains_any(membership, isos):
+    np.testing.assert_array_equal(membership.contains_any(isos), expected(lambda members: bool(set(isos) & members)))
+
+
+@pytest.mark.parametrize("isos", [['CN', 'US'], ['US', 'CN'], ['FR', 'GB'], ['GB'], MANY])
+def test_membership_exactly(membership, isos):
+    np.testing.assert_array_equal(membership.exactly(isos), expected(lambda members: set(isos) == members))
+
+
+def test_membership_unknown_country_matches_nothing(membership):
+    assert not membership.contains_all(['CN', 'XX']).any()
+    assert not membership.exactly(['XX']).any()
+    with pytest.raises(KeyError):
+        membership.query_mask(['XX'])
+
+
+def test_membership_masks(membership):
+    assert membership.n_words == 2
+    assert membership.masks.shape == (len(COLLABS), 2)
+    assert membership.masks.dtype == np.uint64
+    np.testing.assert_array_equal(membership.sizes, [len(COLLABS[collab]) for collab in sorted(COLLABS)])
+    # Bit j of the mask is member country j
+    row = membership.masks[sorted(COLLABS).index('C00-C69')]
+    c69 = membership.countries.get_loc('C69')
+    assert row[c69 // 64] & np.uint64(1 << (c69 % 64))
+
+
+def test_membership_state_round_trip(membership):
+    restored = round_trip(membership)
+    assert restored.n_words == membership.n_words
+    np.testing.assert_array_equal(restored.masks, membership.masks)
+    for isos in (['CN', 'US'], ['C00', 'C69'], ['XX']):
+        np.testing.assert_array_equal(restored.contains_all(isos), membership.contains_all(isos))
+
+
+# National chemical x country x year cube
+
+@pytest.fixture
+def national():
+    return national_frame()
+
+
+def test_cube_values(national):
+    cube = NationalCube(national)
+    assert cube.values.shape == (3, 7, 11)
+    np.testing.assert_array_equal(cube.years, np.arange(2000, 2011))
+    assert np.isnan(cube.values[:, cube.countries.get_loc('XX')]).all()
+    for row in national.sample(20, random_state=1).itertuples():
+        value = cube.values[cube.chemicals.get_loc(row.chemical), cube.countries.get_loc(row.iso2c), row.year - 2000]
+        assert value == row.percentage
+    assert np.isnan(cube.values).sum() == cube.values.size - len(national)
+
+
+@pytest.mark.parametrize("isos, year_range, region_filter", [
+    (['CN', 'US'], (2000, 2010), "All"),
+    (['US', 'CN', 'US'], (2003, 2005), "All"),
+    (['CN', 'DE', 'FR', 'XX', 'ZZ'], (1990, 2004), "Europe"),
+    (['JP'], (2008, 2030), "All"),
+    (['DE'], (2005, 2005), "Asia"),
+    (['CN'], (2020, 2030), "All"),
+])
+def test_cube_to_frame(national, isos, year_range, region_filter):
+    cube = NationalCube(national)
+    for chemical in ['All', 'Organic']:
+        expected = naive_rows(national, chemical, isos, year_range, region_filter)
+        actual = cube.to_frame(chemical, isos, year_range, region_filter)
+        assert list(actual.columns) == ['iso2c'] + NationalCube.ATTRIBUTE_COLUMNS + ['year', 'chemical', 'percentage']
+        actual = actual.sort_values(['iso2c', 'year']).reset_index(drop=True)
+        expected = expected[list(actual.columns)].sort_values(['iso2c', 'year']).reset_index(drop=True)
+        assert len(actual) == len(expected)
+        for col in actual.columns:
+            assert actual[col].astype(str).tolist() == expected[col].astype(str).tolist(), col
+
+
+def test_cube_to_frame_columns_and_unknown_chemical(national):
+    cube = NationalCube(national)
+    frame = cube.to_frame('Organic', ['CN', 'US'], (2000, 2010), columns=['iso2c', 'year', 'percentage'])
+    assert list(frame.columns) == ['iso2c', 'year', 'percentage']
+    assert cube.to_frame('Unknown', ['CN'], (2000, 2010)).empty
+
+
+def test_cube_state_round_trip(national):
+    cube = NationalCube(national)
+    restored = round_trip(cube)
+    np.testing.assert_array_equal(restored.values, cube.values)
+    pd.testing.assert_frame_equal(restored.country_attrs, cube.country_attrs)
+    pd.testing.assert_frame_equal(
+        restored.to_frame('Organic', ['CN', 'DE', 'FR'], (2002, 2008), "Europe"),
+        cube.to_frame('Organic', ['CN', 'DE', 'FR'], (2002, 2008), "Europe")
+    )
+
+
+# Prefix-sum range aggregates
+
+def naive_aggregates(national, chemical, year_range, region_filter="All"):
+    rows = naive_rows(national, chemical, national['iso2c'].cat.categories, year_range, region_filter)
+    return (
+        rows.groupby('iso2c', observed=True)['percentage']
+        .agg(['mean', 'max', 'min', 'count'])
+        .sort_index()
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cube_range_aggregates(seed):
+    national = national_frame(seed)
+    cube = NationalCube(national)
+    rng = np.random.default_rng(seed)
+    for _ in range(20):
+        first, last = sorted(rng.integers(1995, 2015, size=2, endpoint=True))
+        chemical = str(rng.choice(['All', 'Organic', 'Rare-Earths']))
+        region = str(rng.choice(['All', 'Europe', 'Asia']))
+        expected = naive_aggregates(national, chemical, (first, last), region)
+        actual = cube.range_aggregates(chemical, (first, last), region)
+        if expected.empty:
+            assert actual.empty
+            continue
+        actual = actual.set_index(actual['iso2c'].astype(str)).sort_index()
+        assert actual.index.tolist() == expected.index.astype(str).tolist()
+        np.testing.assert_allclose(actual['avg_percentage'], expected['mean'], rtol=1e-6)
+        np.testing.assert_array_equal(actual['max_percentage'], expected['max'])
+        np.testing.assert_array_equal(actual['min_percentage'], expected['min'])
+        np.testing.assert_array_equal(actual['years_present'], expected['count'])
+
+
+def test_prefix_sums_cover_inclusive_ranges(national):
+    cube = NationalCube(national)
+    assert cube.cum_sums.shape[-1] == len(cube.years) + 1
+    np.testing.assert_array_equal(cube.cum_sums[..., 0], 0)
+    # A single year reads one cell; the whole axis reads the last prefix sum
+    chem, country = cube.chemicals.get_loc('Organic'), cube.countries.get_loc('CN')
+    observed = ~np.isnan(cube.values[chem, country])
+    assert cube.cum_counts[chem, country, -1] == observed.sum()
+    single = cube.year_slice((2004, 2004))
+    assert (single.start, single.stop) == (4, 5)
+    assert cube.year_slice((1990, 1999)) == slice(0, 0)
+    assert cube.year_slice((2011, 2020)) == slice(11, 11)
+    assert cube.year_slice((1990, 2030)) == slice(0, 11)
+
+
+def test_cube_range_aggregates_unknown_chemical(national):
+    assert NationalCube(national).range_aggregates('Unknown', (2000, 2010)).empty
+
+
+# Top-N leaderboards
+
+def naive_top(national, chemical, year_range, n, region_filter="All"):
+    rows = national[national['year'].between(*year_range)]
+    if chemical is not None:
+        rows = rows[rows['chemical'] == chemical]
+    if region_filter != "All":
+        rows = rows[rows['region'] == region_filter]
+    means = rows.groupby('iso2c', observed=True)['percentage'].mean()
+    # Stable sort of the entity-ordered means: ties keep entity order
+    return means.sort_values(ascending=False, kind='stable').head(n)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_leaderboard_top(seed):
+    national = national_frame(seed)
+    board = LeaderboardIndex(national, 'iso2c', region_column='region')
+    rng = np.random.default_rng(seed)
+    for _ in range(20):
+        first, last = sorted(rng.integers(1995, 2015, size=2, endpoint=True))
+        chemical = rng.choice([None, 'All', 'Organic', 'Rare-Earths'])
+        region = str(rng.choice(['All', 'Europe', 'Asia']))
+        n = int(rng.integers(1, 8))
+        expected = naive_top(national, chemical, (first, last), n, region)
+        actual = board.top(chemical, (first, last), n, region)
+        assert actual['rank'].tolist() == list(range(1, len(expected) + 1))
+        assert actual['entity'].astype(str).tolist() == expected.index.astype(str).tolist()
+        np.testing.assert_allclose(actual['avg_percentage'].astype(float), expected.to_numpy(), rtol=1e-5)
+
+
+@pytest.fixture
+def tied():
+    # B, C and D share the second-best average
+    rows = [('A', 5.0), ('B', 2.0), ('C', 2.0), ('D', 1.0), ('D', 3.0), ('E', 1.0)]
+    series = pd.DataFrame({
+        'entity': pd.Categorical([entity for entity, _ in rows], categories=list('EDCBA')),
+        'chemical': pd.Categorical(['Organic'] * len(rows)),
+        'year': np.full(len(rows), 2000, dtype=np.int16),
+        'percentage': np.array([value for _, value in rows], dtype=np.float32),
+    })
+    return LeaderboardIndex(series, 'entity')
+
+
+@pytest.mark.parametrize("n, entities", [
+    (1, ['A']),
+    (2, ['A', 'D']),
+    (3, ['A', 'D', 'C']),
+    (4, ['A', 'D', 'C', 'B']),
+    (10, ['A', 'D', 'C', 'B', 'E']),
+])
+def test_leaderboard_ties_follow_entity_order(tied, n, entities):
+    # Entity order is the category order (E, D, C, B, A), not alphabetical
+    top = tied.top('Organic', (2000, 2000), n)
+    assert top['entity'].tolist() == entities
+    np.testing.assert_allclose(top['avg_percentage'], [5.0, 2.0, 2.0, 2.0, 1.0][:len(entities)])
+
+
+def test_leaderboard_empty_results(national):
+    board = LeaderboardIndex(national, 'iso2c', region_column='region')
+    for top in (
+        board.top('Unknown', (2000, 2010)),
+        board.top('Organic', (2020, 2030)),
+        board.top('Organic', (2000, 2010), region_filter='Antarctica'),
+    ):
+        assert top.empty
+        assert list(top.columns) == ['rank', 'entity', 'avg_percentage']
+
+
+def test_leaderboard_state_round_trip(national):
+    board = LeaderboardIndex(national, 'iso2c', region_column='region')
+    restored = round_trip(board)
+    np.testing.assert_array_equal(restored.cum_sums, board.cum_sums)
+    np.testing.assert_array_equal(restored.regions, board.regions)
+    for chemical in (None, 'Organic'):
+        pd.testing.assert_frame_equal(
+            restored.top(chemical, (2002, 2008), 4, 'Europe'),
+            board.top(chemical, (2002, 2008), 4, 'Europe')
+        )
@@ -0,0 +1,232 @@
+"""
+Clicks and drawn areas on the selection map: the events the map sends and
+their resolution on the server
+"""
+
+import json
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+import shapely
+from jinja2 import Template
+from shapely.geometry import box, mapping
+
+import utils.functions
+from utils.data_store import DataStore
+from utils.functions import (
+    MAP_AREA_MIN_SHARE,
+    MAP_CLICK_MAX_DISTANCE_KM,
+    MAP_SELECTION_SCRIPT,
+    TABLES_DIR,
+    _distance_km,
+    resolve_map_area,
+    resolve_map_click,
+)
+from utils.geometry import read_boundary_store
+
+
+@pytest.fixture(scope="module")
+def country_list():
+    return DataStore.from_tables(TABLES_DIR).country_list
+
+
+@pytest.fixture
+def no_registry(monkeypatch):
+    def unavailable():
+        raise FileNotFoundError("no boundaries")
+    monkeypatch.setattr(utils.functions, 'get_geometry_registry', unavailable)
+
+
+# Clicks
+
+def test_distance_km():
+    # One degree of longitude on the equator, also across the antimeridian
+    np.testing.assert_allclose(_distance_km(0.0, 0.0, np.array([0.0]), np.array([1.0])), 111.195, rtol=1e-4)
+    np.testing.assert_allclose(_distance_km(0.0, 179.5, np.array([0.0]), np.array([-179.5])), 111.195, rtol=1e-4)
+    # Paris to London
+    np.testing.assert_allclose(_distance_km(48.8566, 2.3522, np.array([51.5072]), np.array([-0.1276])), 343.5, rtol=1e-2)
+
+
+@pytest.mark.parametrize("lat, lng, iso", [
+    (48.85, 2.35, 'FR'),           # Paris
+    (48.85, 362.35, 'FR'),         # Paris, one world copy to the east
+    (4.0, -53.0, 'FR'),            # French Guiana is part of France's shape
+    (30.0, 114.0, 'CN'),
+    (23.5, 121.0, 'TW'),
+    (22.3, 114.17, 'HK'),          # Hong Kong's marker, drawn over China's shape
+    (22.7, 114.0, 'HK'),           # within MAP_CLICK_MAX_DISTANCE_KM of the marker
+    (23.6, 113.3, 'CN'),           # beyond it
+    (1.35, 103.82, 'SG'),          # Singapore's marker, inside Malaysia's shape
+    (0.0, -30.0, None),            # Atlantic Ocean
+    (-60.0, 90.0, None),           # Southern Ocean
+])
+def test_resolve_map_click(country_list, lat, lng, iso):
+    assert resolve_map_click(country_list, lat, lng) == iso
+
+
+def test_resolve_map_click_marker_distance(country_list):
+    hk = country_list.loc[country_list['iso2c'] == 'HK'].iloc[0]
+    distance = _distance_km(22.7, 114.0, np.array([hk['lat']]), np.array([hk['lng']]))[0]
+    assert distance < MAP_CLICK_MAX_DISTANCE_KM
+    distance = _distance_km(23.6, 113.3, np.array([hk['lat']]), np.array([hk['lng']]))[0]
+    assert distance > MAP_CLICK_MAX_DISTANCE_KM
+
+
+def test_resolve_map_click_only_listed_countries(country_list):
+    # Without Hong Kong on the map the click falls through to China's shape
+    assert resolve_map_click(country_list[country_list['iso2c'] != 'HK'], 22.3, 114.17) == 'CN'
+    assert resolve_map_click(country_list[country_list['region'] == 'Europe'], 30.0, 114.0) is None
+
+
+def test_resolve_map_click_without_registry(country_list, no_registry):
+    # Every country is a marker: the nearest location within reach wins
+    france = country_list.loc[country_list['iso2c'] == 'FR'].iloc[0]
+    assert resolve_map_click(country_list, france['lat'] + 0.3, france['lng'] - 0.3) == 'FR'
+    assert resolve_map_click(country_list, 22.3, 114.17) == 'HK'
+    # Paris is too far from France's location without the shapes
+    assert resolve_map_click(country_list, 48.85, 2.35) is None
+    assert resolve_map_click(country_list, 0.0, -30.0) is None
+
+
+# Drawn areas
+
+@pytest.fixture(scope="module")
+def shapes():
+    world, _ = read_boundary_store()
+    return dict(zip(world['iso2c'], world.geometry))
+
+
+def west_of(shape, share: float):
+    """Box covering the given share (by area) of a shape, from its western edge"""
+    minx, miny, maxx, maxy = shape.bounds
+    low, high = minx, maxx
+    for _ in range(60):
+        mid = (low + high) / 2
+        area = box(minx - 1, miny - 1, mid, maxy + 1)
+        if shapely.area(shapely.intersection(shape, area)) / shape.area < share:
+            low = mid
+        else:
+            high = mid
+    return box(minx - 1, miny - 1, high, maxy + 1)
+
+
+@pytest.mark.parametrize("share, selected", [
+    (MAP_AREA_MIN_SHARE + 0.05, True),
+    (MAP_AREA_MIN_SHARE + 0.001, True),
+    (MAP_AREA_MIN_SHARE - 0.001, False),
+    (MAP_AREA_MIN_SHARE - 0.05, False),
+])
+def test_resolve_map_area_share(country_list, shapes, share, selected):
+    area = west_of(shapes['DE'], share)
+    assert ('DE' in resolve_map_area(country_list, mapping(area))) is selected
+
+
+def test_resolve_map_area_rectangle(country_list):
+    # Western Europe, as drawn with the rectangle tool
+    selected = resolve_map_area(country_list, mapping(box(-10.0, 42.0, 16.0, 56.0)))
+    # Italy has about 60% of its area inside
+    assert {'FR', 'DE', 'BE', 'NL', 'GB', 'CH', 'LU', 'IT'} <= set(selected)
+    # Spain (about 26%), Poland (about 12%) and Norway are mostly outside
+    assert not {'ES', 'PL', 'NO', 'US'} & set(selected)
+    # Country list order
+    order = country_list.drop_duplicates(subset=['iso2c'])['iso2c'].tolist()
+    assert selected == sorted(selected, key=order.index)
+
+
+def test_resolve_map_area_multipolygon_country(country_list):
+    # French Guiana alone is a small share of France
+    assert 'FR' not in resolve_map_area(country_list, mapping(box(-55.0, 1.5, -51.0, 6.0)))
+    assert 'FR' in resolve_map_area(country_list, mapping(box(-6.0, 41.0, 10.0, 52.0)))
+
+
+def test_resolve_map_area_markers(country_list):
+    # Singapore is a marker: its location decides, not Malaysia's shape
+    lasso = {'type': 'Polygon', 'coordinates': [[[103.5, 1.1], [104.2, 1.1], [104.2, 1.6], [103.5, 1.6], [103.5, 1.1]]]}
+    assert resolve_map_area(country_list, lasso) == ['SG']
+    assert 'HK' in resolve_map_area(country_list, mapping(box(113.8, 22.1, 114.5, 22.6)))
+
+
+def test_resolve_map_area_lasso(country_list):
+    # Self-intersecting lasso around Germany and Poland, repaired by make_valid
+    bowtie = {'type': 'Polygon', 'coordinates': [[[5.0, 47.0], [25.0, 55.5], [25.0, 47.0], [5.0, 55.5], [5.0, 47.0]]]}
+    selected = resolve_map_area(country_list, bowtie)
+    assert isinstance(selected, list)
+    assert not {'US', 'CN'} & set(selected)
+    triangle = {'type': 'Polygon', 'coordinates': [[[-20.0, 30.0], [60.0, 30.0], [20.0, 75.0], [-20.0, 30.0]]]}
+    assert {'DE', 'PL', 'FR'} <= set(resolve_map_area(country_list, triangle))
+
+
+def test_resolve_map_area_invalid(country_list):
+    assert resolve_map_area(country_list, {'type': 'Polygon', 'coordinates': 'nonsense'}) == []
+    assert resolve_map_area(country_list, mapping(box(-40.0, -10.0, -20.0, 10.0))) == []
+
+
+def test_resolve_map_area_without_registry(country_list, no_registry):
+    # Every country is a marker: selected when its location is inside
+    france = country_list.loc[country_list['iso2c'] == 'FR'].iloc[0]
+    around = box(france['lng'] - 0.5, france['lat'] - 0.5, france['lng'] + 0.5, france['lat'] + 0.5)
+    assert resolve_map_area(country_list, mapping(around)) == ['FR']
+
+
+# Click events in the browser
+
+# Minimal Leaflet event model: a click on a country fires on the country
+# layer and then bubbles up to the map (bubblingMouseEvents of paths); a
+# click elsewhere only fires on the map. Shiny inputs are recorded.
+CLICK_HARNESS = """
+function Evented() { this.handlers = {}; }
+Evented.prototype.on = function (type, handler) {
+    (this.handlers[type] = this.handlers[type] || []).push(handler);
+    return this;
+};
+Evented.prototype.fire = function (type, event) {
+    (this.handlers[type] || []).forEach(function (handler) { handler(event); });
+};
+var map = new Evented();
+var layer = new Evented();
+layer.bindTooltip = function () { return layer; };
+var drawn = {removeLayer: function () {}};
+var sent = [];
+globalThis.window = globalThis;
+globalThis.Shiny = {setInputValue: function (name, value) { sent.push(name); }};
+var fs = require('fs');
+eval(fs.readFileSync(0, 'utf8'));
+var click = {latlng: {lat: 48.85, lng: 2.35}};
+var counts = {};
+function count(label) { counts[label] = sent.filter(function (name) { return name === 'map_click'; }).length; sent = []; }
+layer.fire('click', click); map.fire('click', click);
+count('country');
+map.fire('click', click);
+count('map');
+map.fire('draw:drawstart', {}); layer.fire('click', click); map.fire('click', click);
+count('drawing');
+process.stdout.write(JSON.stringify(counts));
+process.exit(0);
+"""
+
+
+class _Element:
+    # Names the selection script is rendered with
+    layer_name = 'layer'
+    drawn_name = 'drawn'
+
+    class _parent:
+        @staticmethod
+        def get_name():
+            return 'map'
+
+    @staticmethod
+    def get_name():
+        return 'selection'
+
+
+def test_one_click_sends_one_event():
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip("node is not installed")
+    script = Template(MAP_SELECTION_SCRIPT).module.script(_Element, {})
+    result = subprocess.run([node, '-e', CLICK_HARNESS], input=str(script), capture_output=True, text=True, check=True)
+    # One click on a country is one map_click event, so one toggle on the server
+    assert json.loads(result.stdout) == {'country': 1, 'map': 1, 'drawing': 0}
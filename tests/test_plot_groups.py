@@ -0,0 +1,102 @@
+"""
+Single-pass trace grouping used by the plot builders
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.functions import first_valid, iter_trace_groups
+
+
+@pytest.fixture
+def rows():
+    return pd.DataFrame({
+        'plot_group': ['China', 'United States', None, 'China', np.nan, 'Japan', 'United States', 'China'],
+        'year': [2000, 2000, 2000, 2001, 2001, 2001, 2002, 2002],
+        'total_percentage': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, np.nan, 8.0],
+        'plot_color': [None, '#00f', '#000', '#f00', '#000', '#0f0', '#00f', '#f00'],
+    })
+
+
+def naive_groups(data, group_column, columns, order=None):
+    """One boolean filter per group, as the plot builders used to do"""
+    if order is None:
+        order = data[group_column].dropna().unique()
+    for group in order:
+        if pd.isna(group) or group not in set(data[group_column].dropna()):
+            continue
+        group_data = data[data[group_column] == group]
+        yield group, {col: group_data[col].to_numpy() for col in columns if col in data.columns}
+
+
+def assert_same_groups(actual, expected):
+    actual, expected = list(actual), list(expected)
+    assert [group for group, _ in actual] == [group for group, _ in expected]
+    for (group, arrays), (_, expected_arrays) in zip(actual, expected):
+        assert arrays.keys() == expected_arrays.keys()
+        for col, values in expected_arrays.items():
+            np.testing.assert_array_equal(arrays[col], values, err_msg=f"{group} {col}")
+
+
+def test_groups_in_order_of_appearance(rows):
+    columns = ('year', 'total_percentage', 'plot_color')
+    groups = list(iter_trace_groups(rows, 'plot_group', columns))
+    assert [group for group, _ in groups] == ['China', 'United States', 'Japan']
+    assert_same_groups(groups, naive_groups(rows, 'plot_group', columns))
+    # Rows keep their original order within a group
+    np.testing.assert_array_equal(groups[0][1]['year'], [2000, 2001, 2002])
+
+
+def test_rows_without_group_are_skipped(rows):
+    groups = dict(iter_trace_groups(rows, 'plot_group', ('total_percentage',)))
+    values = np.concatenate(list(arrays['total_percentage'] for arrays in groups.values()))
+    assert 3.0 not in values and 5.0 not in values
+    assert sum(len(arrays['total_percentage']) for arrays in groups.values()) == rows['plot_group'].notna().sum()
+
+
+def test_all_groups_missing(rows):
+    rows['plot_group'] = np.nan
+    assert list(iter_trace_groups(rows, 'plot_group', ('year',))) == []
+
+
+def test_empty_frame(rows):
+    assert list(iter_trace_groups(rows.iloc[:0], 'plot_group', ('year',))) == []
+
+
+@pytest.mark.parametrize("order", [
+    ['Japan', 'China', 'United States'],
+    ['Japan', None, 'China'],
+    [np.nan, 'United States', pd.NA],
+    ['France', 'China', 'Atlantis'],
+    [],
+])
+def test_explicit_order(rows, order):
+    columns = ('year', 'total_percentage')
+    assert_same_groups(
+        iter_trace_groups(rows, 'plot_group', columns, order=order),
+        naive_groups(rows, 'plot_group', columns, order=order)
+    )
+
+
+def test_categorical_groups(rows):
+    rows['plot_group'] = pd.Categorical(rows['plot_group'], categories=['Brazil', 'China', 'Japan', 'United States'])
+    columns = ('year', 'plot_color')
+    # Unused categories yield no trace
+    assert_same_groups(
+        iter_trace_groups(rows, 'plot_group', columns),
+        naive_groups(rows, 'plot_group', columns)
+    )
+    assert [group for group, _ in iter_trace_groups(rows, 'plot_group', columns, order=['Brazil', 'Japan'])] == ['Japan']
+
+
+def test_missing_columns_are_skipped(rows):
+    _, arrays = next(iter_trace_groups(rows, 'plot_group', ('year', 'no_such_column')))
+    assert list(arrays) == ['year']
+
+
+def test_first_valid(rows):
+    groups = dict(iter_trace_groups(rows, 'plot_group', ('plot_color', 'total_percentage')))
+    assert first_valid(groups['China']['plot_color']) == '#f00'
+    assert first_valid(groups['United States']['total_percentage']) == 2.0
+    assert first_valid(np.array([None, np.nan], dtype=object), '#808080') == '#808080'
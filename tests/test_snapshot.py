@@ -0,0 +1,113 @@
+"""
+Prepared-state snapshots: write_snapshot/load_snapshot round-trip
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_store import DataStore
+from utils.functions import DATA_TABLES, TABLES_DIR, calculate_top_contributors, get_display_data
+from utils.snapshot import (
+    SNAPSHOT_INDEXES,
+    SNAPSHOT_METADATA,
+    SNAPSHOT_VIEWS,
+    load_snapshot,
+    snapshot_available,
+    write_snapshot,
+)
+
+
+@pytest.fixture(scope="module")
+def store():
+    return DataStore.from_tables(TABLES_DIR)
+
+
+@pytest.fixture(scope="module")
+def snapshot_dir(store, tmp_path_factory):
+    snapshot_dir = tmp_path_factory.mktemp("snapshot") / "snapshot"
+    write_snapshot(store, str(snapshot_dir))
+    return snapshot_dir
+
+
+@pytest.fixture(scope="module")
+def snapshot_store(snapshot_dir):
+    return DataStore.from_snapshot(str(snapshot_dir), tables_dir=TABLES_DIR)
+
+
+def assert_same_state(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, np.ndarray):
+            assert actual[key].dtype == value.dtype, key
+            np.testing.assert_array_equal(actual[key], value, err_msg=key)
+        elif isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(actual[key], value, obj=key)
+        else:
+            assert actual[key] == value, key
+
+
+def test_round_trip_tables_and_views(store, snapshot_dir):
+    snapshot = load_snapshot(str(snapshot_dir))
+    for name in DATA_TABLES:
+        pd.testing.assert_frame_equal(snapshot['tables'][name], store.table(name), obj=name)
+    for name in SNAPSHOT_VIEWS:
+        pd.testing.assert_frame_equal(snapshot['views'][name], getattr(store, name), obj=name)
+    for name in SNAPSHOT_METADATA:
+        assert snapshot['views'][name] == getattr(store, name)
+
+
+@pytest.mark.parametrize("name", list(SNAPSHOT_INDEXES))
+def test_round_trip_indexes(store, snapshot_dir, name):
+    index = load_snapshot(str(snapshot_dir))['views'][name]
+    assert isinstance(index, SNAPSHOT_INDEXES[name])
+    assert_same_state(index.state(), getattr(store, name).state())
+
+
+def test_snapshot_store_answers_like_table_store(store, snapshot_store):
+    for isos, mode in [(['CN', 'US', 'DE'], 'compare_individuals'), (['CN', 'US'], 'find_collaborations')]:
+        pd.testing.assert_frame_equal(
+            get_display_data(snapshot_store, isos, (2000, 2015), 'Organic', mode).reset_index(drop=True),
+            get_display_data(store, isos, (2000, 2015), 'Organic', mode).reset_index(drop=True)
+        )
+    pd.testing.assert_frame_equal(
+        calculate_top_contributors(snapshot_store, (2000, 2015), 'All', 'Europe'),
+        calculate_top_contributors(store, (2000, 2015), 'All', 'Europe')
+    )
+
+
+def test_snapshot_views_are_mapped(snapshot_store):
+    # Views projecting a mapped table share its memory instead of copying it
+    table = snapshot_store.table('collaborations')
+    view = snapshot_store.collaborations
+    for col in ['year', 'percentage']:
+        assert np.shares_memory(table[col].to_numpy(), view[col].to_numpy())
+        assert not view[col].to_numpy().flags.writeable
+    assert not snapshot_store.national['percentage'].to_numpy().flags.writeable
+    assert not snapshot_store.national_cube.values.flags.writeable
+
+
+def test_snapshot_available(store, tmp_path):
+    tables_dir = tmp_path / "tables"
+    shutil.copytree(TABLES_DIR, tables_dir)
+    snapshot_dir = tmp_path / "snapshot"
+    assert not snapshot_available(str(snapshot_dir), str(tables_dir))
+
+    write_snapshot(DataStore.from_tables(str(tables_dir)), str(snapshot_dir))
+    assert snapshot_available(str(snapshot_dir), str(tables_dir))
+
+    # Tables rebuilt after the snapshot was written
+    manifest = json.loads((snapshot_dir / "manifest.json").read_text())
+    newer = manifest['source_mtime'] + 10
+    os.utime(tables_dir / "national.parquet", (newer, newer))
+    assert not snapshot_available(str(snapshot_dir), str(tables_dir))
+
+    # Snapshot written by an older layout
+    manifest['format'] -= 1
+    manifest['source_mtime'] = newer
+    (snapshot_dir / "manifest.json").write_text(json.dumps(manifest))
+    assert not snapshot_available(str(snapshot_dir), str(tables_dir))
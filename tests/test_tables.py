@@ -0,0 +1,129 @@
+"""
+Normalized tables split from the wide data.parquet
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.functions import ARTICLE_COLUMNS_MAP, DATA_PATH, DATA_TABLES, split_data_tables, to_compact_schema
+
+
+@pytest.fixture(scope="module")
+def data():
+    return pd.read_parquet(DATA_PATH)
+
+
+@pytest.fixture(scope="module")
+def tables(data):
+    return split_data_tables(data)
+
+
+def test_split_tables(data, tables):
+    assert tuple(tables) == DATA_TABLES
+    national_rows = data[data['is_collab'] == False]
+    collab_rows = data[data['is_collab'] == True]
+    assert tables['national'].shape == (len(national_rows), 5)
+    assert tables['collaborations'].shape == (len(collab_rows), 8)
+    # Rows without is_collab only carry the article figures
+    assert len(national_rows) + len(collab_rows) + data['is_collab'].isna().sum() == len(data)
+
+
+def test_series_keys(data, tables):
+    for name in ('national', 'collaborations'):
+        keys = tables[name][['iso2c', 'year', 'chemical']]
+        assert not keys.isna().any().any(), name
+        assert not keys.duplicated().any(), name
+    pd.testing.assert_series_equal(
+        tables['national']['percentage'].astype(float),
+        data.loc[data['is_collab'] == False, 'percentage'].reset_index(drop=True),
+        check_names=False, rtol=1e-6
+    )
+
+
+def test_countries(data, tables):
+    countries = tables['countries']
+    assert list(countries.columns) == ['country', 'iso2c', 'iso3c', 'lat', 'lng', 'cc', 'region']
+    assert countries['country'].is_monotonic_increasing
+    assert not countries['region'].isna().any()
+    assert not countries.duplicated(subset=['country', 'iso2c', 'lat', 'lng', 'cc', 'region']).any()
+    # Every country of the national series is in the dimension table
+    assert set(tables['national']['iso2c']) <= set(countries['iso2c'])
+    named = data[(data['is_collab'] == False) & data['country'].notna() & (data['country'] != '')]
+    assert set(countries['iso2c']) == set(named['iso2c'].dropna()) - {''}
+
+
+def test_collab_members(tables):
+    members = tables['collab_members']
+    collaborations = set(tables['collaborations']['iso2c'])
+    assert set(members['iso2c']) == collaborations
+    assert not members.duplicated().any()
+    # One row per member of each collaboration
+    sizes = members.groupby('iso2c', observed=True).size()
+    for iso, size in sizes.items():
+        assert size == len(iso.split('-')), iso
+    assert set(members.groupby('iso2c', observed=True)['member'].apply(lambda m: '-'.join(m))) == collaborations
+
+
+def test_article(data, tables):
+    article = tables['article']
+    assert list(article.columns) == list(ARTICLE_COLUMNS_MAP.values())
+    rows = data[data['percentage_x'].notna() & data['source'].notna() & (data['source'] != '')]
+    assert len(article) == len(rows)
+
+
+def test_article_missing_columns(data):
+    tables = split_data_tables(data.drop(columns=['source']))
+    assert tables['article'].empty
+    assert list(tables['article'].columns) == list(ARTICLE_COLUMNS_MAP.values())
+
+
+# Compact schema
+
+@pytest.fixture
+def raw():
+    return pd.DataFrame({
+        'iso2c': ['CN', 'US', None, 'CN'],
+        'year': [1996.0, 2000.0, 2010.0, 2022.0],
+        'chemical': pd.array(['All', 'Organic', 'All', 'Rare-Earths'], dtype='string'),
+        'is_collab': [True, None, False, True],
+        'percentage': [12.5, 0.125, np.nan, 99.0],
+        'value_raw': [1e6, 3.0, 0.0, 42.0],
+        'lat': [35.0, 38.0, 0.0, 35.0],
+    })
+
+
+def test_compact_dtypes(raw):
+    compact = to_compact_schema(raw)
+    assert compact['year'].dtype == np.int16
+    assert compact['is_collab'].dtype == bool
+    assert compact['percentage'].dtype == np.float32
+    assert compact['value_raw'].dtype == np.float32
+    assert isinstance(compact['iso2c'].dtype, pd.CategoricalDtype)
+    assert isinstance(compact['chemical'].dtype, pd.CategoricalDtype)
+    # Other numeric columns keep their dtype
+    assert compact['lat'].dtype == np.float64
+    # The input is left alone
+    assert raw['year'].dtype == np.float64
+
+
+def test_compact_values_round_trip(raw):
+    compact = to_compact_schema(raw)
+    np.testing.assert_array_equal(compact['year'], raw['year'].astype(int))
+    assert compact['is_collab'].tolist() == [True, False, False, True]
+    np.testing.assert_allclose(compact['percentage'], raw['percentage'], rtol=1e-7)
+    np.testing.assert_allclose(compact['value_raw'], raw['value_raw'], rtol=1e-7)
+    assert compact['iso2c'].isna().tolist() == [False, False, True, False]
+    assert compact['iso2c'].dropna().astype(str).tolist() == ['CN', 'US', 'CN']
+    assert compact['iso2c'].cat.categories.tolist() == ['CN', 'US']
+    assert compact['chemical'].astype(str).tolist() == raw['chemical'].tolist()
+
+
+def test_compact_tables_round_trip(data, tables):
+    # Compaction loses no information the app reads (shares within float32 precision)
+    national = tables['national']
+    rows = data[data['is_collab'] == False].reset_index(drop=True)
+    assert national['iso2c'].astype(str).tolist() == rows['iso2c'].tolist()
+    np.testing.assert_array_equal(national['year'], rows['year'])
+    np.testing.assert_allclose(national['percentage'], rows['percentage'], rtol=1e-6)
+    np.testing.assert_allclose(national['value_raw'], rows['value_raw'], rtol=1e-6)
@@ -0,0 +1,76 @@
+"""
+Local basemap tile stores
+"""
+
+import sqlite3
+
+import pytest
+
+from utils import tiles
+from utils.tiles import DirectoryTileStore, MBTilesStore, TileStore, get_tile_store, open_tile_store
+
+
+@pytest.fixture
+def pyramid(tmp_path):
+    for z, x, y in [(0, 0, 0), (1, 0, 1), (1, 1, 0)]:
+        path = tmp_path / "tiles" / str(z) / str(x)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / f"{y}.webp").write_bytes(f"tile {z}/{x}/{y}".encode())
+    return tmp_path / "tiles"
+
+
+@pytest.fixture
+def mbtiles(tmp_path):
+    path = tmp_path / "tiles.mbtiles"
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        db.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        db.executemany("INSERT INTO metadata VALUES (?, ?)", [('format', 'jpg'), ('attribution', 'Test tiles')])
+        # TMS rows: XYZ tile 1/0/0 is stored as row 1
+        db.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", [(0, 0, 0, b'world'), (2, 1, 2, b'tile 2/1/1')])
+    db.close()
+    return path
+
+
+@pytest.fixture
+def no_cached_store():
+    get_tile_store.cache_clear()
+    yield
+    get_tile_store.cache_clear()
+
+
+def test_tile_store_is_abstract():
+    with pytest.raises(TypeError):
+        TileStore()
+
+
+def test_directory_store(pyramid):
+    store = open_tile_store(str(pyramid))
+    assert isinstance(store, DirectoryTileStore)
+    assert (store.min_zoom, store.max_zoom, store.tile_format, store.media_type) == (0, 1, 'webp', 'image/webp')
+    assert store.get(1, 0, 1) == b"tile 1/0/1"
+    assert store.get(1, 1, 1) is None
+    assert store.get(5, 0, 0) is None
+
+
+def test_mbtiles_store(mbtiles):
+    store = open_tile_store(str(mbtiles))
+    assert isinstance(store, MBTilesStore)
+    assert (store.min_zoom, store.max_zoom, store.media_type, store.attribution) == (0, 2, 'image/jpeg', 'Test tiles')
+    assert store.get(0, 0, 0) == b'world'
+    assert store.get(2, 1, 1) == b'tile 2/1/1'
+    assert store.get(2, 1, 2) is None
+
+
+def test_get_tile_store_from_environment(pyramid, monkeypatch, no_cached_store):
+    monkeypatch.setenv(tiles.TILES_ENV, str(pyramid))
+    assert isinstance(get_tile_store(), DirectoryTileStore)
+    assert tiles.tile_layer_options()['max_native_zoom'] == 1
+
+
+def test_get_tile_store_unreadable(tmp_path, monkeypatch, capsys, no_cached_store):
+    (tmp_path / "empty").mkdir()
+    monkeypatch.setenv(tiles.TILES_ENV, str(tmp_path / "empty"))
+    assert get_tile_store() is None
+    assert "using online tiles" in capsys.readouterr().out
+    assert tiles.tile_layer_options() is None
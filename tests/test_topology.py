@@ -0,0 +1,90 @@
+"""
+Browser-side decoding of the TopoJSON boundaries (www/topojson_feature.js)
+"""
+
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from utils.topology import TOPOLOGY_DECODER_URL, TOPOLOGY_DIR, TOPOLOGY_OBJECT
+
+DECODER = Path("www") / TOPOLOGY_DECODER_URL
+
+# Loads the decoder the way a page does (top-level this is the global
+# object) and prints topojson.feature of the topology read from stdin
+DECODE = """
+const fs = require('fs');
+new Function(fs.readFileSync(process.argv[1], 'utf8')).call(globalThis);
+const topology = JSON.parse(fs.readFileSync(0, 'utf8'));
+process.stdout.write(JSON.stringify(topojson.feature(topology, topology.objects[process.argv[2]])));
+"""
+
+
+def decode_in_node(topology: dict) -> dict:
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip("node is not installed")
+    result = subprocess.run(
+        [node, '-e', DECODE, str(DECODER), TOPOLOGY_OBJECT],
+        input=json.dumps(topology), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def reference_rings(topology: dict, arc_refs):
+    """Rings of a geometry as coordinate arrays, decoded with NumPy"""
+    transform = topology['transform']
+    arcs = [np.cumsum(np.asarray(arc, dtype=float), axis=0) * transform['scale'] + transform['translate'] for arc in topology['arcs']]
+    rings = []
+    for ring in arc_refs:
+        parts = [arcs[ref] if ref >= 0 else arcs[~ref][::-1] for ref in ring]
+        rings.append(np.vstack([parts[0]] + [part[1:] for part in parts[1:]]))
+    return rings
+
+
+def test_decoder_matches_topology():
+    topology = json.loads((Path(TOPOLOGY_DIR) / "continental.topo.json").read_text())
+    geometries = topology['objects'][TOPOLOGY_OBJECT]['geometries']
+    features = decode_in_node(topology)['features']
+    assert [feature['id'] for feature in features] == [geometry['id'] for geometry in geometries]
+
+    for feature, geometry in zip(features, geometries):
+        assert feature['geometry']['type'] == geometry['type']
+        polygons = [geometry['arcs']] if geometry['type'] == 'Polygon' else geometry['arcs']
+        decoded = [feature['geometry']['coordinates']] if geometry['type'] == 'Polygon' else feature['geometry']['coordinates']
+        assert len(decoded) == len(polygons)
+        for rings, arc_refs in zip(decoded, polygons):
+            for ring, expected in zip(rings, reference_rings(topology, arc_refs)):
+                if len(expected) >= 4:
+                    np.testing.assert_allclose(ring, expected, atol=1e-9, err_msg=geometry['id'])
+                # Rings are closed, with at least four positions
+                assert len(ring) >= 4 and ring[0] == ring[-1]
+
+
+def test_decoder_small_topology():
+    # Two squares sharing the arc x=1; the right one references it reversed
+    topology = {
+        'type': 'Topology',
+        'transform': {'scale': [0.5, 0.5], 'translate': [10.0, 20.0]},
+        'objects': {TOPOLOGY_OBJECT: {'type': 'GeometryCollection', 'geometries': [
+            {'type': 'Polygon', 'id': 'AA', 'arcs': [[0, 1]]},
+            {'type': 'MultiPolygon', 'id': 'BB', 'arcs': [[[2, ~0]]]},
+        ]}},
+        'arcs': [
+            [[2, 0], [0, 2]],
+            [[2, 2], [-2, 0], [0, -2], [2, 0]],
+            [[2, 0], [2, 0], [0, 2], [-2, 0]],
+        ],
+    }
+    features = decode_in_node(topology)['features']
+    assert features[0] == {
+        'type': 'Feature', 'id': 'AA', 'properties': {},
+        'geometry': {'type': 'Polygon', 'coordinates': [[[11, 20], [11, 21], [10, 21], [10, 20], [11, 20]]]}
+    }
+    assert features[1]['geometry'] == {
+        'type': 'MultiPolygon', 'coordinates': [[[[11, 20], [12, 20], [12, 21], [11, 21], [11, 20]]]]
+    }
@@ -0,0 +1,107 @@
+"""
+Vendored browser assets of the selection map
+
+folium loads Leaflet, jQuery, Bootstrap, Font Awesome and the Leaflet
+plugins from CDNs. The build step copies them, and the fonts and images
+their stylesheets refer to, into www/vendor/, mirroring the CDN URLs
+(www/vendor/<host>/<path>) so that relative references keep working. The
+map then loads every asset that has a local copy from the app itself.
+
+The copies are fetched once, with network access:
+    python -m utils.build assets
+"""
+
+import re
+import urllib.request
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import urljoin, urlsplit
+
+# Directory the assets are copied to, served by the app under VENDOR_URL
+VENDOR_DIR = "./www/vendor"
+VENDOR_URL = "vendor"
+
+# Relative url(...) references in a stylesheet (fonts and images)
+CSS_URL_PATTERN = re.compile(r"""url\(\s*['"]?(?!data:|https?:|//)([^'")?#]+)""")
+
+FETCH_TIMEOUT = 30
+
+
+def _vendor_path(url: str) -> str:
+    # Path of an asset's copy below VENDOR_DIR, mirroring its URL
+    parts = urlsplit(url)
+    return parts.netloc + parts.path
+
+
+def vendored_url(url: str, vendor_dir: str = VENDOR_DIR) -> str:
+    """URL of the local copy of an asset, or the asset's own URL when it has none"""
+    path = _vendor_path(url)
+    if (Path(vendor_dir) / path).is_file():
+        return f"{VENDOR_URL}/{path}"
+    return url
+
+
+def use_vendored_assets(element, vendor_dir: str = VENDOR_DIR):
+    """
+    Point a folium element's default_js and default_css at the local copies
+
+    Assets without a local copy keep their CDN URL.
+    """
+    element.default_js = [(name, vendored_url(url, vendor_dir)) for name, url in element.default_js]
+    element.default_css = [(name, vendored_url(url, vendor_dir)) for name, url in element.default_css]
+    return element
+
+
+def asset_urls(elements: Iterable) -> List[str]:
+    """CDN URLs of the scripts and stylesheets of folium element classes"""
+    urls = []
+    for element in elements:
+        for _, url in list(getattr(element, 'default_js', [])) + list(getattr(element, 'default_css', [])):
+            if urlsplit(url).scheme in ('http', 'https') and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def _fetch(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+        return response.read()
+
+
+def fetch_assets(urls: Iterable[str], vendor_dir: str = VENDOR_DIR) -> Dict[str, Path]:
+    """
+    Build step: copy assets, and the files their stylesheets refer to, into vendor_dir
+
+    Args:
+        urls: Asset URLs to copy
+        vendor_dir: Output directory
+
+    Returns:
+        Local path of every copied file, keyed by its URL
+
+    Raises:
+        OSError: If an asset cannot be downloaded
+    """
+    copied = {}
+    queue: List[Tuple[str, bool]] = [(url, True) for url in urls]
+    while queue:
+        url, required = queue.pop(0)
+        if url in copied:
+            continue
+        try:
+            data = _fetch(url)
+        except OSError as e:
+            if required:
+                raise
+            # Stylesheets list font formats the browser may not need
+            print(f"Skipping {url}: {e}")
+            continue
+
+        path = Path(vendor_dir) / _vendor_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        copied[url] = path
+
+        if path.suffix == '.css':
+            for reference in CSS_URL_PATTERN.findall(data.decode('utf-8', errors='replace')):
+                queue.append((urljoin(url, reference.strip()), False))
+    return copied
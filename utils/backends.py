@@ -0,0 +1,587 @@
+"""
+Query backends for the Chemical Space Explorer Python Shiny App
+
+get_display_data, calculate_top_contributors and the choropleth
+aggregation ask a QueryBackend for their rows. The pandas backend answers
+from the DataStore's in-memory indexes; the DuckDB backend runs SQL against
+the normalized parquet tables with predicate and projection pushdown.
+
+The Polars backend runs the same queries as lazy plans, and also fuses
+the summary table aggregation into the plan.
+
+The backend is chosen with the CS_EXPLORER_BACKEND environment variable
+("pandas" by default, "duckdb" or "polars"). Run
+``python -m utils.backends <name>`` to check a backend against pandas.
+"""
+
+import argparse
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from utils.data_store import DataStore
+
+
+QUERY_BACKEND_ENV = "CS_EXPLORER_BACKEND"
+
+TOP_CONTRIBUTOR_COLUMNS = ['rank', 'entity', 'avg_percentage']
+
+# Full schemas of the row queries; callers can ask for a subset
+NATIONAL_ROW_COLUMNS = ['iso2c', 'country', 'iso3c', 'region', 'cc', 'lat', 'lng', 'year', 'chemical', 'percentage']
+COLLABORATION_ROW_COLUMNS = ['iso2c', 'iso3c', 'country', 'cc', 'year', 'chemical', 'percentage', 'collab_size']
+
+
+def project_columns(columns: Optional[Sequence[str]], schema: List[str]) -> List[str]:
+    """
+    Requested columns of a row query, in schema order
+
+    Args:
+        columns: Requested columns (the whole schema when None)
+        schema: Columns the query can return
+
+    Raises:
+        ValueError: If a requested column is not in the schema
+    """
+    if columns is None:
+        return list(schema)
+    unknown = set(columns) - set(schema)
+    if unknown:
+        raise ValueError(f"Unknown columns requested: {sorted(unknown)}")
+    return [col for col in schema if col in columns]
+
+
+class QueryBackend(ABC):
+    """Interface shared by all query backends"""
+
+    name = "base"
+
+    def __init__(self, store: "DataStore"):
+        self.store = store
+
+    @abstractmethod
+    def national_rows(
+        self,
+        chemical: str,
+        isos: List[str],
+        year_range: Tuple[int, int],
+        region_filter: str = "All",
+        columns: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """National rows of the selected countries, limited to columns of NATIONAL_ROW_COLUMNS"""
+
+    @abstractmethod
+    def collaboration_rows(
+        self,
+        chemical: str,
+        isos: List[str],
+        year_range: Tuple[int, int],
+        columns: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """Collaboration rows including every selected country, limited to columns of COLLABORATION_ROW_COLUMNS"""
+
+    @abstractmethod
+    def contribution_averages(
+        self,
+        chemical: str,
+        year_range: Tuple[int, int],
+        region_filter: str = "All"
+    ) -> pd.DataFrame:
+        """Per-country avg/max/min percentage and years present over a year range"""
+
+    @abstractmethod
+    def top_contributors(
+        self,
+        chemical: Optional[str],
+        year_range: Tuple[int, int],
+        top_n: int = 10,
+        region_filter: str = "All"
+    ) -> pd.DataFrame:
+        """Top countries by average percentage (chemical None means all categories)"""
+
+    def summary_table(
+        self,
+        display_mode: str,
+        chemical: str,
+        isos: List[str],
+        year_range: Tuple[int, int],
+        region_filter: str = "All"
+    ) -> Optional[pd.DataFrame]:
+        """
+        Summary table computed inside the backend
+
+        Returns None when the backend has no fused summary; the caller then
+        summarizes the display rows with create_summary_dataframe.
+        """
+        return None
+
+
+class PandasBackend(QueryBackend):
+    """Answers queries from the DataStore's in-memory NumPy indexes"""
+
+    name = "pandas"
+
+    def national_rows(self, chemical, isos, year_range, region_filter="All", columns=None):
+        columns = project_columns(columns, NATIONAL_ROW_COLUMNS)
+        return self.store.national_cube.to_frame(chemical, isos, year_range, region_filter, columns=columns)
+
+    def collaboration_rows(self, chemical, isos, year_range, columns=None):
+        columns = project_columns(columns, COLLABORATION_ROW_COLUMNS)
+        collab_df = self.store.collaborations
+        collab_df = collab_df[
+            (collab_df['year'] >= year_range[0]) &
+            (collab_df['year'] <= year_range[1]) &
+            (collab_df['chemical'] == chemical)
+        ]
+
+        # Bitmask lookup: one hit flag per collaboration, gathered per row
+        membership = self.store.membership_index
+        collab_codes = collab_df['iso2c'].cat.codes.to_numpy()
+        collab_hits = membership.contains_all(isos)
+        mask = (collab_codes >= 0) & collab_hits[collab_codes]
+
+        result = collab_df.loc[mask, [col for col in columns if col != 'collab_size']]
+        if 'collab_size' in columns:
+            result['collab_size'] = membership.sizes[collab_codes[mask]]
+        return result[columns]
+
+    def contribution_averages(self, chemical, year_range, region_filter="All"):
+        return self.store.national_cube.range_aggregates(chemical, year_range, region_filter)
+
+    def top_contributors(self, chemical, year_range, top_n=10, region_filter="All"):
+        return self.store.national_leaderboard.top(chemical, year_range, top_n, region_filter)
+
+
+class DuckDBBackend(QueryBackend):
+    """
+    Runs the queries in an embedded DuckDB database
+
+    Fact tables are scanned straight from the normalized parquet files when
+    they exist (otherwise the in-memory tables are copied into DuckDB).
+    DuckDB pushes the year, chemical and ISO predicates and the column
+    projection into the scan and uses all cores.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, store: "DataStore"):
+        super().__init__(store)
+        import duckdb
+
+        self._con = duckdb.connect(database=':memory:')
+        for name in ('national', 'collaborations', 'collab_members'):
+            path = Path(store.tables_dir, f"{name}.parquet") if store.tables_dir else None
+            if path is not None and path.exists():
+                self._con.execute(
+                    f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{path.as_posix()}')"
+                )
+            else:
+                self._load_frame(name, store.table(name))
+
+        # Canonical attributes per ISO code, as joined into the national view
+        country_meta = store.national_cube.country_attrs.reset_index(names='iso2c')
+        self._load_frame('country_meta', country_meta.astype({
+            col: object for col in ('iso2c', 'country', 'iso3c', 'region', 'cc')
+        }))
+
+    def _load_frame(self, name: str, frame: pd.DataFrame):
+        # Copy an in-memory frame into a table; registered frames are not
+        # visible from the per-query cursors
+        self._con.register('_frame', frame)
+        self._con.execute(f"CREATE TABLE {name} AS SELECT * FROM _frame")
+        self._con.unregister('_frame')
+
+    def _query(self, sql: str, params: list) -> pd.DataFrame:
+        # A cursor per query keeps the shared connection thread-safe
+        return self._con.cursor().execute(sql, params).df()
+
+    @staticmethod
+    def _placeholders(values: list) -> str:
+        return ", ".join("?" for _ in values)
+
+    # SELECT expressions of the row query columns
+    NATIONAL_ROW_SQL = {
+        'iso2c': "n.iso2c", 'country': "m.country", 'iso3c': "m.iso3c", 'region': "m.region",
+        'cc': "m.cc", 'lat': "m.lat", 'lng': "m.lng",
+        'year': "n.year", 'chemical': "n.chemical", 'percentage': "n.percentage",
+    }
+    COLLABORATION_ROW_SQL = {
+        'iso2c': "c.iso2c", 'iso3c': "c.iso3c", 'country': "c.country", 'cc': "c.cc",
+        'year': "c.year", 'chemical': "c.chemical", 'percentage': "c.percentage",
+        'collab_size': "s.collab_size::SMALLINT AS collab_size",
+    }
+
+    def national_rows(self, chemical, isos, year_range, region_filter="All", columns=None):
+        columns = project_columns(columns, NATIONAL_ROW_COLUMNS)
+        isos = list(dict.fromkeys(isos))
+        if not isos:
+            return pd.DataFrame()
+
+        params = [chemical, year_range[0], year_range[1], *isos]
+        region_clause = ""
+        if region_filter != "All":
+            region_clause = "AND m.region = ?"
+            params.append(region_filter)
+
+        return self._query(f"""
+            SELECT {", ".join(self.NATIONAL_ROW_SQL[col] for col in columns)}
+            FROM national n
+            JOIN country_meta m ON m.iso2c = n.iso2c
+            WHERE n.chemical = ?
+              AND n.year BETWEEN ? AND ?
+              AND n.iso2c IN ({self._placeholders(isos)})
+              AND n.percentage IS NOT NULL
+              {region_clause}
+            ORDER BY n.iso2c, n.year
+        """, params)
+
+    def collaboration_rows(self, chemical, isos, year_range, columns=None):
+        columns = project_columns(columns, COLLABORATION_ROW_COLUMNS)
+        isos = list(dict.fromkeys(isos))
+        if not isos:
+            return pd.DataFrame(columns=columns)
+        return self._query(f"""
+            WITH sizes AS (
+                SELECT iso2c, count(*) AS collab_size
+                FROM collab_members
+                GROUP BY iso2c
+            ),
+            matches AS (
+                SELECT iso2c
+                FROM collab_members
+                WHERE member IN ({self._placeholders(isos)})
+                GROUP BY iso2c
+                HAVING count(DISTINCT member) = ?
+            )
+            SELECT {", ".join(self.COLLABORATION_ROW_SQL[col] for col in columns)}
+            FROM collaborations c
+            JOIN matches USING (iso2c)
+            JOIN sizes s USING (iso2c)
+            WHERE c.chemical = ?
+              AND c.year BETWEEN ? AND ?
+        """, [*isos, len(isos), chemical, year_range[0], year_range[1]])
+
+    def contribution_averages(self, chemical, year_range, region_filter="All"):
+        params = [chemical, year_range[0], year_range[1]]
+        region_clause = ""
+        if region_filter != "All":
+            region_clause = "AND m.region = ?"
+            params.append(region_filter)
+
+        return self._query(f"""
+            SELECT n.iso2c, m.country, m.iso3c, m.region, m.cc, m.lat, m.lng,
+                   avg(n.percentage) AS avg_percentage,
+                   max(n.percentage) AS max_percentage,
+                   min(n.percentage) AS min_percentage,
+                   count(*) AS years_present
+            FROM national n
+            JOIN country_meta m ON m.iso2c = n.iso2c
+            WHERE n.chemical = ?
+              AND n.year BETWEEN ? AND ?
+              AND n.percentage IS NOT NULL
+              {region_clause}
+            GROUP BY ALL
+            ORDER BY n.iso2c
+        """, params)
+
+    def top_contributors(self, chemical, year_range, top_n=10, region_filter="All"):
+        params = [year_range[0], year_range[1]]
+        clauses = ""
+        if chemical is not None:
+            clauses += " AND n.chemical = ?"
+            params.append(chemical)
+        if region_filter != "All":
+            clauses += " AND m.region = ?"
+            params.append(region_filter)
+        params.append(top_n)
+
+        top_data = self._query(f"""
+            SELECT n.iso2c AS entity, avg(n.percentage) AS avg_percentage
+            FROM national n
+            JOIN country_meta m ON m.iso2c = n.iso2c
+            WHERE n.year BETWEEN ? AND ?
+              AND n.percentage IS NOT NULL
+              {clauses}
+            GROUP BY n.iso2c
+            ORDER BY avg_percentage DESC, entity
+            LIMIT ?
+        """, params)
+        top_data.insert(0, 'rank', np.arange(1, len(top_data) + 1))
+        return top_data[TOP_CONTRIBUTOR_COLUMNS]
+
+
+class PolarsBackend(QueryBackend):
+    """
+    Runs the queries as Polars lazy plans
+
+    Filter, join with the country attributes, numeric casts and (for the
+    summary table) the aggregation are fused into one optimized plan that
+    Polars executes on all cores.
+    """
+
+    name = "polars"
+
+    def __init__(self, store: "DataStore"):
+        super().__init__(store)
+        import polars as pl
+
+        self._pl = pl
+        self._frames = {}
+        for name in ('national', 'collaborations', 'collab_members'):
+            path = Path(store.tables_dir, f"{name}.parquet") if store.tables_dir else None
+            if path is not None and path.exists():
+                frame = pl.scan_parquet(path)
+            else:
+                frame = pl.from_pandas(store.table(name)).lazy()
+            self._frames[name] = frame.with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+
+        # Canonical attributes per ISO code, as joined into the national view
+        country_meta = store.national_cube.country_attrs.reset_index(names='iso2c')
+        self._country_meta = pl.from_pandas(country_meta.astype({
+            col: str for col in ('iso2c', 'country', 'iso3c', 'region', 'cc')
+        })).lazy()
+
+    def _national(self, chemical: Optional[str], year_range: Tuple[int, int], region_filter: str = "All"):
+        pl = self._pl
+        predicate = pl.col('year').is_between(year_range[0], year_range[1]) & pl.col('percentage').is_not_null()
+        if chemical is not None:
+            predicate &= pl.col('chemical') == chemical
+
+        plan = (
+            self._frames['national']
+            .filter(predicate)
+            .join(self._country_meta, on='iso2c', how='inner')
+            .with_columns(pl.col('year').cast(pl.Int16), pl.col('percentage').cast(pl.Float32))
+        )
+        if region_filter != "All":
+            plan = plan.filter(pl.col('region') == region_filter)
+        return plan
+
+    def _national_rows_plan(self, chemical, isos, year_range, region_filter="All", columns=None):
+        pl = self._pl
+        return (
+            self._national(chemical, year_range, region_filter)
+            .filter(pl.col('iso2c').is_in(list(dict.fromkeys(isos))))
+            .sort('iso2c', 'year')
+            .select(project_columns(columns, NATIONAL_ROW_COLUMNS))
+        )
+
+    def _collaboration_rows_plan(self, chemical, isos, year_range, columns=None):
+        pl = self._pl
+        isos = list(dict.fromkeys(isos))
+        members = self._frames['collab_members']
+        matches = (
+            members.filter(pl.col('member').is_in(isos))
+            .group_by('iso2c')
+            .agg(pl.col('member').n_unique().alias('matched'))
+            .filter(pl.col('matched') == len(isos))
+            .select('iso2c')
+        )
+        sizes = members.group_by('iso2c').agg(pl.len().cast(pl.Int16).alias('collab_size'))
+
+        return (
+            self._frames['collaborations']
+            .filter(
+                (pl.col('chemical') == chemical) &
+                pl.col('year').is_between(year_range[0], year_range[1])
+            )
+            .join(matches, on='iso2c', how='inner')
+            .join(sizes, on='iso2c', how='inner')
+            .with_columns(pl.col('year').cast(pl.Int16), pl.col('percentage').cast(pl.Float32))
+            .select(project_columns(columns, COLLABORATION_ROW_COLUMNS))
+        )
+
+    def national_rows(self, chemical, isos, year_range, region_filter="All", columns=None):
+        return self._national_rows_plan(chemical, isos, year_range, region_filter, columns).collect().to_pandas()
+
+    def collaboration_rows(self, chemical, isos, year_range, columns=None):
+        return self._collaboration_rows_plan(chemical, isos, year_range, columns).collect().to_pandas()
+
+    def contribution_averages(self, chemical, year_range, region_filter="All"):
+        pl = self._pl
+        return (
+            self._national(chemical, year_range, region_filter)
+            .group_by('iso2c', 'country', 'iso3c', 'region', 'cc', 'lat', 'lng')
+            .agg(
+                pl.col('percentage').cast(pl.Float64).mean().alias('avg_percentage'),
+                pl.col('percentage').max().alias('max_percentage'),
+                pl.col('percentage').min().alias('min_percentage'),
+                pl.len().alias('years_present')
+            )
+            .sort('iso2c')
+            .collect()
+            .to_pandas()
+        )
+
+    def top_contributors(self, chemical, year_range, top_n=10, region_filter="All"):
+        pl = self._pl
+        top_data = (
+            self._national(chemical, year_range, region_filter)
+            .group_by('iso2c')
+            .agg(pl.col('percentage').cast(pl.Float64).mean().alias('avg_percentage'))
+            .sort(['avg_percentage', 'iso2c'], descending=[True, False])
+            .head(top_n)
+            .select(pl.col('iso2c').alias('entity'), 'avg_percentage')
+            .collect()
+            .to_pandas()
+        )
+        top_data.insert(0, 'rank', np.arange(1, len(top_data) + 1))
+        return top_data[TOP_CONTRIBUTOR_COLUMNS]
+
+    def summary_table(self, display_mode, chemical, isos, year_range, region_filter="All"):
+        pl = self._pl
+        if display_mode == "find_collaborations":
+            plan = (
+                self._collaboration_rows_plan(chemical, isos, year_range)
+                .filter(pl.col('percentage').is_not_null())
+                .with_columns(
+                    pl.col('collab_size').replace_strict(
+                        {2: "Bilateral", 3: "Trilateral", 4: "4-country"},
+                        default="5-country+", return_dtype=pl.Utf8
+                    ).alias('collab_type')
+                )
+            )
+            keys = ['country', 'chemical', 'collab_type']
+            columns = ['Collaboration', 'Chemical', 'Type', 'Avg %', 'Max %', 'Years Present']
+        elif display_mode == "compare_individuals":
+            plan = self._national_rows_plan(chemical, isos, year_range, region_filter)
+            keys = ['country', 'iso2c', 'chemical']
+            columns = ['Country', 'ISO', 'Chemical', 'Avg %', 'Max %', 'Years Present']
+        else:
+            return None
+
+        summary = (
+            plan.group_by(keys, maintain_order=True)
+            .agg(
+                pl.col('percentage').cast(pl.Float64).mean().round(2).alias('avg_percentage'),
+                pl.col('percentage').cast(pl.Float64).max().round(2).alias('max_percentage'),
+                pl.col('year').n_unique().alias('years_present')
+            )
+            .sort(keys)
+            .collect()
+            .to_pandas()
+        )
+        if summary.empty:
+            return pd.DataFrame()
+        summary.columns = columns
+        return summary
+
+
+QUERY_BACKENDS = {
+    PandasBackend.name: PandasBackend,
+    DuckDBBackend.name: DuckDBBackend,
+    PolarsBackend.name: PolarsBackend,
+}
+
+
+def create_query_backend(store: "DataStore", name: Optional[str] = None) -> QueryBackend:
+    """
+    Create the configured query backend for a store
+
+    Args:
+        store: DataStore the backend reads from
+        name: Backend name (defaults to the CS_EXPLORER_BACKEND variable)
+
+    Returns:
+        QueryBackend instance; falls back to pandas if the backend's
+        package is not installed
+    """
+    name = (name or os.environ.get(QUERY_BACKEND_ENV, PandasBackend.name)).lower()
+    if name not in QUERY_BACKENDS:
+        raise ValueError(f"Unknown query backend: {name}")
+
+    try:
+        return QUERY_BACKENDS[name](store)
+    except ImportError as e:
+        print(f"Query backend '{name}' unavailable ({e}); using pandas")
+        return PandasBackend(store)
+
+
+def check_backend_parity(store: "DataStore", name: str) -> List[str]:
+    """
+    Compare a backend's results against the pandas backend
+
+    Runs a fixed matrix of selections, year ranges, chemical categories and
+    regions through both backends and compares rows, averages, rankings and
+    (when the backend fuses it) the summary table.
+
+    Returns:
+        Descriptions of every mismatch; empty when the backends agree
+    """
+    from utils.functions import create_summary_dataframe, get_display_data
+
+    reference = PandasBackend(store)
+    candidate = QUERY_BACKENDS[name](store)
+    mismatches = []
+
+    def same(left: pd.DataFrame, right: pd.DataFrame, keys: List[str], label: str):
+        if left.empty and right.empty:
+            return
+        if len(left) != len(right):
+            mismatches.append(f"{label}: {len(left)} rows vs {len(right)}")
+            return
+        missing = [col for col in right.columns if col not in left.columns]
+        if missing:
+            mismatches.append(f"{label}: unexpected columns {missing}")
+            return
+        left = left[right.columns].astype({k: str for k in keys}).sort_values(keys).reset_index(drop=True)
+        right = right.astype({k: str for k in keys}).sort_values(keys).reset_index(drop=True)
+        for col in right.columns:
+            if pd.api.types.is_numeric_dtype(left[col]):
+                if not np.allclose(left[col].astype(float), right[col].astype(float), rtol=1e-5, equal_nan=True):
+                    mismatches.append(f"{label}: values differ in {col}")
+            elif not (left[col].isna().to_numpy() == right[col].isna().to_numpy()).all() or not (
+                left[col].dropna().astype(str).to_numpy() == right[col].dropna().astype(str).to_numpy()
+            ).all():
+                mismatches.append(f"{label}: values differ in {col}")
+
+    selections = [['CN', 'US'], ['DE', 'FR', 'GB'], ['CN', 'DE', 'US', 'AZ']]
+    for chemical in store.chemical_categories:
+        for year_range in [(store.min_year, store.max_year), (2005, 2010)]:
+            for region_filter in ['All', 'Europe']:
+                label = f"{chemical} {year_range} {region_filter}"
+                same(reference.contribution_averages(chemical, year_range, region_filter),
+                     candidate.contribution_averages(chemical, year_range, region_filter),
+                     ['iso2c'], f"averages {label}")
+                for top_chemical in (None, chemical):
+                    left = reference.top_contributors(top_chemical, year_range, 10, region_filter)
+                    right = candidate.top_contributors(top_chemical, year_range, 10, region_filter)
+                    if list(left['entity'].astype(str)) != list(right['entity'].astype(str)):
+                        mismatches.append(f"top contributors {top_chemical} {label}: ranking differs")
+
+            for isos in selections:
+                label = f"{chemical} {year_range} {isos}"
+                same(reference.national_rows(chemical, isos, year_range),
+                     candidate.national_rows(chemical, isos, year_range),
+                     ['iso2c', 'year'], f"national rows {label}")
+                same(reference.collaboration_rows(chemical, isos, year_range),
+                     candidate.collaboration_rows(chemical, isos, year_range),
+                     ['iso2c', 'year', 'chemical'], f"collaboration rows {label}")
+
+                for display_mode in ('compare_individuals', 'find_collaborations'):
+                    fused = candidate.summary_table(display_mode, chemical, isos, year_range)
+                    if fused is None:
+                        continue
+                    rows = get_display_data(store, isos, year_range, chemical, display_mode, backend=reference)
+                    expected = create_summary_dataframe(rows, display_mode) if not rows.empty else pd.DataFrame()
+                    same(expected, fused, list(expected.columns[:3]), f"summary {display_mode} {label}")
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    from utils.data_store import get_data_store
+
+    parser = argparse.ArgumentParser(description="Check a query backend against the pandas backend")
+    parser.add_argument('backend', choices=sorted(set(QUERY_BACKENDS) - {PandasBackend.name}))
+    args = parser.parse_args()
+
+    problems = check_backend_parity(get_data_store(), args.backend)
+    for problem in problems:
+        print(problem)
+    print(f"{args.backend}: {'OK' if not problems else f'{len(problems)} mismatches'}")
+    raise SystemExit(1 if problems else 0)
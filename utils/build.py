@@ -0,0 +1,83 @@
+"""
+Build steps for the prepared data files of the Chemical Space Explorer
+
+Usage:
+    python -m utils.build tables
+    python -m utils.build snapshot
+    python -m utils.build boundaries [--check]
+    python -m utils.build topology
+    python -m utils.build assets
+"""
+
+import argparse
+from typing import List, Optional
+
+from utils.assets import VENDOR_DIR
+from utils.functions import DATA_PATH, SNAPSHOT_DIR, TABLES_DIR, build_data_tables
+from utils.geometry import BOUNDARIES_PATH, BOUNDARY_SOURCES
+from utils.topology import TOPOLOGY_DIR
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build prepared data files for the app")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    tables = commands.add_parser('tables', help="Split data.parquet into normalized tables")
+    tables.add_argument('--source', default=DATA_PATH, help="Wide parquet file to split")
+    tables.add_argument('--out', default=TABLES_DIR, help="Output directory for the tables")
+
+    snapshot = commands.add_parser('snapshot', help="Write the prepared state for fast worker start-up")
+    snapshot.add_argument('--tables', default=TABLES_DIR, help="Directory of the normalized tables")
+    snapshot.add_argument('--out', default=SNAPSHOT_DIR, help="Output directory for the snapshot")
+
+    boundaries = commands.add_parser('boundaries', help="Reconcile the GeoJSON boundaries into the GeoParquet boundary store")
+    boundaries.add_argument('--sources', nargs='+', default=list(BOUNDARY_SOURCES), help="GeoJSON files, in order of preference")
+    boundaries.add_argument('--out', default=BOUNDARIES_PATH, help="Output GeoParquet file")
+    boundaries.add_argument('--check', action='store_true', help="Only check that the store matches the sources' contents")
+
+    topology = commands.add_parser('topology', help="Convert the country boundaries to quantized TopoJSON and choropleth GeoJSON")
+    topology.add_argument('--boundaries', default=BOUNDARIES_PATH, help="Boundary store or GeoJSON file to convert")
+    topology.add_argument('--out', default=TOPOLOGY_DIR, help="Output directory for the TopoJSON and GeoJSON files")
+
+    assets = commands.add_parser('assets', help="Copy the selection map's scripts and stylesheets from their CDNs")
+    assets.add_argument('--out', default=VENDOR_DIR, help="Output directory for the copies")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'tables':
+        for name, path in build_data_tables(args.source, args.out).items():
+            print(f"Wrote {name} table to {path}")
+    elif args.command == 'snapshot':
+        from utils.data_store import DataStore
+        from utils.snapshot import write_snapshot
+
+        print(f"Wrote snapshot manifest to {write_snapshot(DataStore.from_tables(args.tables), args.out)}")
+    elif args.command == 'boundaries':
+        from utils.geometry import boundary_store_current, write_boundary_store
+
+        if args.check:
+            if not boundary_store_current(args.out, args.sources):
+                parser.exit(1, f"Boundary store {args.out} is outdated; rebuild it with python -m utils.build boundaries\n")
+            print(f"Boundary store {args.out} is up to date")
+        else:
+            print(f"Wrote boundary store to {write_boundary_store(args.sources, args.out)}")
+    elif args.command == 'topology':
+        from utils.topology import write_choropleth_geojson, write_topologies
+
+        for tier, path in write_topologies(args.boundaries, args.out).items():
+            print(f"Wrote {tier} boundaries to {path}")
+        print(f"Wrote choropleth boundaries to {write_choropleth_geojson(args.boundaries, args.out)}")
+    elif args.command == 'assets':
+        from utils.assets import fetch_assets
+        from utils.functions import map_asset_urls
+
+        try:
+            copied = fetch_assets(map_asset_urls(), args.out)
+        except OSError as e:
+            parser.exit(1, f"Could not copy the map assets: {e}\n")
+        for url, path in copied.items():
+            print(f"Copied {url} to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Size-bounded caches for the Chemical Space Explorer Python Shiny App
+
+Caches here are process-wide and shared by every session, so they are
+bounded by the memory their values take rather than by entry count.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class ByteLRUCache:
+    """
+    Least-recently-used cache bounded by the total size of its values
+
+    Values larger than the whole budget are returned but not stored.
+    Hit, miss and eviction counters are kept for monitoring.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = sys.getsizeof):
+        """
+        Args:
+            max_bytes: Budget for the summed size of the cached values
+            sizeof: Size of a value in bytes
+        """
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for a key, or None (counted as a hit or a miss)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used ones to fit"""
+        size = self._sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            # Not stored, and no older value left behind for the key
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_create(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        """Cached value for a key, creating and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters and current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
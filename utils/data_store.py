@@ -0,0 +1,221 @@
+"""
+Process-wide data store for the Chemical Space Explorer Python Shiny App
+
+The data is read and decoded once per process; every render function
+receives the same DataStore and works on its prepared views instead of
+re-reading the files. Each view only loads the normalized table it needs.
+When a snapshot has been built, the views and indexes are memory-mapped
+from it instead of being computed.
+"""
+
+import os
+from functools import cached_property, lru_cache, partial
+from typing import Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from utils.functions import (
+    DATA_PATH,
+    SNAPSHOT_DIR,
+    TABLES_DIR,
+    data_tables_available,
+    load_table,
+    split_data_tables,
+    to_compact_schema,
+)
+from utils.backends import QueryBackend, create_query_backend
+from utils.indexes import CollabMembershipIndex, LeaderboardIndex, NationalCube
+from utils.snapshot import SNAPSHOT_ENV, load_snapshot, prepare_shared_snapshot, snapshot_available
+
+# Table columns read by the views; the other columns are never loaded
+VIEW_COLUMNS = {
+    'national': ['iso2c', 'year', 'chemical', 'percentage'],
+    'collaborations': ['iso2c', 'iso3c', 'country', 'cc', 'year', 'chemical', 'percentage'],
+}
+
+
+def frame_loader(tables: Dict[str, pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+    """Table loader over in-memory tables, with the signature of load_table"""
+    def load(name: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        table = tables[name]
+        if columns is None:
+            return table
+        # Assembled from the columns, so snapshot-mapped data is not copied
+        # (table[columns] would copy every selected column)
+        return pd.DataFrame({col: table[col] for col in columns}, copy=False)
+    return load
+
+
+class DataStore:
+    """
+    Owns the loaded dataset and exposes read-only views of it
+
+    Views are computed once, on first access. Callers must treat the
+    returned DataFrames as read-only and take a copy before modifying them.
+    """
+
+    def __init__(self, table_loader: Callable[[str], pd.DataFrame], tables_dir: Optional[str] = None):
+        """
+        Args:
+            table_loader: Callable returning a normalized table by name,
+                optionally only some of its columns
+            tables_dir: Directory of the table files, if the store reads them
+        """
+        self._load_table = table_loader
+        self.tables_dir = tables_dir
+
+    @classmethod
+    def from_tables(cls, tables_dir: str = TABLES_DIR) -> "DataStore":
+        """Build a store backed by the normalized table files"""
+        return cls(partial(load_table, tables_dir=tables_dir), tables_dir=tables_dir)
+
+    @classmethod
+    def from_parquet(cls, data_path: str = DATA_PATH) -> "DataStore":
+        """Build a store by splitting the wide parquet file in memory"""
+        tables = split_data_tables(pd.read_parquet(data_path))
+        return cls(frame_loader(tables))
+
+    @classmethod
+    def from_source(cls, tables_dir: str = TABLES_DIR, data_path: str = DATA_PATH) -> "DataStore":
+        """Build a store over the normalized tables, or the wide file when they are missing"""
+        if data_tables_available(tables_dir):
+            return cls.from_tables(tables_dir)
+        return cls.from_parquet(data_path)
+
+    @classmethod
+    def from_snapshot(cls, snapshot_dir: str = SNAPSHOT_DIR, tables_dir: Optional[str] = None) -> "DataStore":
+        """
+        Build a store whose views and indexes are mapped from a snapshot
+
+        Args:
+            snapshot_dir: Snapshot directory written by write_snapshot
+            tables_dir: Table files the snapshot was built from, which the
+                file-scanning backends read instead of copying the tables
+        """
+        snapshot = load_snapshot(snapshot_dir)
+        store = cls(frame_loader(snapshot['tables']), tables_dir=tables_dir)
+        # Prepared values take the place of the cached properties
+        store.__dict__.update(snapshot['views'])
+        return store
+
+    def table(self, name: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Raw normalized table by name (see DATA_TABLES), optionally only some columns"""
+        return self._load_table(name, columns=columns)
+
+    @cached_property
+    def backend(self) -> QueryBackend:
+        """Query backend selected by the CS_EXPLORER_BACKEND variable"""
+        return create_query_backend(self)
+
+    @cached_property
+    def country_list(self) -> pd.DataFrame:
+        """Country dimension sorted by country name"""
+        return self._load_table('countries')
+
+    @cached_property
+    def _country_meta(self) -> pd.DataFrame:
+        # One canonical row per ISO code (first variant by country name)
+        return self.country_list.drop_duplicates(subset=['iso2c']).set_index('iso2c')
+
+    @cached_property
+    def national(self) -> pd.DataFrame:
+        """National series joined with country attributes"""
+        series = self.table('national', columns=VIEW_COLUMNS['national'])
+        return to_compact_schema(series.join(self._country_meta, on='iso2c'))
+
+    @cached_property
+    def collaborations(self) -> pd.DataFrame:
+        """Collaboration series keyed by hyphenated ISO codes (e.g. CN-US)"""
+        return self.table('collaborations', columns=VIEW_COLUMNS['collaborations'])
+
+    @cached_property
+    def collab_members(self) -> pd.DataFrame:
+        """Collaboration membership with one row per (iso2c, member)"""
+        return self._load_table('collab_members')
+
+    @cached_property
+    def membership_index(self) -> CollabMembershipIndex:
+        """Country bitmask per collaboration, in iso2c category order"""
+        return CollabMembershipIndex(self.collaborations['iso2c'].cat.categories, self.collab_members)
+
+    @cached_property
+    def national_cube(self) -> NationalCube:
+        """Dense chemical x country x year cube of national percentages"""
+        return NationalCube(self.national)
+
+    @cached_property
+    def national_leaderboard(self) -> LeaderboardIndex:
+        """Top-N index of countries keyed by iso2c, with regions"""
+        return LeaderboardIndex(self.national, 'iso2c', region_column='region')
+
+    @cached_property
+    def collab_leaderboard(self) -> LeaderboardIndex:
+        """Top-N index of collaborations keyed by their display name"""
+        return LeaderboardIndex(self.collaborations, 'country')
+
+    @cached_property
+    def article(self) -> pd.DataFrame:
+        """Article figure rows with columns source, year, country, value, cc"""
+        return self._load_table('article')
+
+    @cached_property
+    def chemical_categories(self) -> List[str]:
+        chemicals = pd.concat([self.national['chemical'], self.collaborations['chemical']]).dropna().unique()
+        return sorted(c for c in chemicals if c and str(c).strip())
+
+    @cached_property
+    def regions(self) -> List[str]:
+        """Region choices, starting with 'All'"""
+        unique_regions = self.country_list['region'].unique().tolist()
+        return ['All'] + sorted(
+            set(region for region in unique_regions if region and str(region).strip() and region != 'All')
+        )
+
+    @cached_property
+    def min_year(self) -> int:
+        return int(min(self.national['year'].min(), self.collaborations['year'].min()))
+
+    @cached_property
+    def max_year(self) -> int:
+        return int(max(self.national['year'].max(), self.collaborations['year'].max()))
+
+    def countries_in_region(self, region_filter: str = "All") -> pd.DataFrame:
+        """Country list restricted to a region ('All' returns every country)"""
+        if region_filter == "All":
+            return self.country_list
+        return self.country_list[self.country_list['region'] == region_filter]
+
+    def ui_metadata(self) -> Dict:
+        """Choices and bounds used to build the UI controls"""
+        return {
+            'chemical_categories': self.chemical_categories,
+            'regions': self.regions,
+            'min_year': self.min_year,
+            'max_year': self.max_year
+        }
+
+
+@lru_cache(maxsize=1)
+def get_data_store(
+    tables_dir: str = TABLES_DIR,
+    data_path: str = DATA_PATH,
+    snapshot_dir: str = SNAPSHOT_DIR
+) -> DataStore:
+    """
+    Return the process-wide DataStore
+
+    Maps the prepared snapshot when one is available, otherwise uses the
+    normalized tables, and falls back to splitting the wide parquet file.
+    When CS_EXPLORER_SNAPSHOT names a shared snapshot directory, the first
+    worker writes the snapshot there and every worker maps it.
+    """
+    shared_dir = os.environ.get(SNAPSHOT_ENV)
+    if shared_dir:
+        snapshot_dir = shared_dir
+        prepare_shared_snapshot(snapshot_dir, tables_dir, partial(DataStore.from_source, tables_dir, data_path))
+
+    if snapshot_available(snapshot_dir, tables_dir):
+        return DataStore.from_snapshot(
+            snapshot_dir, tables_dir=tables_dir if data_tables_available(tables_dir) else None
+        )
+    return DataStore.from_source(tables_dir, data_path)
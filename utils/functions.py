@@ -7,14 +7,206 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
-from typing import List, Dict, Optional, Tuple, Union
-import geopandas as gpd
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Sequence, Tuple, Union, TYPE_CHECKING
 from pathlib import Path
 from functools import lru_cache
+import json
+import os
 import folium
+import shapely
+from folium.elements import JSCSSMixin
+from folium.plugins import Draw
+from jinja2 import Template
 
+from utils.assets import asset_urls, use_vendored_assets
+from utils.backends import COLLABORATION_ROW_COLUMNS, NATIONAL_ROW_COLUMNS, QueryBackend
+from utils.cache import ByteLRUCache
+from utils.geometry import DEFAULT_TIER, get_geometry_registry, normalize_iso, tier_for_zoom
+from utils.tiles import tile_layer_options
+from utils.topology import TOPOLOGY_DECODER_URL, TOPOLOGY_OBJECT, choropleth_geojson_url, topology_url
 
-def load_country_data(data_path: str = "./data/data.parquet") -> Dict:
+if TYPE_CHECKING:
+    from utils.data_store import DataStore
+    from utils.geometry import GeometryRegistry
+
+
+DATA_PATH = "./data/data.parquet"
+TABLES_DIR = "./data/tables"
+SNAPSHOT_DIR = "./data/snapshot"
+
+# Compact tables produced from the wide data.parquet by build_data_tables
+DATA_TABLES = ('countries', 'national', 'collaborations', 'collab_members', 'article')
+
+# Columns stored as float32 in the compact in-memory schema
+COMPACT_FLOAT_COLUMNS = ('percentage', 'value_raw', 'value')
+
+# Source column of each derived get_display_data column
+DISPLAY_COLUMN_SOURCES = {
+    'plot_group': 'country',
+    'plot_color': 'cc',
+    'collab_type': 'collab_size',
+    'plot_color_group': 'collab_size',
+    'total_percentage': 'percentage',
+}
+
+# get_display_data columns read by create_trends_plot and create_summary_dataframe
+TRENDS_PLOT_COLUMNS = ('iso2c', 'year', 'total_percentage', 'plot_group', 'plot_color', 'plot_color_group')
+SUMMARY_COLUMNS = ('country', 'iso2c', 'chemical', 'year', 'total_percentage', 'plot_group', 'collab_type')
+
+# Memory budget of the rendered map HTML shared across sessions (in MB)
+MAP_CACHE_ENV = "CS_EXPLORER_MAP_CACHE_MB"
+MAP_HTML_CACHE = ByteLRUCache(max_bytes=int(float(os.environ.get(MAP_CACHE_ENV, 32)) * 2**20))
+
+# Plotly locationmode of each ISO code column, used when the choropleth
+# GeoJSON was not built and plotly.js draws its built-in world map
+PLOTLY_LOCATIONMODES = {'iso2c': 'ISO-3166-1-alpha-2', 'iso3c': 'ISO-3'}
+
+# Geo base layers plotly.js draws from its world map on cdn.plot.ly
+PLOTLY_BASE_LAYERS = ('showcoastlines', 'showland', 'showocean', 'showlakes', 'showrivers', 'showcountries', 'showsubunits')
+
+# Countries without data on the choropleths drawn from local geometry
+CHOROPLETH_LAND_COLOR = '#f2f2f2'
+CHOROPLETH_BORDER_COLOR = 'lightgray'
+
+ARTICLE_COLUMNS_MAP = {
+    'source': 'source',
+    'year_x': 'year',
+    'country_x': 'country',
+    'percentage_x': 'value',
+    'cc': 'cc'
+}
+
+
+def to_compact_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a table to the compact in-memory schema
+    
+    Strings become categoricals, years int16, shares float32 and
+    is_collab a plain boolean.
+    
+    Args:
+        df: Table with the raw parquet dtypes
+        
+    Returns:
+        Copy of the table with compact dtypes
+    """
+    compact = df.copy()
+    for col in compact.columns:
+        if col == 'year':
+            compact[col] = compact[col].astype('int16')
+        elif col == 'is_collab':
+            compact[col] = compact[col].astype('boolean').fillna(False).astype(bool)
+        elif col in COMPACT_FLOAT_COLUMNS:
+            compact[col] = compact[col].astype('float32')
+        elif pd.api.types.is_object_dtype(compact[col]) or pd.api.types.is_string_dtype(compact[col]):
+            compact[col] = compact[col].astype('category')
+    return compact
+
+
+def split_data_tables(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Split the wide data table into separate normalized tables
+    
+    Args:
+        df: Wide DataFrame as stored in data.parquet
+        
+    Returns:
+        Dictionary of DataFrames keyed by table name:
+        countries (country dimension), national (national series),
+        collaborations (collaboration series), collab_members
+        (collaboration membership) and article (article figures)
+    """
+    national_rows = df[df['is_collab'] == False]
+    collab_rows = df[df['is_collab'] == True]
+
+    # Country dimension, one row per country variant shown on the map
+    countries = (
+        national_rows[['country', 'iso2c', 'iso3c', 'lat', 'lng', 'cc', 'region']]
+        .drop_duplicates(subset=['country', 'iso2c', 'lat', 'lng', 'cc', 'region'])
+        .dropna(subset=['country', 'iso2c'])
+        .query("country != '' and iso2c != ''")
+        .fillna({'region': 'Other'})
+        .sort_values('country')
+        .reset_index(drop=True)
+    )
+
+    # Country attributes live in the dimension table, not in the series
+    national = national_rows[['iso2c', 'year', 'chemical', 'value_raw', 'percentage']].reset_index(drop=True)
+
+    collaborations = collab_rows[
+        ['iso2c', 'iso3c', 'country', 'cc', 'year', 'chemical', 'value_raw', 'percentage']
+    ].reset_index(drop=True)
+
+    # One row per (collaboration, member country)
+    collab_isos = pd.Series(collab_rows['iso2c'].dropna().unique())
+    collab_members = (
+        pd.DataFrame({'iso2c': collab_isos, 'member': collab_isos.str.split('-')})
+        .explode('member')
+        .reset_index(drop=True)
+    )
+
+    article_cols = list(ARTICLE_COLUMNS_MAP.keys())
+    if all(col in df.columns for col in article_cols):
+        article = df[article_cols].rename(columns=ARTICLE_COLUMNS_MAP)
+        article = article.dropna(subset=['value', 'source'])
+        article = article[article['source'] != ""].reset_index(drop=True)
+    else:
+        article = pd.DataFrame(columns=list(ARTICLE_COLUMNS_MAP.values()))
+
+    return {
+        'countries': countries,
+        'national': to_compact_schema(national),
+        'collaborations': to_compact_schema(collaborations),
+        'collab_members': to_compact_schema(collab_members),
+        'article': to_compact_schema(article)
+    }
+
+
+def build_data_tables(data_path: str = DATA_PATH, tables_dir: str = TABLES_DIR) -> Dict[str, Path]:
+    """
+    Build step: write the normalized tables next to the wide parquet file
+    
+    Args:
+        data_path: Path to the wide parquet file
+        tables_dir: Output directory for the table files
+        
+    Returns:
+        Dictionary of written file paths keyed by table name
+    """
+    out_dir = Path(tables_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    written = {}
+    for name, table in split_data_tables(pd.read_parquet(data_path)).items():
+        path = out_dir / f"{name}.parquet"
+        table.to_parquet(path, index=False, compression='zstd')
+        written[name] = path
+    return written
+
+
+def data_tables_available(tables_dir: str = TABLES_DIR) -> bool:
+    """Whether every normalized table has been built"""
+    return all((Path(tables_dir) / f"{name}.parquet").exists() for name in DATA_TABLES)
+
+
+def load_table(name: str, columns: Optional[List[str]] = None, tables_dir: str = TABLES_DIR) -> pd.DataFrame:
+    """
+    Read a single normalized table, optionally only some of its columns
+    
+    Args:
+        name: Table name, one of DATA_TABLES
+        columns: Columns to read (all columns when None)
+        tables_dir: Directory holding the table files
+        
+    Returns:
+        DataFrame with the requested table
+    """
+    if name not in DATA_TABLES:
+        raise ValueError(f"Unknown data table: {name}")
+    return pd.read_parquet(Path(tables_dir) / f"{name}.parquet", columns=columns)
+
+
+def load_country_data(data_path: str = DATA_PATH) -> Dict:
     """
     Load and prepare initial data
     
@@ -82,127 +274,169 @@ def load_country_data(data_path: str = "./data/data.parquet") -> Dict:
         return {}
 
 def get_display_data(
-    df: pd.DataFrame,
+    store: "DataStore",
     selected_isos: List[str],
     year_range: Tuple[int, int],
     chemical_category: str,
     display_mode: str,
     region_filter: str = "All",
-    country_list: pd.DataFrame = None
+    columns: Optional[Sequence[str]] = None,
+    backend: Optional[QueryBackend] = None
 ) -> pd.DataFrame:
     """
     Optimized data fetching with early filtering and lazy evaluation
+
+    Args:
+        store: Shared DataStore holding the loaded dataset
+        selected_isos: Selected ISO-2 codes
+        year_range: Inclusive (start, end) year tuple
+        chemical_category: Chemical category filter
+        display_mode: "compare_individuals" or "find_collaborations"
+        region_filter: Region filter
+        columns: Columns the caller uses (e.g. TRENDS_PLOT_COLUMNS); only
+            their sources are queried. None returns every column.
+        backend: Query backend answering the query; None uses the store's
+            configured backend
+
+    Returns:
+        Filtered DataFrame ready for plotting
     """
-    if df.empty:
-        return pd.DataFrame()
-    
+    backend = backend or store.backend
+
     # Early exit for collaboration mode without sufficient selection
     if display_mode == "find_collaborations" and len(selected_isos) < 2:
         return pd.DataFrame()
-    
-    # Apply filters progressively for efficiency
-    # Start with most selective filters first
-    filtered_df = df[
-        (df['year'] >= year_range[0]) & 
-        (df['year'] <= year_range[1])
-    ]
-    
-    # Chemical filter
-    filtered_df = filtered_df[filtered_df['chemical'] == chemical_category]
-    
-    # Early exit if no data after initial filtering
-    if filtered_df.empty:
-        return pd.DataFrame()
 
     if display_mode in ["individual", "compare_individuals"]:
         if not selected_isos:
             return pd.DataFrame()
 
-        # Filter for individual countries only
-        result = filtered_df[
-            (filtered_df['is_collab'] == False) & 
-            (filtered_df['iso2c'].isin(selected_isos))
-        ].copy()
-        
-        # Apply region filter efficiently
-        if region_filter != "All" and 'region' in result.columns:
-            result = result[result['region'] == region_filter]
+        # Rows come from the query backend
+        result = backend.national_rows(
+            chemical_category, selected_isos, year_range, region_filter,
+            columns=_display_sources(columns, NATIONAL_ROW_COLUMNS, ['country', 'cc'])
+        )
             
         if result.empty:
             return pd.DataFrame()
 
-        # Add metadata efficiently
-        if country_list is not None:
-            country_meta = country_list[['iso2c', 'country', 'cc', 'region']].drop_duplicates(subset=['iso2c'])
-            result = result.merge(country_meta, on='iso2c', how='left', suffixes=('_orig', '_meta'))
-            
-            # Use metadata preferentially
-            for col in ['country', 'cc', 'region']:
-                meta_col = f'{col}_meta'
-                if meta_col in result.columns:
-                    result[col] = result[meta_col].fillna(result.get(f'{col}_orig', ''))
-                    
-        result['plot_group'] = result.get('country', result['iso2c'])
-        result['plot_color'] = result.get('cc', '#808080')
+        # Country metadata is joined in by the backend
+        result['plot_group'] = result['country']
+        result['plot_color'] = result['cc']
         
     elif display_mode == "find_collaborations":
-        # Optimized collaboration filtering
-        collab_df = filtered_df[filtered_df['is_collab'] == True].copy()
-        
-        if collab_df.empty:
-            return pd.DataFrame()
-
-        # Efficient collaboration filtering using vectorized operations
-        selected_set = set(selected_isos)
-        
-        def has_all_partners(iso_string):
-            if pd.isna(iso_string):
-                return False
-            partners = set(str(iso_string).split('-'))
-            return selected_set.issubset(partners)
-        
-        mask = collab_df['iso2c'].apply(has_all_partners)
-        result = collab_df[mask].copy()
+        # Collaborations including every selected country, with collab_size
+        result = backend.collaboration_rows(
+            chemical_category, selected_isos, year_range,
+            columns=_display_sources(columns, COLLABORATION_ROW_COLUMNS, ['country', 'collab_size'])
+        )
 
         if result.empty:
             return pd.DataFrame()
-            
-        # Add collaboration metadata
-        result['partners'] = result['iso2c'].str.split('-')
-        result['collab_size'] = result['partners'].str.len()
         
         # Vectorized collaboration type assignment
         result['collab_type'] = result['collab_size'].map({
             2: "Bilateral",
             3: "Trilateral", 
             4: "4-country"
-        }).fillna("5-country+")
+        }).fillna("5-country+").astype('category')
         
         result['plot_group'] = result['country']
         result['plot_color_group'] = result['collab_type']
     else:
         return pd.DataFrame()
         
-    # Standardize columns efficiently
-    if not result.empty:
-        # Handle numeric conversions
-        for col in ['year']:
-            if col in result.columns:
-                result[col] = pd.to_numeric(result[col], errors='coerce')
-        
-        # Standardize percentage column
-        percentage_cols = ['percentage', 'value', 'value_raw', 'percentage_x']
-        for col in percentage_cols:
-            if col in result.columns:
-                result['total_percentage'] = pd.to_numeric(result[col], errors='coerce')
-                break
-        
-        # Drop rows with invalid data
-        result = result.dropna(subset=['year', 'total_percentage'])
+    # Columns are typed once by the store, so no per-call numeric coercion
+    result['total_percentage'] = result['percentage']
+    result = result.dropna(subset=['year', 'total_percentage'])
 
+    if columns is not None:
+        result = result[[col for col in dict.fromkeys(columns) if col in result.columns]]
     return result
 
 
+def _display_sources(columns: Optional[Sequence[str]], schema: List[str], derived: List[str]) -> Optional[List[str]]:
+    # Backend columns behind the requested display columns, plus the sources
+    # of the derived columns and the columns get_display_data filters on
+    if columns is None:
+        return None
+    needed = {DISPLAY_COLUMN_SOURCES.get(col, col) for col in columns}
+    needed.update(derived + ['year', 'percentage'])
+    return [col for col in schema if col in needed]
+
+
+def get_contribution_averages(
+    store: "DataStore",
+    year_range: Tuple[int, int],
+    chemical_category: str,
+    region_filter: str = "All"
+) -> pd.DataFrame:
+    """
+    Average national contribution per country over a year range
+    
+    With the pandas backend this reads the prefix sums of the national
+    cube, so moving the year slider costs O(countries) and needs no groupby.
+    
+    Args:
+        store: Shared DataStore holding the loaded dataset
+        year_range: Inclusive (start, end) year tuple
+        chemical_category: Chemical category filter
+        region_filter: Region filter
+        
+    Returns:
+        One row per country with iso2c, iso3c, country, region and
+        total_percentage (the average), plus max/min and years present
+    """
+    averages = store.backend.contribution_averages(chemical_category, year_range, region_filter)
+    if averages.empty:
+        return pd.DataFrame()
+    return averages.rename(columns={'avg_percentage': 'total_percentage'})
+
+
+def iter_trace_groups(
+    data: pd.DataFrame,
+    group_column: str,
+    columns: Sequence[str],
+    order: Optional[Sequence] = None
+) -> Iterator[Tuple[Any, Dict[str, np.ndarray]]]:
+    """
+    Split a frame into the arrays of one trace per group, in a single pass
+
+    The rows are grouped once (group codes, a stable sort and the split
+    points between groups) instead of filtering the whole frame for every
+    group, which is quadratic with hundreds of collaborations.
+
+    Args:
+        data: Rows to split
+        group_column: Column whose values define the groups
+        columns: Columns to return for each group; missing ones are skipped
+        order: Group values in the order to yield them; by default groups
+            come in order of first appearance, like Series.unique()
+
+    Yields:
+        Tuple of the group value and its columns as NumPy arrays, rows in
+        their original order. Rows without a group value are skipped.
+    """
+    codes, groups = pd.factorize(data[group_column])
+    groups = pd.Index(groups)
+    rows = np.argsort(codes, kind='stable')
+    splits = np.searchsorted(codes[rows], np.arange(len(groups) + 1))
+    arrays = {col: data[col].to_numpy()[rows] for col in columns if col in data.columns}
+
+    positions = range(len(groups)) if order is None else groups.get_indexer(order)
+    for position in positions:
+        if position < 0:
+            continue
+        start, stop = splits[position], splits[position + 1]
+        yield groups[position], {col: values[start:stop] for col, values in arrays.items()}
+
+
+def first_valid(values: np.ndarray, default=None):
+    """First non-missing value of a group's array, or default"""
+    valid = values[pd.notna(values)]
+    return valid[0] if len(valid) else default
+
+
 def create_main_plot(
     data: pd.DataFrame, 
     display_mode: str, 
@@ -233,14 +467,14 @@ def create_main_plot(
         return fig
         
     fig = go.Figure()
+    traces = []
     
     if display_mode in ["individual", "compare_individuals"]:
         # Individual country plots
-        for group in data['plot_group'].unique():
-            group_data = data[data['plot_group'] == group]
-            color = group_data['plot_color'].iloc[0] if 'plot_color' in group_data.columns else None
+        for group, group_data in iter_trace_groups(data, 'plot_group', ('year', 'total_percentage', 'plot_color')):
+            color = group_data['plot_color'][0] if 'plot_color' in group_data else None
             
-            fig.add_trace(go.Scatter(
+            traces.append(go.Scatter(
                 x=group_data['year'],
                 y=group_data['total_percentage'],
                 mode='lines+markers',
@@ -264,12 +498,11 @@ def create_main_plot(
         colors = px.colors.qualitative.Set1
         color_map = {}
         
-        for i, group in enumerate(data['plot_group'].unique()):
-            group_data = data[data['plot_group'] == group]
+        for i, (group, group_data) in enumerate(iter_trace_groups(data, 'plot_group', ('year', 'total_percentage'))):
             color = colors[i % len(colors)]
             color_map[group] = color
             
-            fig.add_trace(go.Scatter(
+            traces.append(go.Scatter(
                 x=group_data['year'],
                 y=group_data['total_percentage'],
                 mode='lines+markers',
@@ -287,6 +520,7 @@ def create_main_plot(
                     "Percentage: %{y:.2f}%<extra></extra>"
                 )
             ))
+    fig.add_traces(traces)
     
     # Define legend configuration based on display mode
     legend_title = "All collaborations including the selected countries" if display_mode == "find_collaborations" else None
@@ -326,6 +560,56 @@ def create_main_plot(
     
     return fig
 
+def choropleth_locations(codes: pd.Series, code_column: str) -> Dict:
+    """
+    go.Choropleth arguments locating countries by ISO code
+
+    Countries are drawn from the locally served choropleth GeoJSON when it
+    was built, and from plotly's built-in world map otherwise.
+
+    Args:
+        codes: ISO codes of the trace's countries
+        code_column: Kind of the codes, 'iso2c' or 'iso3c'
+    """
+    url = choropleth_geojson_url()
+    if url is None:
+        return {'locations': codes, 'locationmode': PLOTLY_LOCATIONMODES[code_column]}
+    return {'locations': codes, 'geojson': url, 'featureidkey': f"properties.{code_column}"}
+
+
+def choropleth_base(**geo) -> Tuple[List[go.Choropleth], Dict]:
+    """
+    Background traces and geo layout of a choropleth
+
+    With the local GeoJSON, plotly's base layers are turned off (they are
+    drawn from its CDN world map) and a light trace of every country stands
+    in for land and coastlines.
+
+    Args:
+        **geo: Geo layout of the figure
+
+    Returns:
+        Tuple of the traces to draw under the data and the geo layout
+    """
+    url = choropleth_geojson_url()
+    if url is None:
+        return [], geo
+
+    iso_codes = [country.iso2c for country in get_geometry_registry()]
+    land = go.Choropleth(
+        geojson=url,
+        featureidkey='properties.iso2c',
+        locations=iso_codes,
+        z=np.zeros(len(iso_codes)),
+        colorscale=[[0, CHOROPLETH_LAND_COLOR], [1, CHOROPLETH_LAND_COLOR]],
+        showscale=False,
+        hoverinfo='skip',
+        marker_line_color=CHOROPLETH_BORDER_COLOR,
+        marker_line_width=0.5
+    )
+    return [land], {**geo, **dict.fromkeys(PLOTLY_BASE_LAYERS, False)}
+
+
 def create_contribution_map_plot(
     processed_data_df: pd.DataFrame,
     fill_label: str = "Average Contribution (%)",
@@ -339,7 +623,7 @@ def create_contribution_map_plot(
         
     # Efficient aggregation
     map_data = (
-        processed_data_df.groupby(['iso2c', 'country'], as_index=False)
+        processed_data_df.groupby(['iso2c', 'country'], as_index=False, observed=True)
         .agg({
             'total_percentage': ['mean', 'max', 'min'],
             'year': ['min', 'max'],
@@ -355,11 +639,18 @@ def create_contribution_map_plot(
         'first_year', 'last_year', 'region'
     ]
     
+    land, geo = choropleth_base(
+        showframe=False,
+        showcoastlines=True,
+        coastlinecolor="lightgray",
+        projection_type='natural earth',
+        bgcolor='rgba(0,0,0,0)'
+    )
+
     # Create choropleth with better color scale
-    fig = go.Figure(data=go.Choropleth(
-        locations=map_data['iso2c'],
+    fig = go.Figure(data=[*land, go.Choropleth(
+        **choropleth_locations(map_data['iso2c'], 'iso2c'),
         z=map_data['avg_percentage'],
-        locationmode='ISO-3166-1-alpha-2',
         colorscale='Viridis',
         reversescale=False,
         hovertemplate=(
@@ -371,13 +662,12 @@ def create_contribution_map_plot(
         ),
         customdata=map_data[['country', 'region', 'min_percentage', 'max_percentage', 'first_year', 'last_year']].values,
         colorbar=dict(
-            title=fill_label,
-            titleside="right",
+            title=dict(text=fill_label, side="right"),
             tickmode="linear",
             tick0=0,
             dtick=1
         )
-    ))
+    )])
     
     fig.update_layout(
         title={
@@ -385,13 +675,7 @@ def create_contribution_map_plot(
             'x': 0.5,
             'xanchor': 'center'
         },
-        geo=dict(
-            showframe=False,
-            showcoastlines=True,
-            coastlinecolor="lightgray",
-            projection_type='natural earth',
-            bgcolor='rgba(0,0,0,0)'
-        ),
+        geo=geo,
         template='plotly_white',
         height=500
     )
@@ -430,22 +714,16 @@ def create_trends_plot(data: pd.DataFrame, selected_countries: List[str], mode:
         return fig
     
     data_sorted = data.sort_values(['plot_group', 'year'])
+    traces = []
 
     # --- Trace Generation ---
     if mode == "compare_individuals":
-        for country_name_str in data_sorted['plot_group'].unique(): 
+        groups = iter_trace_groups(data_sorted, 'plot_group', ('year', value_column, 'plot_color'))
+        for country_name_str, country_data_for_trace in groups:
             country_name = str(country_name_str)
-            country_data_for_trace = data_sorted[data_sorted['plot_group'] == country_name]
-            if country_data_for_trace.empty:
-                continue
-            
-            color = None
-            if 'plot_color' in country_data_for_trace.columns:
-                first_valid_color = country_data_for_trace['plot_color'].dropna()
-                if not first_valid_color.empty:
-                    color = first_valid_color.iloc[0]
+            color = first_valid(country_data_for_trace['plot_color']) if 'plot_color' in country_data_for_trace else None
             
-            fig.add_trace(go.Scatter(
+            traces.append(go.Scatter(
                 x=country_data_for_trace['year'],
                 y=country_data_for_trace[value_column],
                 mode='lines+markers',
@@ -470,27 +748,23 @@ def create_trends_plot(data: pd.DataFrame, selected_countries: List[str], mode:
             "4-country": "diamond", "5-country+": "triangle-up", "Unknown": "cross"
         }
 
-        for collab_id_str in data_sorted['plot_group'].unique(): 
+        groups = iter_trace_groups(data_sorted, 'plot_group', ('year', value_column, 'plot_color_group', 'iso2c'))
+        for collab_id_str, collab_data_for_trace in groups:
             collab_id = str(collab_id_str)
-            collab_data_for_trace = data_sorted[data_sorted['plot_group'] == collab_id]
-            if collab_data_for_trace.empty:
-                continue
             
             collab_type = "Unknown"
-            if 'plot_color_group' in collab_data_for_trace.columns:
-                first_valid_type = collab_data_for_trace['plot_color_group'].dropna()
-                if not first_valid_type.empty:
-                    collab_type = str(first_valid_type.iloc[0])
+            if 'plot_color_group' in collab_data_for_trace:
+                collab_type = str(first_valid(collab_data_for_trace['plot_color_group'], collab_type))
 
             display_name = collab_id
-            if 'iso2c' in collab_data_for_trace.columns:
-                iso_codes_value = collab_data_for_trace['iso2c'].iloc[0]
+            if 'iso2c' in collab_data_for_trace:
+                iso_codes_value = collab_data_for_trace['iso2c'][0]
                 if isinstance(iso_codes_value, str) and '-' in iso_codes_value:
                     iso_codes = iso_codes_value.split('-')
                     highlighted_codes = [f"<b>{code}</b>" if code in selected_countries else code for code in iso_codes]
                     display_name = ' + '.join(highlighted_codes)
 
-            fig.add_trace(go.Scatter(
+            traces.append(go.Scatter(
                 x=collab_data_for_trace['year'],
                 y=collab_data_for_trace[value_column],
                 mode='lines+markers',
@@ -509,6 +783,7 @@ def create_trends_plot(data: pd.DataFrame, selected_countries: List[str], mode:
                 ),
                 meta=collab_type
             ))
+    fig.add_traces(traces)
     
     # --- Layout and Interactivity Improvements ---
     legend_config = {
@@ -575,7 +850,7 @@ def create_summary_table(data: pd.DataFrame, display_mode: str) -> pd.DataFrame:
         
     if display_mode in ["individual", "compare_individuals"]:
         summary = (
-            data.groupby(['iso2c', 'country', 'region', 'chemical'])
+            data.groupby(['iso2c', 'country', 'region', 'chemical'], observed=True)
             .agg({
                 'total_percentage': ['mean', 'max', 'count']
             })
@@ -591,7 +866,7 @@ def create_summary_table(data: pd.DataFrame, display_mode: str) -> pd.DataFrame:
         
     elif display_mode == "find_collaborations": 
         summary = (
-            data.groupby(['iso2c', 'collab_type', 'chemical'])
+            data.groupby(['iso2c', 'collab_type', 'chemical'], observed=True)
             .agg({
                 'total_percentage': ['mean', 'max', 'count']
             })
@@ -610,7 +885,7 @@ def create_summary_table(data: pd.DataFrame, display_mode: str) -> pd.DataFrame:
     return summary
 
 def calculate_top_contributors(
-    df: pd.DataFrame,
+    store: "DataStore",
     year_range: Tuple[int, int],
     chemical_category: str,
     region_filter: str = "All", 
@@ -622,55 +897,72 @@ def calculate_top_contributors(
     Calculate top contributing countries based on filters
     
     Args:
-        df: Main data DataFrame
+        store: Shared DataStore holding the loaded dataset
         year_range: Year range tuple
         chemical_category: Chemical category filter
         region_filter: Region filter
-        country_list: Country metadata
+        country_list: Country metadata (defaults to the store's country list)
         top_n: Number of top contributors to return
         ignore_year_filter: Whether to ignore year filter
         
     Returns:
         DataFrame with top contributors
     """
-    # Base query for solo contributions
-    query_df = df[df['is_collab'] == False].copy()
-    
-    # Apply filters
-    if not ignore_year_filter:
-        query_df = query_df[
-            (query_df['year'] >= year_range[0]) & 
-            (query_df['year'] <= year_range[1])
-        ]
-        
-    if chemical_category != "All":
-        query_df = query_df[query_df['chemical'] == chemical_category]
-        
-    if region_filter != "All":
-        query_df = query_df[query_df['region'] == region_filter]
-        
-    # Calculate top contributors
-    top_data = (
-        query_df.groupby('iso2c')['percentage']
-        .mean()
-        .reset_index()
-        .sort_values('percentage', ascending=False)
-        .head(top_n)
-        .reset_index(drop=True)
+    if country_list is None:
+        country_list = store.country_list
+
+    # Chemical "All" averages over every category here
+    chemical = None if chemical_category == "All" else chemical_category
+    if ignore_year_filter:
+        year_range = (store.min_year, store.max_year)
+
+    top_data = store.backend.top_contributors(chemical, year_range, top_n, region_filter)
+    top_data = top_data.rename(columns={'entity': 'iso2c'})
+    
+    # Add country names
+    top_data = top_data.merge(
+        country_list[['iso2c', 'country']].drop_duplicates(subset=['iso2c']), 
+        on='iso2c', 
+        how='left'
     )
+    return top_data[['rank', 'iso2c', 'country', 'avg_percentage']]
+
+
+def get_top_trends_data(
+    store: "DataStore",
+    is_collab: bool,
+    chemical_category: str,
+    top_n: int = 10,
+    year_range: Optional[Tuple[int, int]] = None
+) -> pd.DataFrame:
+    """
+    Rows of the top-N countries or collaborations for the top trends plot
     
-    top_data['rank'] = range(1, len(top_data) + 1)
-    
-    # Add country names if available
-    if country_list is not None:
-        top_data = top_data.merge(
-            country_list[['iso2c', 'country']], 
-            on='iso2c', 
-            how='left'
-        )
-    return top_data[['rank', 'iso2c', 'country', 'percentage']].rename(
-        columns={'percentage': 'avg_percentage'}
-    )
+    Args:
+        store: Shared DataStore holding the loaded dataset
+        is_collab: Rank collaborations instead of countries
+        chemical_category: Chemical category filter
+        top_n: Number of countries/collaborations to keep
+        year_range: Inclusive (start, end) year tuple (defaults to all years)
+        
+    Returns:
+        Series rows of the top entities for the chemical category
+    """
+    if year_range is None:
+        year_range = (store.min_year, store.max_year)
+
+    leaderboard = store.collab_leaderboard if is_collab else store.national_leaderboard
+    top_data = leaderboard.top(chemical_category, year_range, top_n)
+    if top_data.empty:
+        return pd.DataFrame()
+
+    source_df = store.collaborations if is_collab else store.national
+    return source_df[
+        (source_df['chemical'] == chemical_category) &
+        (source_df['year'] >= year_range[0]) &
+        (source_df['year'] <= year_range[1]) &
+        (source_df[leaderboard.entity_column].isin(top_data['entity']))
+    ]
 
 def create_article_plot(data: pd.DataFrame, title: str):
     """Create article plots"""
@@ -681,17 +973,18 @@ def create_article_plot(data: pd.DataFrame, title: str):
     max_year = int(data['year'].max()) if not data.empty else 2022
     recent_years = max(max_year - 5, min_year)
     
-    for country in data['country'].unique():
-        country_data = data[data['country'] == country]
-        color = country_data['cc'].iloc[0] if 'cc' in country_data.columns and not country_data.empty else None
-        fig.add_trace(go.Scatter(
+    traces = []
+    for country, country_data in iter_trace_groups(data, 'country', ('year', 'value', 'cc')):
+        color = country_data['cc'][0] if 'cc' in country_data else None
+        traces.append(go.Scatter(
             x=country_data['year'],
             y=country_data['value'],
             mode='lines+markers',
             name=country,
             line=dict(color=color, width=1) if color else dict(width=1),
-            marker=dict(size=country_data['value'].abs().clip(lower = 1, upper=10), opacity=0.3, color=color if color else 'red')
+            marker=dict(size=np.clip(np.abs(country_data['value']), 1, 10), opacity=0.3, color=color if color else 'red')
         ))
+    fig.add_traces(traces)
     
     fig.update_layout(
         height=550,
@@ -810,11 +1103,11 @@ def create_article_plot_simple(
         plot_data['plot_value'] = plot_data['value']
         
     # Add traces for each country
-    for country in plot_data['country'].unique():
-        country_data = plot_data[plot_data['country'] == country]
+    traces = []
+    for country, country_data in iter_trace_groups(plot_data, 'country', ('year', 'plot_value')):
         color = country_colors.get(country, '#1f77b4')  # Default blue
         
-        fig.add_trace(go.Scatter(
+        traces.append(go.Scatter(
             x=country_data['year'],
             y=country_data['plot_value'],
             mode='lines+markers',
@@ -827,6 +1120,7 @@ def create_article_plot_simple(
                 f"Value: %{{y:.2f}}<extra></extra>"
             )
         ))
+    fig.add_traces(traces)
     
     # Add annotations for GDP plot
     if source_title == "Annual growth rate of the GDP":
@@ -875,11 +1169,11 @@ def create_top_collabs_plot(top_collab_data: pd.DataFrame, title: str = "Collabo
     # Use qualitative colors
     colors = px.colors.qualitative.Set1
     
-    for i, entity in enumerate(top_collab_data['country'].unique()):
-        entity_data = top_collab_data[top_collab_data['country'] == entity]
+    traces = []
+    for i, (entity, entity_data) in enumerate(iter_trace_groups(top_collab_data, 'country', ('year', 'percentage'))):
         color = colors[i % len(colors)]
         
-        fig.add_trace(go.Scatter(
+        traces.append(go.Scatter(
             x=entity_data['year'],
             y=entity_data['percentage'],
             mode='lines+markers',
@@ -892,6 +1186,7 @@ def create_top_collabs_plot(top_collab_data: pd.DataFrame, title: str = "Collabo
                 "Percentage: %{y:.2f}%<extra></extra>"
             )
         ))
+    fig.add_traces(traces)
     
     fig.update_layout(
         title=title,
@@ -924,29 +1219,31 @@ def create_top_trends_plot(data: pd.DataFrame, title: str):
     fig = go.Figure()
     
     # Calculate the average percentage for each entity to sort the legend
-    avg_percentages = data.groupby('country')['percentage'].mean().sort_values(ascending=True)
+    avg_percentages = data.groupby('country', observed=True)['percentage'].mean().sort_values(ascending=True)
     
-    # Plot entities in order of their average percentage (highest first)
-    for entity in avg_percentages.index:
-        entity_data = data[data['country'] == entity]
-        # Ensure entity data is sorted by year for proper line drawing
-        entity_data = entity_data.sort_values('year')
-        
+    # Plot entities in order of their average percentage (highest first),
+    # each sorted by year for proper line drawing
+    groups = iter_trace_groups(
+        data.sort_values('year', kind='stable'), 'country', ('year', 'percentage', 'cc'), order=avg_percentages.index
+    )
+    traces = []
+    for entity, entity_data in groups:
         avg_value = avg_percentages[entity]
         
-        fig.add_trace(go.Scatter(
+        traces.append(go.Scatter(
             x=entity_data['year'],
             y=entity_data['percentage'],
             mode='lines+markers',
             name=f"{entity} ({avg_value:.2f}%)",  # Include avg in legend
             line=dict(width=1.5),
-            marker=dict(color=entity_data['cc'].iloc[0] if 'cc' in entity_data.columns and not entity_data.empty else 'red'),
+            marker=dict(color=entity_data['cc'][0] if 'cc' in entity_data else 'red'),
             hovertemplate=(
                 "<b>%{fullData.name}</b><br>" +
                 "Year: %{x}<br>" +
                 "Contribution: %{y:.2f}%<extra></extra>"
             )
         ))
+    fig.add_traces(traces)
     
     fig.update_layout(
         # title=title,
@@ -983,9 +1280,164 @@ def create_top_trends_plot(data: pd.DataFrame, title: str):
 
     return fig
 
-def create_folium_map(country_list: pd.DataFrame, selected_countries: List[str]) -> folium.Map:
-    """Create interactive Folium map with improved region handling and better country visualization"""
-    
+# Country layer of create_folium_map: features are styled from their
+# properties. Countries with a shape in the tier's TopoJSON boundaries are
+# only embedded as properties (keyed by ISO code); their shapes are fetched
+# and decoded in the browser and added to the layer.
+COUNTRY_LAYER_SCRIPT = """
+{% macro script(this, kwargs) %}
+    var {{ this.get_name() }} = L.geoJson(null, {
+        style: function (feature) { return feature.properties.style; },
+        pointToLayer: function (feature, latlng) {
+            return L.circle(latlng, Object.assign({radius: {{ this.circle_radius }}, fill: true}, feature.properties.style));
+        }
+    }).addTo({{ this._parent.get_name() }});
+    {{ this.get_name() }}.countries = {{ this.countries }};
+    // Point markers stay above the shapes they may lie in
+    function {{ this.get_name() }}_raiseMarkers() {
+        {{ this.get_name() }}.eachLayer(function (layer) {
+            if (layer.feature.geometry.type === 'Point') {
+                layer.bringToFront();
+            }
+        });
+    }
+    {{ this.get_name() }}.addData({{ this.feature_collection }});
+    {{ this.get_name() }}_raiseMarkers();
+    {%- if this.topology_url %}
+    fetch({{ this.topology_url|tojson }})
+        .then(function (response) { return response.json(); })
+        .then(function (topology) {
+            var shapes = topojson.feature(topology, topology.objects[{{ this.topology_object|tojson }}]);
+            {{ this.get_name() }}.addData(shapes.features.filter(function (feature) {
+                feature.properties = {{ this.get_name() }}.countries[feature.id];
+                return feature.properties !== undefined;
+            }));
+            {{ this.get_name() }}_raiseMarkers();
+        })
+        .catch(function (error) { console.error("Could not load country shapes:", error); });
+    {%- endif %}
+{% endmacro %}
+"""
+
+
+class CountryLayer(JSCSSMixin, folium.MacroElement):
+    """
+    Country layer of the selection map
+
+    Args:
+        feature_collection: Serialized GeoJSON FeatureCollection of the
+            countries embedded in the map
+        countries: Serialized JSON object of the feature properties of the
+            countries drawn from the TopoJSON boundaries, keyed by their
+            ISO-2 code in the boundaries
+        topology_url: URL of the TopoJSON boundaries, or None to embed every
+            country in feature_collection
+        circle_radius: Radius in meters of the point markers
+    """
+
+    _template = Template(COUNTRY_LAYER_SCRIPT)
+
+    default_js = [
+        ("topojson_feature", TOPOLOGY_DECODER_URL),
+    ]
+
+    def __init__(
+        self,
+        feature_collection: str,
+        countries: str,
+        topology_url: Optional[str] = None,
+        circle_radius: int = 85000
+    ):
+        super().__init__()
+        self._name = "CountryLayer"
+        self.feature_collection = feature_collection
+        self.countries = countries
+        self.topology_url = topology_url
+        self.topology_object = TOPOLOGY_OBJECT
+        self.circle_radius = circle_radius
+        if topology_url is None:
+            self.default_js = []
+
+
+# Clicks within this distance of the location of a country drawn as a point
+# marker (no shape) select it: the radius of the markers
+MAP_CLICK_MAX_DISTANCE_KM = 85
+
+# Countries lying at least this much inside a drawn lasso or rectangle (by
+# area share) are selected by it
+MAP_AREA_MIN_SHARE = 0.5
+
+# Delegated tooltip for the country layer of create_folium_map, click
+# handling on the map, sending of drawn selection areas, and
+# window.countryMap.update() for restyling countries in place (called by
+# www/map_selection.js)
+MAP_SELECTION_SCRIPT = """
+{% macro script(this, kwargs) %}
+    {{ this.layer_name }}.bindTooltip(function (layer) {
+        var country = layer.feature.properties;
+        var hint = country.approximate
+            ? "\u26a0\ufe0f Using approximate location"
+            : "Click to " + (country.selected ? "deselect" : "select");
+        return "<b>" + country.name + "</b><br>Region: " + country.region + "<br>" + hint;
+    }, {sticky: true});
+    function {{ this.get_name() }}_send(name, value) {
+        var shiny = (window.parent && window.parent.Shiny) ? window.parent.Shiny : window.Shiny;
+        if (shiny) {
+            shiny.setInputValue(name, value, {priority: 'event'});
+        }
+    }
+    // Clicks send their coordinates; the server resolves them to a country
+    // (resolve_map_click). Clicks on the countries bubble up to the map, so
+    // the handler is only registered on the map and every click is sent once.
+    // Clicks placing the points of a lasso or rectangle are not sent.
+    var {{ this.get_name() }}_drawing = false;
+    function {{ this.get_name() }}_click(e) {
+        if (!{{ this.get_name() }}_drawing) {
+            {{ this.get_name() }}_send('map_click', {lat: e.latlng.lat, lng: e.latlng.lng});
+        }
+    }
+    {{ this._parent.get_name() }}.on('click', {{ this.get_name() }}_click);
+    {{ this._parent.get_name() }}.on('draw:drawstart', function () {
+        {{ this.get_name() }}_drawing = true;
+    });
+    {{ this._parent.get_name() }}.on('draw:drawstop', function () {
+        // The click ending a drawing arrives after drawstop
+        setTimeout(function () { {{ this.get_name() }}_drawing = false; }, 300);
+    });
+    // A drawn lasso or rectangle is sent once and resolved to the countries
+    // inside it (resolve_map_area); the shape itself is not kept
+    {{ this._parent.get_name() }}.on('draw:created', function (e) {
+        {{ this.get_name() }}_send('map_area', e.layer.toGeoJSON().geometry);
+        setTimeout(function () { {{ this.drawn_name }}.removeLayer(e.layer); }, 0);
+    });
+    window.countryMap = {
+        update: function (updates) {
+            var byIso = {};
+            updates.forEach(function (update) {
+                byIso[update.iso] = update;
+                // Countries whose shapes are still loading
+                var country = {{ this.layer_name }}.countries[update.iso];
+                if (country) {
+                    country.selected = update.selected;
+                    country.style = update.style;
+                }
+            });
+            {{ this.layer_name }}.eachLayer(function (layer) {
+                var update = byIso[layer.feature.properties.iso];
+                if (update) {
+                    layer.feature.properties.selected = update.selected;
+                    layer.feature.properties.style = update.style;
+                    layer.setStyle(update.style);
+                }
+            });
+        }
+    };
+{% endmacro %}
+"""
+
+
+def _map_view(country_list: pd.DataFrame) -> Tuple[float, float, int]:
+    """Initial (center lat, center lng, zoom) of a map showing the given countries"""
     # Determine map center based on filtered countries
     if not country_list.empty:
         center_lat = country_list['lat'].mean()
@@ -1006,6 +1458,13 @@ def create_folium_map(country_list: pd.DataFrame, selected_countries: List[str])
             zoom_start = 4
     else:
         center_lat, center_lng, zoom_start = 30, 10, 2
+    return center_lat, center_lng, zoom_start
+
+
+def create_folium_map(country_list: pd.DataFrame, selected_countries: List[str]) -> folium.Map:
+    """Create interactive Folium map with improved region handling and better country visualization"""
+    
+    center_lat, center_lng, zoom_start = _map_view(country_list)
 
     # Determine circle radius in meters based on initial zoom level for fallback markers
     if zoom_start > 3:
@@ -1013,11 +1472,17 @@ def create_folium_map(country_list: pd.DataFrame, selected_countries: List[str])
     else:
         circle_radius_meters = 85000 # Larger radius for zoomed-out views
     
+    # Basemap tiles come from the local tile store when there is one
+    local_tiles = tile_layer_options()
     m = folium.Map(
-        tiles="OpenStreetMap",
+        tiles=None if local_tiles else "OpenStreetMap",
         location=[center_lat, center_lng], 
         zoom_start=zoom_start
         )
+    # Scripts and stylesheets come from www/vendor/ when they were fetched
+    use_vendored_assets(m)
+    if local_tiles:
+        folium.TileLayer(**local_tiles).add_to(m)
     
     # Define a simplified, universal legend
     legend_html = '''
@@ -1062,184 +1527,71 @@ def create_folium_map(country_list: pd.DataFrame, selected_countries: List[str])
         '''
         m.get_root().html.add_child(folium.Element(title_html))
     
-    # Load world geometries for better country shapes
+    # Country shapes come from the process-wide registry (read and prepared
+    # once), at the coarsest simplification tier that looks exact at zoom_start
+    geometry_tier = tier_for_zoom(zoom_start)
     try:
-        world_path = "./data/world_boundaries.geojson"
-        world = gpd.read_file(world_path)
-        
-        # Look for ISO column in a more comprehensive way
-        iso_column = None
-        potential_iso_columns = ['iso_a2', 'ISO_A2', 'iso2c', 'ISO2C', 'ISO', 'iso', 'ISO_2', 'iso_2']
-        for possible_col in potential_iso_columns:
-            if possible_col in world.columns:
-                iso_column = possible_col
-                break
-        
-        if iso_column is None:
-            print("Warning: No ISO column found in GeoJSON. Available columns:", world.columns.tolist())
-            raise FileNotFoundError("No suitable ISO column found")
-        
-        # Create ISO to geometry mapping for quicker lookups
-        # Use multiple ISO columns to handle cases where iso_a2 is "-99" 
-        iso_to_geometry = {}
-        for _, row in world.iterrows():
-            # Try multiple ISO columns in order of preference
-            iso_code = None
-            for col in ['iso_a2_eh', 'wb_a2', 'iso_a2']:
-                if col in world.columns:
-                    candidate = row.get(col)
-                    if candidate is not None and isinstance(candidate, str) and len(candidate) == 2 and candidate != "-99":
-                        iso_code = candidate
-                        break
-            
-            if iso_code is not None:  # Valid ISO-2 code found
-                iso_to_geometry[iso_code] = row.geometry
-        
-        # Add countries to map
-        for _, country_row in country_list.iterrows():
-            iso = country_row['iso2c']
-            country_name = country_row['country']
-            region = country_row.get('region', 'Unknown')
-            
-            # Enhanced color scheme
-            if iso in selected_countries:
-                color = country_row['cc']  # Use country color when selected
-                fill_opacity = 0.8
-                stroke_weight = 2
-            else:
-                color = "#83928e"  # Default color for unselected countries
-                fill_opacity = 0.5
-                stroke_weight = 1
-            
-            # Try different case variations of the ISO code
-            geometry = None
-            for iso_variant in [iso, iso.upper(), iso.lower()]:
-                if iso_variant in iso_to_geometry:
-                    geometry = iso_to_geometry[iso_variant]
-                    break
-                    
-            # Simplified popup with just action and country name
-            popup_html = f"""
-            <div style="min-width: 120px; text-align: center;">
-                <button onclick="
-                    if (window.parent && window.parent.Shiny) {{
-                        window.parent.Shiny.setInputValue('map_click_iso', '{iso}', {{priority: 'event'}});
-                    }} else if (window.Shiny) {{
-                        window.Shiny.setInputValue('map_click_iso', '{iso}', {{priority: 'event'}});
-                    }}
-                " style="
-                    padding: 8px 12px; 
-                    margin: 5px 0; 
-                    cursor: pointer;
-                    background-color: {'#e74c3c' if iso in selected_countries else '#3498db'};
-                    color: white;
-                    border: none;
-                    border-radius: 4px;
-                    font-weight: bold;
-                    width: 100%;
-                ">
-                    {'🗑️ Deselect ' if iso in selected_countries else '✅ Select '}{country_name} ({iso})
-                </button>
-            </div>
-            """
-                
-            if geometry is not None:
-                # Use the found geometry
-                folium.GeoJson(
-                    geometry,
-                    style_function=lambda x, color=color, fill_opacity=fill_opacity, weight=stroke_weight: {
-                        'fillColor': color,
-                        'color': 'white',
-                        'weight': weight,
-                        'fillOpacity': fill_opacity,
-                        'dashArray': '0' if iso in selected_countries else '5, 5'
-                    },
-                    tooltip=folium.Tooltip(
-                        f"<b>{country_name}</b><br>Region: {region}<br>Click to {'deselect' if iso in selected_countries else 'select'}",
-                        sticky=True
-                    ),
-                    popup=folium.Popup(popup_html, max_width=250)
-                ).add_to(m)
-            else:
-                # Use folium.Circle for scalable markers for countries without shapes
-                folium.Circle(
-                    location=[country_row['lat'], country_row['lng']],
-                    radius=circle_radius_meters,
-                    color= "#525756",
-                    weight=1,
-                    fill=True,
-                    fill_color=color,
-                    fill_opacity=fill_opacity,
-                    popup=folium.Popup(popup_html, max_width=220),
-                    tooltip=folium.Tooltip(
-                        f"<b>{country_name}</b><br>Region: {region}<br>⚠️ Using approximate location",
-                        sticky=True
-                    )
-                ).add_to(m)
-                
-        # Add the simplified legend to the map
-        # m.get_root().html.add_child(folium.Element(legend_html))
-                
+        geometries = get_geometry_registry()
     except Exception as e:
         print(f"Error loading GeoJSON: {e}")
-        # Fallback to markers if GeoJSON fails
-        for _, country in country_list.iterrows():
-            iso = country['iso2c']
-            country_name = country['country']
-            region = country.get('region', 'Unknown')
-            
-            if iso in selected_countries:
-                color = country['cc']
-                fill_opacity = 0.8
-            else:
-                color = 'lightblue'
-                fill_opacity = 0.5
-            
-            popup_html = f"""
-            <div style="min-width: 180px;">
-                <h4 style="margin: 0 0 10px 0; color: #2c3e50;">
-                    {country_name} ({iso})
-                </h4>
-                <p style="margin: 5px 0; color: #7f8c8d;">
-                    <strong>Region:</strong> {region}
-                </p>
-                <button onclick="
-                    if (window.parent && window.parent.Shiny) {{
-                        window.parent.Shiny.setInputValue('map_click_iso', '{iso}', {{priority: 'event'}});
-                    }} else if (window.Shiny) {{
-                        window.Shiny.setInputValue('map_click_iso', '{iso}', {{priority: 'event'}});
-                    }}
-                " style="
-                    padding: 8px 16px; 
-                    margin: 10px 0 5px 0; 
-                    cursor: pointer;
-                    background-color: {'#e74c3c' if iso in selected_countries else '#3498db'};
-                    color: white;
-                    border: none;
-                    border-radius: 4px;
-                    font-weight: bold;
-                    width: 100%;
-                ">
-                    {'🗑️ Deselect' if iso in selected_countries else '✅ Select'}
-                </button>
-            </div>
-            """
-            
-            folium.Circle(
-                location=[country['lat'], country['lng']],
-                radius=circle_radius_meters,
-                color='black',
-                weight=1,
-                fill=True,
-                fill_color=color,
-                fill_opacity=fill_opacity,
-                popup=folium.Popup(popup_html, max_width=300),
-                tooltip=folium.Tooltip(
-                    f"<b>{country_name}</b><br>Region: {region}<br>⚠️ Using approximate location",
-                    sticky=True
-                )
-            ).add_to(m)
-            
+        geometries = None
+
+    # With the tier's TopoJSON boundaries built, the browser decodes the
+    # shapes and the map only embeds the countries' properties
+    shapes_url = topology_url(geometry_tier) if geometries is not None else None
+
+    # Style, tooltip and click handling are driven by the feature
+    # properties. Countries without a shape are drawn as circles at their
+    # approximate location.
+    prepared = prepare_map_countries(country_list, selected_countries, geometries, geometry_tier)
+    if shapes_url is not None:
+        from_topology = ~prepared['approximate']
+        countries = '{' + ', '.join(
+            '"' + prepared.loc[from_topology, 'shape_iso'] + '": ' + prepared.loc[from_topology, 'properties']
+        ) + '}'
+        embedded = prepared[~from_topology]
+    else:
+        countries = '{}'
+        embedded = prepared
+
+    # Geometries are embedded pre-serialized instead of re-encoded
+    features = (
+        '{"type": "Feature", "id": "' + embedded['iso2c'] + '", "properties": '
+        + embedded['properties'] + ', "geometry": ' + embedded['geometry'] + '}'
+    )
+
+    countries_layer = CountryLayer(
+        '{"type": "FeatureCollection", "features": [' + ', '.join(features) + ']}',
+        countries,
+        topology_url=shapes_url,
+        circle_radius=circle_radius_meters
+    ).add_to(m)
+
+    # Lasso (polygon) and rectangle tools for selecting many countries at once
+    drawn_areas = folium.FeatureGroup(name="drawn areas", control=False).add_to(m)
+    use_vendored_assets(Draw(
+        feature_group=drawn_areas,
+        show_geometry_on_click=False,
+        draw_options={
+            'polyline': False,
+            'circle': False,
+            'marker': False,
+            'circlemarker': False,
+            'polygon': {'allowIntersection': False},
+            'rectangle': True
+        },
+        edit_options={'edit': False, 'remove': False}
+    )).add_to(m)
+
+    # One tooltip binding and one click handler for the whole layer, plus the
+    # drawn areas and in-place restyling (MAP_SELECTION_SCRIPT)
+    selection_script = folium.MacroElement()
+    selection_script._template = Template(MAP_SELECTION_SCRIPT)
+    selection_script.layer_name = countries_layer.get_name()
+    selection_script.drawn_name = drawn_areas.get_name()
+    m.add_child(selection_script)
+
+    if geometries is None:
         # Add warning about missing shapes
         warning_html = '''
         <div style="position: fixed; 
@@ -1256,28 +1608,298 @@ def create_folium_map(country_list: pd.DataFrame, selected_countries: List[str])
         </div>
         '''
         m.get_root().html.add_child(folium.Element(warning_html))
-        # Add the simplified legend in the except block as well
         m.get_root().html.add_child(folium.Element(legend_html))
     
     return m
 
 
-def create_contribution_choropleth(data: pd.DataFrame):
-    """Create world choropleth map with proper color scaling"""
+def map_asset_urls() -> List[str]:
+    """CDN URLs of the scripts and stylesheets of the selection map (see utils/assets.py)"""
+    return asset_urls([folium.Map, Draw])
+
+
+def render_map_html(country_list: pd.DataFrame, selected_countries: List[str], region_filter: str) -> str:
+    """
+    Rendered HTML of the map for a region and selection, shared across sessions
+
+    Maps are cached in MAP_HTML_CACHE keyed by (region filter, selected ISO
+    codes, simplification tier), so a new session showing the same map as an
+    earlier one gets the rendered HTML without building it again.
+
+    Args:
+        country_list: Countries of the region, as passed to create_folium_map
+        selected_countries: Current selection
+        region_filter: Region the countries were filtered by
+
+    Returns:
+        HTML of the map
+    """
+    geometry_tier = tier_for_zoom(_map_view(country_list)[2])
+    key = (region_filter, frozenset(selected_countries), geometry_tier)
+    return MAP_HTML_CACHE.get_or_create(
+        key,
+        lambda: create_folium_map(country_list, selected_countries)._repr_html_()
+    )
+
+
+def changed_map_selection(shown: Iterable[str], selected: Iterable[str]) -> List[str]:
+    """
+    ISO-2 codes whose selection differs from the one shown on the map
+
+    Args:
+        shown: Selection the map was rendered or last restyled with
+        selected: Current selection
+
+    Returns:
+        Sorted codes added to or removed from the selection
+    """
+    return sorted(set(shown) ^ set(selected))
+
+
+def get_map_selection_updates(
+    country_list: pd.DataFrame,
+    changed_isos: List[str],
+    selected_countries: List[str]
+) -> List[Dict]:
+    """
+    Style updates for map countries whose selection changed
+
+    Lets the app restyle the map drawn by create_folium_map in place
+    instead of rendering it again.
+
+    Args:
+        country_list: Countries shown on the map
+        changed_isos: ISO-2 codes whose selection changed
+        selected_countries: Current selection
+
+    Returns:
+        One dict with iso, selected and style per changed country on the map
+    """
+    try:
+        geometries = get_geometry_registry()
+    except Exception:
+        geometries = None
+
+    changed = country_list[country_list['iso2c'].isin(list(changed_isos))].drop_duplicates(subset=['iso2c'])
+    shape_keys = geometries.frame().index if geometries is not None else pd.Index([], dtype=object)
+    selected = changed['iso2c'].isin(list(selected_countries)).to_numpy()
+    approximate = shape_keys.get_indexer(normalize_iso(changed['iso2c'])) < 0
+    styles = _country_styles(selected, approximate, changed['cc'].to_numpy(dtype=object)).to_dict('records')
+    return [
+        {'iso': iso, 'selected': bool(is_selected), 'style': style}
+        for iso, is_selected, style in zip(changed['iso2c'], selected, styles)
+    ]
+
+
+def resolve_map_click(country_list: pd.DataFrame, lat: float, lng: float) -> Optional[str]:
+    """
+    Country at a clicked map location
+
+    Countries drawn as point markers (no shape) are matched first, by the
+    nearest location within MAP_CLICK_MAX_DISTANCE_KM. Otherwise the click is
+    located in the unsimplified country shapes through the geometry
+    registry's spatial index.
+
+    Args:
+        country_list: Countries shown on the map
+        lat: Latitude of the click
+        lng: Longitude of the click (wrapped into [-180, 180))
+
+    Returns:
+        ISO-2 code of the clicked country, or None
+    """
+    lng = (lng + 180) % 360 - 180
+    try:
+        geometries = get_geometry_registry()
+    except Exception:
+        geometries = None
+
+    countries = country_list.drop_duplicates(subset=['iso2c'])
+    keys = normalize_iso(countries['iso2c'])
+    if geometries is not None:
+        approximate = geometries.frame().index.get_indexer(keys) < 0
+    else:
+        approximate = np.ones(len(countries), dtype=bool)
+
+    # Markers are drawn over the shapes (e.g. Hong Kong over China)
+    markers = countries[approximate & countries['lat'].notna().to_numpy() & countries['lng'].notna().to_numpy()]
+    if not markers.empty:
+        distances = _distance_km(lat, lng, markers['lat'].to_numpy(dtype=float), markers['lng'].to_numpy(dtype=float))
+        nearest = int(np.argmin(distances))
+        if distances[nearest] <= MAP_CLICK_MAX_DISTANCE_KM:
+            return markers['iso2c'].iloc[nearest]
+
+    if geometries is not None:
+        hit = np.isin(keys, normalize_iso(geometries.locate(lat, lng)))
+        if hit.any():
+            return countries['iso2c'].iloc[int(np.argmax(hit))]
+    return None
+
+
+def resolve_map_area(country_list: pd.DataFrame, area: Dict) -> List[str]:
+    """
+    Countries inside a lasso or rectangle drawn on the map
+
+    Candidates are found through the geometry registry's spatial index; a
+    country is inside when at least MAP_AREA_MIN_SHARE of its unsimplified
+    shape is. Countries drawn as point markers are inside when their
+    location is.
+
+    Args:
+        country_list: Countries shown on the map
+        area: GeoJSON geometry of the drawn area
+
+    Returns:
+        ISO-2 codes of the countries inside, in country list order
+    """
+    try:
+        polygon = shapely.make_valid(shapely.geometry.shape(area))
+    except Exception as e:
+        print(f"Ignoring invalid selection area: {e}")
+        return []
+    try:
+        geometries = get_geometry_registry()
+    except Exception:
+        geometries = None
+
+    countries = country_list.drop_duplicates(subset=['iso2c'])
+    keys = normalize_iso(countries['iso2c'])
+    if geometries is not None:
+        approximate = geometries.frame().index.get_indexer(keys) < 0
+        inside = np.isin(keys, normalize_iso(geometries.within(polygon, MAP_AREA_MIN_SHARE)))
+    else:
+        approximate = np.ones(len(countries), dtype=bool)
+        inside = np.zeros(len(countries), dtype=bool)
+
+    points = shapely.points(countries['lng'].to_numpy(dtype=float), countries['lat'].to_numpy(dtype=float))
+    inside |= approximate & shapely.contains(polygon, points)
+    return countries.loc[inside, 'iso2c'].tolist()
+
+
+def _distance_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    # Great-circle distances from one point to many (haversine)
+    lat1, lng1, lat2, lng2 = np.radians(lat), np.radians(lng), np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def prepare_map_countries(
+    country_list: pd.DataFrame,
+    selected_countries: List[str],
+    geometries: Optional["GeometryRegistry"] = None,
+    tier: str = DEFAULT_TIER
+) -> pd.DataFrame:
+    """
+    Countries of the selection map, ready to serialize
+
+    Joins the country list with the tier's shapes on the normalized ISO-2
+    code in one step. Countries without a shape fall back to a point at
+    their approximate location; those without a location are dropped.
+
+    Args:
+        country_list: Countries shown on the map
+        selected_countries: Current selection
+        geometries: Registry of country shapes, or None to draw points only
+        tier: Simplification tier of the shapes
+
+    Returns:
+        DataFrame with one row per country:
+            iso2c: ISO-2 code of the country list
+            shape_iso: ISO-2 code of the shape in the registry (NaN for points)
+            approximate: True for countries drawn as a point
+            selected: Whether the country is selected
+            style: Serialized style
+            properties: Serialized feature properties, style included
+            geometry: Serialized GeoJSON geometry (shape or point)
+    """
+    countries = country_list.drop_duplicates(subset=['iso2c'])
+    shapes = geometries.frame(tier) if geometries is not None else pd.DataFrame(columns=['iso2c', 'geojson'])
+
+    # Hash join on the normalized code: position of each country's shape in
+    # the registry frame, -1 (the None sentinel below) for countries without one
+    position = shapes.index.get_indexer(normalize_iso(countries['iso2c']))
+    shape_iso = np.append(shapes['iso2c'].to_numpy(dtype=object), None)[position]
+    geojson = np.append(shapes['geojson'].to_numpy(dtype=object), None)[position]
+    approximate = position < 0
+
+    lat = countries['lat'].to_numpy(dtype=float)
+    lng = countries['lng'].to_numpy(dtype=float)
+    drawn = ~approximate | (~np.isnan(lat) & ~np.isnan(lng))
+    countries = countries[drawn]
+    shape_iso, geojson, approximate, lat, lng = shape_iso[drawn], geojson[drawn], approximate[drawn], lat[drawn], lng[drawn]
+
+    points = (
+        '{"type": "Point", "coordinates": ['
+        + lng.astype(str).astype(object) + ', ' + lat.astype(str).astype(object) + ']}'
+    )
+    properties = pd.DataFrame({
+        'iso': countries['iso2c'].to_numpy(dtype=object),
+        'name': countries['country'].to_numpy(dtype=object),
+        'region': countries['region'].fillna('Unknown').to_numpy(dtype=object),
+        'selected': countries['iso2c'].isin(list(selected_countries)).to_numpy(),
+        'color': countries['cc'].to_numpy(dtype=object),
+        'approximate': approximate
+    })
+    style = _json_records(_country_styles(properties['selected'].to_numpy(), approximate, properties['color'].to_numpy()))
+
+    return pd.DataFrame({
+        'iso2c': properties['iso'],
+        'shape_iso': shape_iso,
+        'approximate': approximate,
+        'selected': properties['selected'],
+        'style': style,
+        'properties': _json_records(properties, append=', "style": ' + style + '}'),
+        'geometry': np.where(approximate, points, geojson)
+    })
+
+
+def _json_records(df: pd.DataFrame, append: Optional[np.ndarray] = None) -> np.ndarray:
+    # One serialized JSON object per row; with append, each object's closing
+    # brace is replaced by the given strings (extra members and the brace)
+    records = np.array(df.to_json(orient='records', lines=True).splitlines(), dtype=object)
+    if append is None:
+        return records
+    return pd.Series(records).str[:-1].to_numpy(dtype=object) + append
+
+
+def _country_styles(selected: np.ndarray, approximate: np.ndarray, color: np.ndarray) -> pd.DataFrame:
+    # Style of country features from their selection state
+    return pd.DataFrame({
+        'fillColor': np.where(selected, color, "#83928e"),
+        'color': np.where(approximate, "#525756", 'white'),
+        'weight': np.where(selected & ~approximate, 2, 1),
+        'fillOpacity': np.where(selected, 0.8, 0.5),
+        'dashArray': np.where(selected | approximate, '0', '5, 5')
+    })
+
+
+def create_contribution_choropleth(data: pd.DataFrame, aggregated: bool = False):
+    """
+    Create world choropleth map with proper color scaling
+
+    Args:
+        data: Country rows with iso3c, country, region and total_percentage
+        aggregated: Whether data already holds one averaged row per country
+            (as returned by get_contribution_averages); otherwise the rows
+            (e.g. from get_display_data) are averaged per country here
+    """
     value_column = 'total_percentage'
 
     if value_column not in data.columns or data.empty:
         return create_empty_plot("No data available for choropleth")
     
     # Calculate average percentage per country
-    avg_data = (
-        data.groupby(['iso3c', 'country'], as_index=False)
-        .agg({
-            'total_percentage': 'mean',
-            'region': 'first'
-        })
-        .round(2)
-    )
+    if aggregated:
+        avg_data = data[['iso3c', 'country', 'total_percentage', 'region']].round(2)
+    else:
+        avg_data = (
+            data.groupby(['iso3c', 'country'], as_index=False, observed=True)
+            .agg({
+                'total_percentage': 'mean',
+                'region': 'first'
+            })
+            .round(2)
+        )
     
     if avg_data.empty:
         return create_empty_plot("No aggregated data for choropleth")
@@ -1298,10 +1920,21 @@ def create_contribution_choropleth(data: pd.DataFrame):
     else:
         color_range = [min_val, max_val]
 
-    fig = go.Figure(data=go.Choropleth(
-        locations=avg_data['iso3c'],
+    land, geo = choropleth_base(
+        showframe=False,
+        showcoastlines=True,
+        coastlinecolor="lightgray",
+        projection_type='robinson',
+        bgcolor='rgba(0,0,0,0)',
+        showlakes=True,
+        lakecolor='rgba(127,205,255,0.1)'
+    )
+    # The colorscale buttons restyle the data trace only, not the land
+    data_traces = [len(land)]
+
+    fig = go.Figure(data=[*land, go.Choropleth(
+        **choropleth_locations(avg_data['iso3c'], 'iso3c'),
         z=avg_data['total_percentage'],
-        locationmode='ISO-3',
         colorscale='Viridis',
         reversescale=False,
         zmid=None,  # Let plotly handle the midpoint
@@ -1327,18 +1960,10 @@ def create_contribution_choropleth(data: pd.DataFrame):
             dtick=max(0.5, (color_range[1] - color_range[0]) / 10)
         ),
         showscale=True
-    ))
+    )])
     
     fig.update_layout(
-        geo=dict(
-            showframe=False,
-            showcoastlines=True,
-            coastlinecolor="lightgray",
-            projection_type='robinson',
-            bgcolor='rgba(0,0,0,0)',
-            showlakes=True,
-            lakecolor='rgba(127,205,255,0.1)'
-        ),
+        geo=geo,
         template='plotly_white',
         height=550,  # Increased height to accommodate buttons
         margin=dict(l=20, r=20, t=80, b=20),  # Increased top margin for buttons
@@ -1351,32 +1976,32 @@ def create_contribution_choropleth(data: pd.DataFrame):
             dict(
                 buttons=list([
                     dict(
-                        args=["colorscale", "Viridis"],
+                        args=["colorscale", "Viridis", data_traces],
                         label="Viridis",
                         method="restyle"
                     ),
                     dict(
-                        args=["colorscale", "Cividis"],
+                        args=["colorscale", "Cividis", data_traces],
                         label="Cividis",
                         method="restyle"
                     ),
                     dict(
-                        args=["colorscale", "Reds"],
+                        args=["colorscale", "Reds", data_traces],
                         label="Reds",
                         method="restyle"
                     ),
                     dict(
-                        args=["colorscale", "Blues"],
+                        args=["colorscale", "Blues", data_traces],
                         label="Blues",
                         method="restyle"
                     ),
                     dict(
-                        args=["colorscale", "Greens"],
+                        args=["colorscale", "Greens", data_traces],
                         label="Greens",
                         method="restyle"
                     ),
                     dict(
-                        args=["colorscale", "Jet"],
+                        args=["colorscale", "Jet", data_traces],
                         label="Rainbow",
                         method="restyle"
                     ),
@@ -1392,12 +2017,12 @@ def create_contribution_choropleth(data: pd.DataFrame):
             dict(
                 buttons=list([
                     dict(
-                        args=["reversescale", False],
+                        args=["reversescale", False, data_traces],
                         label="Normal",
                         method="restyle"
                     ),
                     dict(
-                        args=["reversescale", True],
+                        args=["reversescale", True, data_traces],
                         label="Reversed",
                         method="restyle"
                     )
@@ -1437,6 +2062,43 @@ def create_contribution_choropleth(data: pd.DataFrame):
 
     return fig
 
+def get_summary_data(
+    store: "DataStore",
+    data: pd.DataFrame,
+    selected_isos: List[str],
+    year_range: Tuple[int, int],
+    chemical_category: str,
+    display_mode: str,
+    region_filter: str = "All"
+) -> pd.DataFrame:
+    """
+    Summary table for the current selection
+
+    Uses the backend's fused summary plan when it has one (Polars) and
+    otherwise summarizes the display rows with create_summary_dataframe.
+
+    Args:
+        store: Shared DataStore holding the loaded dataset
+        data: Display rows returned by get_display_data for the same selection
+        selected_isos: Selected ISO-2 codes
+        year_range: Inclusive (start, end) year tuple
+        chemical_category: Chemical category filter
+        display_mode: "compare_individuals" or "find_collaborations"
+        region_filter: Region filter
+
+    Returns:
+        Summary DataFrame with display column names
+    """
+    summary = None
+    if not data.empty:
+        summary = store.backend.summary_table(
+            display_mode, chemical_category, selected_isos, year_range, region_filter
+        )
+    if summary is None:
+        return create_summary_dataframe(data, display_mode)
+    return summary
+
+
 def create_summary_dataframe(data: pd.DataFrame, mode: str) -> pd.DataFrame:
     """Create summary statistics table"""
     value_column = 'total_percentage' # Expect this from get_display_data
@@ -1451,7 +2113,7 @@ def create_summary_dataframe(data: pd.DataFrame, mode: str) -> pd.DataFrame:
             return pd.DataFrame({'Error': [f"Summary data for collaborations missing: {missing}"]})
         
         summary = (
-            data.groupby(['plot_group', 'chemical', 'collab_type'])
+            data.groupby(['plot_group', 'chemical', 'collab_type'], observed=True)
             .agg(
                 avg_percentage=(value_column, 'mean'),
                 max_percentage=(value_column, 'max'),
@@ -1468,7 +2130,7 @@ def create_summary_dataframe(data: pd.DataFrame, mode: str) -> pd.DataFrame:
             return pd.DataFrame({'Error': [f"Summary data for individuals missing: {missing}"]})
 
         summary = (
-            data.groupby(['country', 'iso2c', 'chemical'])
+            data.groupby(['country', 'iso2c', 'chemical'], observed=True)
             .agg(
                 avg_percentage=(value_column, 'mean'),
                 max_percentage=(value_column, 'max'),
@@ -1487,16 +2149,17 @@ def create_gdp_plot(data: pd.DataFrame):
     """Create GDP article plot with annotations for economic events"""
     fig = go.Figure()
     
-    for country in data['country'].unique():
-        country_data = data[data['country'] == country]
-        fig.add_trace(go.Scatter(
+    fig.add_traces([
+        go.Scatter(
             x=country_data['year'],
             y=country_data['value'],
             mode='lines+markers',
             name=country,
             line=dict(width=2),
-            marker=dict(size=country_data['value'].abs().clip(upper=15) + 2, color=country_data['cc'].iloc[0] if 'cc' in country_data.columns and not country_data.empty else 'red')
-        ))
+            marker=dict(size=np.minimum(np.abs(country_data['value']), 15) + 2, color=country_data['cc'][0] if 'cc' in country_data else 'red')
+        )
+        for country, country_data in iter_trace_groups(data, 'country', ('year', 'value', 'cc'))
+    ])
     
     # Add vertical lines and annotations for economic events
     fig.add_vline(x=2007.5, line_dash="dash", line_color="grey")
@@ -1556,18 +2219,19 @@ def create_researchers_plot(data: pd.DataFrame):
     """Create researchers plot with values in millions"""
     fig = go.Figure()
     
-    for country in data['country'].unique():
-        country_data = data[data['country'] == country]
+    traces = []
+    for country, country_data in iter_trace_groups(data, 'country', ('year', 'value', 'cc')):
         scaled_values = country_data['value'] / 1e6  # Convert to millions
         
-        fig.add_trace(go.Scatter(
+        traces.append(go.Scatter(
             x=country_data['year'],
             y=scaled_values,
             mode='lines+markers',
             name=country,
             line=dict(width=2),
-            marker=dict(size=scaled_values.abs().clip(lower=1, upper=15) + 2, color=country_data['cc'].iloc[0] if 'cc' in country_data.columns and not country_data.empty else 'red')
+            marker=dict(size=np.clip(np.abs(scaled_values), 1, 15) + 2, color=country_data['cc'][0] if 'cc' in country_data else 'red')
         ))
+    fig.add_traces(traces)
     
     fig.update_layout(
         yaxis = dict(
@@ -1604,16 +2268,17 @@ def create_cs_expansion_plot(data: pd.DataFrame):
     """Create chemical space expansion plot"""
     fig = go.Figure()
     
-    for country in data['country'].unique():
-        country_data = data[data['country'] == country]
-        fig.add_trace(go.Scatter(
+    fig.add_traces([
+        go.Scatter(
             x=country_data['year'],
             y=country_data['value'],
             mode='lines',
             name=country,
             line=dict(width=2),
             # marker=dict(size=6)
-        ))
+        )
+        for country, country_data in iter_trace_groups(data, 'country', ('year', 'value'))
+    ])
     
     fig.update_layout(
         yaxis = dict(
@@ -1665,9 +2330,8 @@ def create_china_us_dual_axis_plot(data: pd.DataFrame):
         "CN-US collab/CN": "salmon"
     }
 
-    for country_name in data['country'].unique():
-        country_data = data[data['country'] == country_name]
-        
+    traces = []
+    for country_name, country_data in iter_trace_groups(data, 'country', ('year', 'value')):
         trace_params = {
             'x': country_data['year'],
             'y': country_data['value'],
@@ -1680,7 +2344,8 @@ def create_china_us_dual_axis_plot(data: pd.DataFrame):
         if country_name in secondary_yaxis_categories:
             trace_params['yaxis'] = 'y2'
         
-        fig.add_trace(go.Scatter(**trace_params))
+        traces.append(go.Scatter(**trace_params))
+    fig.add_traces(traces)
 
     fig.update_layout(
         # title_text="China-US Contributions & Collaboration Impact",
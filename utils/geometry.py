@@ -0,0 +1,451 @@
+"""
+Country geometry registry for the Chemical Space Explorer Python Shiny App
+
+The world boundaries are read once per process. Every country shape is
+resolved to its ISO-2 code, simplified and serialized up front, so the map
+renderers only look shapes up instead of parsing the GeoJSON file again.
+
+Shapes are prepared at several simplification tiers; a map picks the
+coarsest tier that still looks exact at its zoom level (tier_for_zoom).
+
+The build step (python -m utils.build boundaries) reconciles the GeoJSON
+sources into one boundary store, a GeoParquet file holding one row per
+country: ISO codes, name, centroid, bounds, and the WKB shape unsimplified
+and at every tier. The registry reads it with pyarrow instead of parsing
+and simplifying the GeoJSON at start-up.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+WORLD_BOUNDARIES_PATH = "./data/world_boundaries.geojson"
+CUSTOM_BOUNDARIES_PATH = "./data/custom.geo.json"
+
+# Sources of the boundary store; a country found in several of them keeps
+# the shape of the first
+BOUNDARY_SOURCES = (WORLD_BOUNDARIES_PATH, CUSTOM_BOUNDARIES_PATH)
+
+BOUNDARIES_PATH = "./data/boundaries.parquet"
+
+# Bumped whenever the columns or the metadata of the boundary store change
+BOUNDARIES_FORMAT = 2
+
+# Key of the store's own entry in the parquet schema metadata
+BOUNDARIES_METADATA_KEY = b'cs_explorer'
+
+# ISO-2 columns in order of preference; iso_a2 is "-99" for some countries
+ISO_COLUMN_PREFERENCE = ('iso_a2_eh', 'wb_a2', 'iso_a2')
+ISO3_COLUMN_PREFERENCE = ('iso_a3_eh', 'iso_a3', 'adm0_a3')
+NAME_COLUMN_PREFERENCE = ('name', 'admin')
+
+# Simplification tiers: (tolerance in degrees, coordinate decimals). A
+# Leaflet pixel spans about 0.7 degrees at zoom 1 and 0.09 at zoom 4, so
+# each tier stays below a pixel at the zoom levels that use it.
+SIMPLIFY_TIERS = {
+    'global': (0.5, 1),
+    'continental': (0.1, 2),
+    'regional': (0.05, 2),
+}
+DEFAULT_TIER = 'regional'
+
+
+class CountryGeometry(NamedTuple):
+    """Prepared shape of one country"""
+    iso2c: str
+    geometry: BaseGeometry
+    centroid: Tuple[float, float]  # (lat, lng)
+    bounds: Tuple[float, float, float, float]  # (min lng, min lat, max lng, max lat)
+    geojson: str  # Serialized geometry, ready to embed in a map
+    iso3c: Optional[str] = None
+    name: Optional[str] = None
+
+
+def tier_for_zoom(zoom: int) -> str:
+    """Simplification tier for a map's initial zoom level"""
+    if zoom <= 2:
+        return 'global'
+    if zoom == 3:
+        return 'continental'
+    return 'regional'
+
+
+def simplify_geometries(geometries: np.ndarray, tolerance: float, decimals: int) -> np.ndarray:
+    """
+    Topology-preserving simplification with coordinates rounded for output
+
+    Shapes that collapse at this tier keep their original geometry.
+    """
+    simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    simplified = shapely.set_precision(simplified, 10.0 ** -decimals)
+    simplified = shapely.transform(simplified, lambda coords: np.round(coords, decimals))
+    collapsed = shapely.is_empty(simplified)
+    simplified[collapsed] = geometries[collapsed]
+    return simplified
+
+
+def resolve_iso_codes(
+    world: pd.DataFrame,
+    preference: Sequence[str] = ISO_COLUMN_PREFERENCE,
+    length: int = 2
+) -> pd.Series:
+    """
+    ISO code of every boundary row
+
+    Takes the first valid code from the preferred columns; rows without one
+    are None.
+
+    Args:
+        world: Boundary rows
+        preference: Code columns in order of preference
+        length: Length of a valid code (2 for ISO-2, 3 for ISO-3)
+
+    Raises:
+        ValueError: If the boundaries have none of the preferred columns
+    """
+    columns = [col for col in preference if col in world.columns]
+    if not columns:
+        raise ValueError(f"No ISO-{length} column found in boundaries. Available columns: {world.columns.tolist()}")
+
+    iso_codes = pd.Series(None, index=world.index, dtype=object)
+    for col in reversed(columns):
+        candidate = world[col]
+        valid = candidate.map(lambda code: isinstance(code, str) and len(code) == length and code != "-99")
+        iso_codes = iso_codes.mask(valid, candidate)
+    return iso_codes
+
+
+def normalize_iso(iso_codes: Sequence[str]) -> np.ndarray:
+    """Join key of ISO-2 codes: the stripped, upper-cased code"""
+    return np.char.upper(np.char.strip(np.asarray(iso_codes, dtype=str)))
+
+
+def country_shapes(world: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    One boundary row per ISO-2 code, with the code in an iso2c column
+
+    Rows without a code or a geometry are dropped; when several rows resolve
+    to the same code, the last one is kept. Boundaries that already carry
+    an iso2c column (such as the boundary store's) are taken as they are.
+    """
+    if 'iso2c' not in world.columns:
+        world = world.assign(iso2c=resolve_iso_codes(world))
+    world = world[world['iso2c'].notna() & world.geometry.notna()]
+    return world.drop_duplicates(subset=['iso2c'], keep='last')
+
+
+def reconcile_boundaries(sources: Sequence[str] = BOUNDARY_SOURCES) -> gpd.GeoDataFrame:
+    """
+    Canonical country boundaries from several GeoJSON sources
+
+    Every source is resolved with country_shapes; a country found in several
+    sources keeps the shape of the first one.
+
+    Args:
+        sources: Boundaries files readable by geopandas, in order of preference
+
+    Returns:
+        GeoDataFrame in EPSG:4326 with iso2c, iso3c, name and geometry columns
+    """
+    frames = []
+    for path in sources:
+        world = country_shapes(gpd.read_file(path).to_crs("EPSG:4326"))
+        name_columns = [col for col in NAME_COLUMN_PREFERENCE if col in world.columns]
+        frames.append(gpd.GeoDataFrame({
+            'iso2c': world['iso2c'],
+            'iso3c': resolve_iso_codes(world, ISO3_COLUMN_PREFERENCE, length=3),
+            'name': world[name_columns].bfill(axis=1).iloc[:, 0] if name_columns else None,
+            'geometry': world.geometry,
+        }, crs="EPSG:4326"))
+    shapes = pd.concat(frames, ignore_index=True).drop_duplicates(subset=['iso2c'], keep='first')
+    return gpd.GeoDataFrame(shapes.reset_index(drop=True), crs="EPSG:4326")
+
+
+class GeometryRegistry:
+    """
+    Prepared country geometries keyed by ISO-2 code, per simplification tier
+
+    Shapes are taken from country_shapes. Centroids and bounds come from the
+    unsimplified shapes and are the same in every tier.
+    """
+
+    def __init__(
+        self,
+        world: gpd.GeoDataFrame,
+        tiers: Dict[str, Tuple[float, int]] = SIMPLIFY_TIERS,
+        simplified: Optional[Dict[str, np.ndarray]] = None
+    ):
+        """
+        Args:
+            world: Country boundaries in EPSG:4326
+            tiers: (tolerance in degrees, coordinate decimals) per tier name
+            simplified: Shapes already simplified per tier name, aligned with
+                the rows of country_shapes(world), as read from the boundary
+                store; tiers missing here are simplified from world
+        """
+        world = country_shapes(world)
+        simplified = simplified or {}
+
+        original = world.geometry.values.to_numpy()
+        # Spatial index of the unsimplified shapes, for locating map clicks
+        self._tree = shapely.STRtree(original)
+        self._tree_isos = world['iso2c'].to_numpy(dtype=object)
+        centroids = [(point.y, point.x) for point in shapely.centroid(original)]
+        bounds = [tuple(float(v) for v in box) for box in shapely.bounds(original)]
+        iso3_codes = world['iso3c'] if 'iso3c' in world.columns else [None] * len(world)
+        names = world['name'] if 'name' in world.columns else [None] * len(world)
+
+        self._tiers: Dict[str, Dict[str, CountryGeometry]] = {}
+        for tier, (tolerance, decimals) in tiers.items():
+            geometries = simplified.get(tier)
+            if geometries is None:
+                geometries = simplify_geometries(original, tolerance, decimals)
+            self._tiers[tier] = {
+                iso: CountryGeometry(
+                    iso2c=iso,
+                    geometry=geometry,
+                    centroid=centroid,
+                    bounds=box,
+                    geojson=serialized,
+                    iso3c=iso3,
+                    name=name
+                )
+                for iso, geometry, centroid, box, serialized, iso3, name in zip(
+                    world['iso2c'], geometries, centroids, bounds, shapely.to_geojson(geometries), iso3_codes, names
+                )
+            }
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    @classmethod
+    def from_file(cls, path: str = WORLD_BOUNDARIES_PATH, tiers: Dict[str, Tuple[float, int]] = SIMPLIFY_TIERS) -> "GeometryRegistry":
+        """Build a registry from a boundaries file readable by geopandas"""
+        return cls(gpd.read_file(path).to_crs("EPSG:4326"), tiers=tiers)
+
+    @classmethod
+    def from_store(cls, path: str = BOUNDARIES_PATH, tiers: Dict[str, Tuple[float, int]] = SIMPLIFY_TIERS) -> "GeometryRegistry":
+        """Build a registry from the boundary store (see write_boundary_store)"""
+        world, simplified = read_boundary_store(path, tiers)
+        return cls(world, tiers=tiers, simplified=simplified)
+
+    @property
+    def tiers(self) -> Tuple[str, ...]:
+        return tuple(self._tiers)
+
+    def get(self, iso: str, tier: str = DEFAULT_TIER) -> Optional[CountryGeometry]:
+        """Prepared geometry of a country at a tier, trying the code's case variants"""
+        entries = self._tiers[tier]
+        for iso_variant in (iso, iso.upper(), iso.lower()):
+            entry = entries.get(iso_variant)
+            if entry is not None:
+                return entry
+        return None
+
+    def frame(self, tier: str = DEFAULT_TIER) -> pd.DataFrame:
+        """
+        Serialized shapes of a tier as a frame, for joining with country lists
+
+        Returns:
+            DataFrame indexed by the upper-cased ISO-2 code (see
+            normalize_iso), with the registry's iso2c and the serialized
+            geojson of each country
+        """
+        if tier not in self._frames:
+            entries = self._tiers[tier].values()
+            iso_codes = [entry.iso2c for entry in entries]
+            self._frames[tier] = pd.DataFrame(
+                {'iso2c': iso_codes, 'geojson': [entry.geojson for entry in entries]},
+                index=pd.Index(normalize_iso(iso_codes), name='iso_key', dtype=object)
+            )
+        return self._frames[tier]
+
+    def locate(self, lat: float, lng: float) -> List[str]:
+        """ISO-2 codes of the countries whose unsimplified shape contains a point"""
+        hits = self._tree.query(shapely.Point(lng, lat), predicate='intersects')
+        return self._tree_isos[hits].tolist()
+
+    def within(self, area: BaseGeometry, min_share: float = 0.5) -> List[str]:
+        """
+        ISO-2 codes of the countries lying mostly inside an area
+
+        Args:
+            area: Area in EPSG:4326
+            min_share: Least share of a country's unsimplified shape (by
+                area) that must lie inside
+        """
+        hits = self._tree.query(area, predicate='intersects')
+        shapes = self._tree.geometries.take(hits)
+        share = shapely.area(shapely.intersection(shapes, area)) / shapely.area(shapes)
+        return self._tree_isos[hits[share >= min_share]].tolist()
+
+    def __contains__(self, iso: str) -> bool:
+        return self.get(iso) is not None
+
+    def __iter__(self) -> Iterator[CountryGeometry]:
+        return iter(self._tiers[DEFAULT_TIER].values())
+
+    def __len__(self) -> int:
+        return len(self._tiers[DEFAULT_TIER])
+
+
+def write_boundary_store(
+    sources: Sequence[str] = BOUNDARY_SOURCES,
+    path: str = BOUNDARIES_PATH,
+    tiers: Dict[str, Tuple[float, int]] = SIMPLIFY_TIERS
+) -> Path:
+    """
+    Build step: write the reconciled boundaries as a GeoParquet file
+
+    The file holds one row per country with iso2c, iso3c, name, centroid_lat,
+    centroid_lng, a bbox covering column, the unsimplified WKB geometry and
+    one WKB geometry_<tier> column per simplification tier.
+
+    Args:
+        sources: Boundaries files readable by geopandas, in order of preference
+        path: Output file
+        tiers: (tolerance in degrees, coordinate decimals) per tier name
+
+    Returns:
+        Path of the written file
+    """
+    shapes = reconcile_boundaries(sources)
+    original = shapes.geometry.values.to_numpy()
+    centroids = shapely.centroid(original)
+    shapes = shapes.assign(centroid_lat=shapely.get_y(centroids), centroid_lng=shapely.get_x(centroids))
+    for tier, (tolerance, decimals) in tiers.items():
+        shapes[f"geometry_{tier}"] = gpd.GeoSeries(simplify_geometries(original, tolerance, decimals), crs=shapes.crs)
+
+    out_path = Path(path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    shapes.to_parquet(out_path, index=False, schema_version='1.1.0', write_covering_bbox=True)
+
+    # Record what the file was built from, so that outdated stores are detected
+    table = pq.read_table(out_path)
+    metadata = {
+        'format': BOUNDARIES_FORMAT,
+        'sources': {
+            name: {'size': size, 'sha256': digest}
+            for (name, size), digest in zip(source_sizes(sources).items(), source_digests(sources).values())
+        },
+        'tiers': {tier: list(params) for tier, params in tiers.items()},
+    }
+    table = table.replace_schema_metadata({**table.schema.metadata, BOUNDARIES_METADATA_KEY: json.dumps(metadata).encode()})
+    pq.write_table(table, out_path)
+    return out_path
+
+
+def read_boundary_store(
+    path: str = BOUNDARIES_PATH,
+    tiers: Dict[str, Tuple[float, int]] = SIMPLIFY_TIERS
+) -> Tuple[gpd.GeoDataFrame, Dict[str, np.ndarray]]:
+    """
+    Read the boundary store with pyarrow, decoding the WKB columns directly
+
+    Args:
+        path: Boundary store written by write_boundary_store
+        tiers: Tiers expected by the caller; simplified shapes are only
+            returned for tiers built with the same parameters
+
+    Returns:
+        Tuple of the unsimplified boundaries (iso2c, iso3c, name, geometry)
+        and the simplified shapes per tier name
+
+    Raises:
+        ValueError: If the file is not a boundary store of the current format
+    """
+    table = pq.read_table(path)
+    metadata = json.loads((table.schema.metadata or {}).get(BOUNDARIES_METADATA_KEY, b'{}'))
+    if metadata.get('format') != BOUNDARIES_FORMAT:
+        raise ValueError(f"{path} is not a boundary store of format {BOUNDARIES_FORMAT}")
+
+    def geometries(column: str) -> np.ndarray:
+        return shapely.from_wkb(table.column(column).to_numpy())
+
+    world = gpd.GeoDataFrame(
+        {col: table.column(col).to_pylist() for col in ('iso2c', 'iso3c', 'name')},
+        geometry=geometries('geometry'),
+        crs="EPSG:4326"
+    )
+    built = metadata.get('tiers', {})
+    simplified = {
+        tier: geometries(f"geometry_{tier}")
+        for tier, params in tiers.items()
+        if built.get(tier) == list(params) and f"geometry_{tier}" in table.column_names
+    }
+    return world, simplified
+
+
+def source_digests(sources: Sequence[str] = BOUNDARY_SOURCES) -> Dict[str, str]:
+    """SHA-256 of every boundaries file that exists, keyed by file name"""
+    return {
+        Path(source).name: hashlib.sha256(Path(source).read_bytes()).hexdigest()
+        for source in sources
+        if Path(source).exists()
+    }
+
+
+def source_sizes(sources: Sequence[str] = BOUNDARY_SOURCES) -> Dict[str, int]:
+    """Size in bytes of every boundaries file that exists, keyed by file name"""
+    return {Path(source).name: Path(source).stat().st_size for source in sources if Path(source).exists()}
+
+
+def _store_sources(path: str) -> Optional[Dict[str, Dict]]:
+    # Sources recorded in a boundary store, or None for a missing or outdated store
+    if not Path(path).exists():
+        return None
+    metadata = json.loads((pq.read_schema(path).metadata or {}).get(BOUNDARIES_METADATA_KEY, b'{}'))
+    if metadata.get('format') != BOUNDARIES_FORMAT:
+        print(f"Ignoring boundary store {path}: format {metadata.get('format')} is outdated")
+        return None
+    return metadata.get('sources', {})
+
+
+def boundary_store_available(path: str = BOUNDARIES_PATH, sources: Sequence[str] = BOUNDARY_SOURCES) -> bool:
+    """
+    Whether the boundary store exists and was built from the current sources
+
+    Start-up check: compares the sizes of the sources with the ones recorded
+    in the store, which needs no read of the files. Modification times are
+    not compared since a git checkout does not keep them; boundary_store_current
+    compares the digests.
+    """
+    recorded = _store_sources(path)
+    if recorded is None:
+        return False
+    if {name: entry['size'] for name, entry in recorded.items()} != source_sizes(sources):
+        print(f"Ignoring boundary store {path}: it was not built from the current {', '.join(sources)}")
+        return False
+    return True
+
+
+def boundary_store_current(path: str = BOUNDARIES_PATH, sources: Sequence[str] = BOUNDARY_SOURCES) -> bool:
+    """Build check: whether the store's recorded digests match the sources' contents"""
+    recorded = _store_sources(path)
+    if recorded is None:
+        return False
+    return {name: entry['sha256'] for name, entry in recorded.items()} == source_digests(sources)
+
+
+@lru_cache(maxsize=1)
+def get_geometry_registry() -> GeometryRegistry:
+    """
+    Return the process-wide GeometryRegistry
+
+    Read from the boundary store when it was built, otherwise from the
+    reconciled GeoJSON sources.
+    """
+    if boundary_store_available():
+        try:
+            return GeometryRegistry.from_store()
+        except (OSError, ValueError, pa.ArrowException) as e:
+            print(f"Error reading boundary store {BOUNDARIES_PATH}, reading the GeoJSON boundaries: {e}")
+    return GeometryRegistry(reconcile_boundaries())
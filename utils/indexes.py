@@ -0,0 +1,401 @@
+"""
+Precomputed query indexes for the Chemical Space Explorer Python Shiny App
+
+Indexes are built once from the DataStore tables and answer the app's
+queries with vectorized NumPy operations instead of scanning DataFrames.
+Each index can export its built arrays with state() and be restored from
+them with from_state(), which is how snapshots skip the build.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _prefix_sums(values: np.ndarray, dtype) -> np.ndarray:
+    # Cumulative sums along the last (year) axis with a leading zero, so a
+    # year range [start, stop) aggregates as cum[..., stop] - cum[..., start]
+    zeros = np.zeros(values.shape[:-1] + (1,), dtype=dtype)
+    return np.concatenate([zeros, np.cumsum(values, axis=-1, dtype=dtype)], axis=-1)
+
+
+def _year_slice(years: np.ndarray, year_range: Tuple[int, int]) -> slice:
+    # Slice of a contiguous year axis covering an inclusive year range
+    start = int(np.clip(year_range[0] - years[0], 0, len(years)))
+    stop = int(np.clip(year_range[1] - years[0] + 1, start, len(years)))
+    return slice(start, stop)
+
+
+class CollabMembershipIndex:
+    """
+    Fixed-width country bitmask for every collaboration
+
+    Collaboration i is stored as row i of a (n_collabs, n_words) uint64
+    array, where bit j is set when member country j takes part in it.
+    Row order follows the categories of the collaboration iso2c column, so
+    a row's categorical code looks up its collaboration directly.
+    """
+
+    def __init__(self, collab_isos: pd.Index, collab_members: pd.DataFrame):
+        """
+        Args:
+            collab_isos: Collaboration keys (e.g. CN-US) in categorical code order
+            collab_members: Membership table with columns iso2c and member
+        """
+        members = collab_members.dropna(subset=['iso2c', 'member'])
+        self.countries = pd.Index(sorted(members['member'].astype(str).unique()))
+        self.n_words = max(1, -(-len(self.countries) // 64))
+
+        collab_pos = pd.Categorical(members['iso2c'].astype(str), categories=collab_isos).codes
+        member_pos = self.countries.get_indexer(members['member'].astype(str))
+        valid = collab_pos >= 0
+        collab_pos, member_pos = collab_pos[valid], member_pos[valid]
+
+        self.masks = np.zeros((len(collab_isos), self.n_words), dtype=np.uint64)
+        bits = np.left_shift(np.uint64(1), (member_pos % 64).astype(np.uint64))
+        np.bitwise_or.at(self.masks, (collab_pos, member_pos // 64), bits)
+
+        # Number of member countries per collaboration
+        self.sizes = np.bincount(collab_pos, minlength=len(collab_isos)).astype(np.int16)
+
+    def state(self) -> Dict:
+        """Built arrays and labels, as accepted by from_state"""
+        return {'countries': self.countries.tolist(), 'masks': self.masks, 'sizes': self.sizes}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "CollabMembershipIndex":
+        """Restore an index from state() output without rebuilding it"""
+        index = cls.__new__(cls)
+        index.countries = pd.Index(state['countries'])
+        index.masks = state['masks']
+        index.sizes = state['sizes']
+        index.n_words = index.masks.shape[1]
+        return index
+
+    def query_mask(self, isos: Iterable[str]) -> np.ndarray:
+        """
+        Bitmask for a set of ISO-2 codes
+
+        Raises:
+            KeyError: If a code never appears in any collaboration
+        """
+        positions = self.countries.get_indexer(list(isos))
+        if (positions < 0).any():
+            raise KeyError("ISO code not found in collaborations")
+
+        mask = np.zeros(self.n_words, dtype=np.uint64)
+        bits = np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64))
+        np.bitwise_or.at(mask, positions // 64, bits)
+        return mask
+
+    def contains_all(self, isos: Iterable[str]) -> np.ndarray:
+        """Boolean array: collaboration includes every given country"""
+        try:
+            mask = self.query_mask(isos)
+        except KeyError:
+            return np.zeros(len(self.masks), dtype=bool)
+        return ((self.masks & mask) == mask).all(axis=1)
+
+    def contains_any(self, isos: Iterable[str]) -> np.ndarray:
+        """Boolean array: collaboration includes at least one given country"""
+        known = [iso for iso in isos if iso in self.countries]
+        if not known:
+            return np.zeros(len(self.masks), dtype=bool)
+        return (self.masks & self.query_mask(known)).any(axis=1)
+
+    def exactly(self, isos: Iterable[str]) -> np.ndarray:
+        """Boolean array: collaboration members are exactly the given countries"""
+        try:
+            mask = self.query_mask(isos)
+        except KeyError:
+            return np.zeros(len(self.masks), dtype=bool)
+        return (self.masks == mask).all(axis=1)
+
+
+class NationalCube:
+    """
+    Dense chemical x country x year array of national percentages
+
+    Missing observations are NaN. Country attributes (name, ISO-3, region,
+    color, coordinates) are kept in a small dimension table aligned with the
+    cube's country axis.
+    """
+
+    ATTRIBUTE_COLUMNS = ['country', 'iso3c', 'region', 'cc', 'lat', 'lng']
+
+    def __init__(self, national: pd.DataFrame):
+        """
+        Args:
+            national: National view with categorical iso2c and chemical columns
+        """
+        self.chemicals = pd.Index(national['chemical'].cat.categories)
+        self.countries = pd.Index(national['iso2c'].cat.categories)
+        self.years = np.arange(national['year'].min(), national['year'].max() + 1, dtype=np.int16)
+
+        self.values = np.full((len(self.chemicals), len(self.countries), len(self.years)), np.nan, dtype=np.float32)
+        self.values[
+            national['chemical'].cat.codes.to_numpy(),
+            national['iso2c'].cat.codes.to_numpy(),
+            national['year'].to_numpy() - self.years[0]
+        ] = national['percentage'].to_numpy()
+
+        # Prefix sums and counts over the year axis for range aggregates
+        observed = ~np.isnan(self.values)
+        self.cum_sums = _prefix_sums(np.where(observed, self.values, 0), np.float64)
+        self.cum_counts = _prefix_sums(observed, np.int32)
+
+        # Country dimension aligned with the country axis
+        first_rows = national.drop_duplicates(subset=['iso2c'])
+        self.country_attrs = (
+            first_rows.set_index(first_rows['iso2c'].astype(str))[self.ATTRIBUTE_COLUMNS]
+            .reindex(self.countries)
+        )
+        self._regions = self.country_attrs['region'].astype(object).to_numpy()
+
+    def state(self) -> Dict:
+        """Built arrays, labels and country dimension, as accepted by from_state"""
+        return {
+            'chemicals': self.chemicals.tolist(),
+            'countries': self.countries.tolist(),
+            'years': self.years,
+            'values': self.values,
+            'cum_sums': self.cum_sums,
+            'cum_counts': self.cum_counts,
+            'country_attrs': self.country_attrs
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "NationalCube":
+        """Restore a cube from state() output without rebuilding it"""
+        cube = cls.__new__(cls)
+        cube.chemicals = pd.Index(state['chemicals'])
+        cube.countries = pd.Index(state['countries'])
+        for name in ('years', 'values', 'cum_sums', 'cum_counts', 'country_attrs'):
+            setattr(cube, name, state[name])
+        cube._regions = cube.country_attrs['region'].astype(object).to_numpy()
+        return cube
+
+    def country_positions(self, isos: Iterable[str], region_filter: str = "All") -> np.ndarray:
+        """Cube positions of the given ISO codes, optionally limited to a region"""
+        positions = self.countries.get_indexer(list(dict.fromkeys(isos)))
+        positions = positions[positions >= 0]
+        if region_filter != "All":
+            positions = positions[self._regions[positions] == region_filter]
+        return positions
+
+    def year_slice(self, year_range: Tuple[int, int]) -> slice:
+        """Slice of the year axis covering an inclusive year range"""
+        return _year_slice(self.years, year_range)
+
+    def select(
+        self,
+        chemical: str,
+        isos: Iterable[str],
+        year_range: Tuple[int, int],
+        region_filter: str = "All"
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Slice the cube for a selection
+
+        Returns:
+            (country positions, years, values) where values has shape
+            (len(positions), len(years)) and NaN marks missing observations
+        """
+        years = self.year_slice(year_range)
+        if chemical not in self.chemicals:
+            return np.empty(0, dtype=np.intp), self.years[years], np.empty((0, len(self.years[years])), dtype=np.float32)
+
+        positions = self.country_positions(isos, region_filter)
+        values = self.values[self.chemicals.get_loc(chemical)][positions, years]
+        return positions, self.years[years], values
+
+    def to_frame(
+        self,
+        chemical: str,
+        isos: Iterable[str],
+        year_range: Tuple[int, int],
+        region_filter: str = "All",
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Long-format rows (one per observed country-year) for a selection
+
+        Args:
+            columns: Columns to build, out of iso2c, the attribute columns,
+                year, chemical and percentage (all of them when None)
+        """
+        if columns is None:
+            columns = ['iso2c'] + self.ATTRIBUTE_COLUMNS + ['year', 'chemical', 'percentage']
+        positions, years, values = self.select(chemical, isos, year_range, region_filter)
+        country_idx, year_idx = np.nonzero(~np.isnan(values))
+
+        attributes = [col for col in columns if col in self.ATTRIBUTE_COLUMNS]
+        frame = self.country_attrs[attributes].iloc[positions[country_idx]].reset_index(names='iso2c')
+        frame['iso2c'] = pd.Categorical(frame['iso2c'], categories=self.countries)
+        frame['year'] = years[year_idx]
+        if 'chemical' in columns:
+            frame['chemical'] = pd.Categorical([chemical] * len(frame), categories=self.chemicals)
+        frame['percentage'] = values[country_idx, year_idx]
+        return frame[columns]
+
+    def range_aggregates(
+        self,
+        chemical: str,
+        year_range: Tuple[int, int],
+        region_filter: str = "All"
+    ) -> pd.DataFrame:
+        """
+        Per-country mean, max, min and count over a year range
+
+        The mean comes from the prefix sums in O(countries); max and min
+        reduce the small year slice of the cube. Countries without
+        observations in the range are left out.
+
+        Returns:
+            Country dimension rows with avg_percentage, max_percentage,
+            min_percentage and years_present columns
+        """
+        if chemical not in self.chemicals:
+            return pd.DataFrame()
+
+        chem = self.chemicals.get_loc(chemical)
+        positions = self.country_positions(self.countries, region_filter)
+        years = self.year_slice(year_range)
+
+        counts = self.cum_counts[chem, positions, years.stop] - self.cum_counts[chem, positions, years.start]
+        sums = self.cum_sums[chem, positions, years.stop] - self.cum_sums[chem, positions, years.start]
+        present = counts > 0
+        positions, counts, sums = positions[present], counts[present], sums[present]
+
+        window = self.values[chem][positions, years]
+        frame = self.country_attrs.iloc[positions].reset_index(names='iso2c')
+        frame['avg_percentage'] = sums / counts
+        frame['max_percentage'] = np.nanmax(window, axis=1) if len(positions) else np.empty(0)
+        frame['min_percentage'] = np.nanmin(window, axis=1) if len(positions) else np.empty(0)
+        frame['years_present'] = counts
+        return frame
+
+
+class LeaderboardIndex:
+    """
+    Prefix sums of percentages per (chemical, entity, year) for top-N queries
+
+    An entity is whatever the leaderboard ranks: a country (iso2c) or a
+    collaboration (its display name). The average of any entity over any
+    year range is read from the prefix sums, so a top-N query is one
+    vectorized division plus a partial sort.
+    """
+
+    def __init__(self, series: pd.DataFrame, entity_column: str, region_column: Optional[str] = None):
+        """
+        Args:
+            series: National or collaboration view with categorical columns
+            entity_column: Column identifying the ranked entities
+            region_column: Column with each entity's region, if any
+        """
+        self.entity_column = entity_column
+        entity = series[entity_column].cat.remove_unused_categories()
+        self.entities = pd.Index(entity.cat.categories)
+        self.chemicals = pd.Index(series['chemical'].cat.categories)
+        self.years = np.arange(series['year'].min(), series['year'].max() + 1, dtype=np.int16)
+
+        index = (
+            series['chemical'].cat.codes.to_numpy(),
+            entity.cat.codes.to_numpy(),
+            series['year'].to_numpy() - self.years[0]
+        )
+        shape = (len(self.chemicals), len(self.entities), len(self.years))
+        sums = np.zeros(shape, dtype=np.float32)
+        counts = np.zeros(shape, dtype=np.uint16)
+        np.add.at(sums, index, series['percentage'].to_numpy())
+        np.add.at(counts, index, 1)
+
+        self.cum_sums = _prefix_sums(sums, np.float32)
+        self.cum_counts = _prefix_sums(counts, np.uint16)
+
+        self.regions = None
+        if region_column is not None:
+            first_rows = series.drop_duplicates(subset=[entity_column])
+            self.regions = (
+                first_rows.set_index(first_rows[entity_column].astype(str))[region_column]
+                .reindex(self.entities).astype(object).to_numpy()
+            )
+
+    def state(self) -> Dict:
+        """Built arrays and labels, as accepted by from_state"""
+        return {
+            'entity_column': self.entity_column,
+            'entities': self.entities.tolist(),
+            'chemicals': self.chemicals.tolist(),
+            'years': self.years,
+            'cum_sums': self.cum_sums,
+            'cum_counts': self.cum_counts,
+            'regions': None if self.regions is None else self.regions.tolist()
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "LeaderboardIndex":
+        """Restore a leaderboard from state() output without rebuilding it"""
+        board = cls.__new__(cls)
+        board.entity_column = state['entity_column']
+        board.entities = pd.Index(state['entities'])
+        board.chemicals = pd.Index(state['chemicals'])
+        for name in ('years', 'cum_sums', 'cum_counts'):
+            setattr(board, name, state[name])
+        board.regions = None if state['regions'] is None else np.array(state['regions'], dtype=object)
+        return board
+
+    def top(
+        self,
+        chemical: Optional[str],
+        year_range: Tuple[int, int],
+        n: int = 10,
+        region_filter: str = "All"
+    ) -> pd.DataFrame:
+        """
+        Highest average percentages over a year range
+
+        Args:
+            chemical: Chemical category, or None to average over all categories
+            year_range: Inclusive (start, end) year tuple
+            n: Number of entities to return
+            region_filter: Region filter (only for leaderboards with regions)
+
+        Returns:
+            DataFrame with rank, entity and avg_percentage, best first;
+            equal averages are ranked in entity order
+        """
+        years = _year_slice(self.years, year_range)
+        if chemical is None:
+            sums = (self.cum_sums[:, :, years.stop] - self.cum_sums[:, :, years.start]).sum(axis=0)
+            counts = (self.cum_counts[:, :, years.stop] - self.cum_counts[:, :, years.start]).sum(axis=0)
+        elif chemical in self.chemicals:
+            chem = self.chemicals.get_loc(chemical)
+            sums = self.cum_sums[chem, :, years.stop] - self.cum_sums[chem, :, years.start]
+            counts = self.cum_counts[chem, :, years.stop] - self.cum_counts[chem, :, years.start]
+        else:
+            return pd.DataFrame(columns=['rank', 'entity', 'avg_percentage'])
+
+        valid = counts > 0
+        if region_filter != "All" and self.regions is not None:
+            valid &= self.regions == region_filter
+
+        means = np.full(len(self.entities), -np.inf)
+        means[valid] = sums[valid] / counts[valid]
+
+        k = int(min(n, valid.sum()))
+        if k == 0:
+            return pd.DataFrame(columns=['rank', 'entity', 'avg_percentage'])
+
+        # Partial sort: only the k best entities get fully ordered. Every
+        # entity tied with the k-th best is a candidate, so ties are broken
+        # by entity order rather than by argpartition's arbitrary pick
+        kth_best = means[np.argpartition(-means, k - 1)[k - 1]]
+        candidates = np.flatnonzero(means >= kth_best)
+        order = candidates[np.argsort(-means[candidates], kind='stable')][:k]
+        return pd.DataFrame({
+            'rank': np.arange(1, k + 1),
+            'entity': self.entities[order],
+            'avg_percentage': means[order]
+        })
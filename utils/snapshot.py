@@ -0,0 +1,235 @@
+"""
+Prepared-state snapshots for the Chemical Space Explorer Python Shiny App
+
+A snapshot holds everything a DataStore computes on start-up: the typed
+tables and views, the UI metadata and the built query indexes. Tables are
+written as uncompressed Arrow IPC files and index arrays as .npy files, so
+a new worker memory-maps them instead of decoding parquet and rebuilding
+the indexes.
+
+Every worker process maps the same files, so the page cache holds one copy
+of the data however many workers run. With CS_EXPLORER_SNAPSHOT set, the
+first worker to start writes the snapshot and the others wait for it.
+
+Layout of a snapshot directory:
+    manifest.json         format version, metadata and index labels
+    tables/<name>.arrow   typed tables and views
+    arrays/<name>.npy     index arrays, loaded with mmap_mode='r'
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: shared snapshots are built without a lock
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.functions import DATA_TABLES, SNAPSHOT_DIR, TABLES_DIR
+from utils.indexes import CollabMembershipIndex, LeaderboardIndex, NationalCube
+
+if TYPE_CHECKING:
+    from utils.data_store import DataStore
+
+# Directory of a snapshot shared by all worker processes (e.g. /dev/shm/...)
+SNAPSHOT_ENV = "CS_EXPLORER_SNAPSHOT"
+
+# Bumped whenever the layout or the prepared views change
+SNAPSHOT_FORMAT = 2
+
+# DataStore views written as tables, on top of the raw DATA_TABLES
+SNAPSHOT_VIEWS = ('national',)
+
+# DataStore metadata properties stored in the manifest
+SNAPSHOT_METADATA = ('chemical_categories', 'regions', 'min_year', 'max_year')
+
+# DataStore index properties and their classes
+SNAPSHOT_INDEXES = {
+    'membership_index': CollabMembershipIndex,
+    'national_cube': NationalCube,
+    'national_leaderboard': LeaderboardIndex,
+    'collab_leaderboard': LeaderboardIndex,
+}
+
+
+def _write_arrow(df: pd.DataFrame, path: Path):
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with pa.OSFile(str(path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_arrow(path: Path) -> pd.DataFrame:
+    # Memory-mapped read; numeric columns without nulls are not copied
+    with pa.memory_map(str(path), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _source_mtime(tables_dir: str) -> Optional[float]:
+    # Latest modification time of the table files the snapshot derives from
+    paths = [Path(tables_dir) / f"{name}.parquet" for name in DATA_TABLES]
+    if not all(path.exists() for path in paths):
+        return None
+    return max(path.stat().st_mtime for path in paths)
+
+
+def write_snapshot(store: "DataStore", snapshot_dir: str = SNAPSHOT_DIR) -> Path:
+    """
+    Build step: write the store's prepared state to a snapshot directory
+
+    Every view and index is computed (if it was not already) and written.
+    The directory is written next to the target and swapped in at the end,
+    so workers starting meanwhile never see a partial snapshot.
+
+    Args:
+        store: DataStore to snapshot
+        snapshot_dir: Output directory
+
+    Returns:
+        Path of the manifest file
+    """
+    out_dir = Path(snapshot_dir)
+    tmp_dir = out_dir.with_name(f"{out_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    (tmp_dir / 'tables').mkdir(parents=True)
+    (tmp_dir / 'arrays').mkdir()
+
+    for name in DATA_TABLES:
+        _write_arrow(store.table(name), tmp_dir / 'tables' / f"{name}.arrow")
+    for name in SNAPSHOT_VIEWS:
+        _write_arrow(getattr(store, name), tmp_dir / 'tables' / f"view_{name}.arrow")
+
+    indexes = {}
+    for name in SNAPSHOT_INDEXES:
+        labels = {}
+        for key, value in getattr(store, name).state().items():
+            file_name = f"{name}.{key}"
+            if isinstance(value, np.ndarray):
+                np.save(tmp_dir / 'arrays' / f"{file_name}.npy", value)
+                labels[key] = {'array': file_name}
+            elif isinstance(value, pd.DataFrame):
+                _write_arrow(value, tmp_dir / 'tables' / f"{file_name}.arrow")
+                labels[key] = {'table': file_name}
+            else:
+                labels[key] = {'value': value}
+        indexes[name] = labels
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'source_mtime': _source_mtime(store.tables_dir) if store.tables_dir else None,
+        'metadata': {name: getattr(store, name) for name in SNAPSHOT_METADATA},
+        'indexes': indexes,
+    }
+    with open(tmp_dir / 'manifest.json', 'w') as f:
+        json.dump(manifest, f)
+
+    old_dir = out_dir.with_name(f"{out_dir.name}.old-{os.getpid()}")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if out_dir.exists():
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir / 'manifest.json'
+
+
+def read_manifest(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[Dict]:
+    """Manifest of a snapshot, or None when there is no readable snapshot"""
+    try:
+        with open(Path(snapshot_dir) / 'manifest.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_available(snapshot_dir: str = SNAPSHOT_DIR, tables_dir: str = TABLES_DIR) -> bool:
+    """
+    Whether a usable snapshot exists
+
+    A snapshot is unusable when its format is outdated or when the table
+    files were rebuilt after it was written.
+    """
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        return False
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        print(f"Ignoring snapshot in {snapshot_dir}: format {manifest.get('format')} is outdated")
+        return False
+
+    tables_mtime = _source_mtime(tables_dir)
+    if manifest.get('source_mtime') and tables_mtime and tables_mtime > manifest['source_mtime']:
+        print(f"Ignoring snapshot in {snapshot_dir}: the tables in {tables_dir} are newer")
+        return False
+    return True
+
+
+def prepare_shared_snapshot(
+    snapshot_dir: str,
+    tables_dir: str,
+    build_store: Callable[[], "DataStore"]
+) -> bool:
+    """
+    Make sure a usable snapshot exists, writing it from one process only
+
+    Workers starting together serialize on a lock file next to the
+    snapshot; the first one builds the store and writes the snapshot, the
+    others find it ready once they get the lock.
+
+    Args:
+        snapshot_dir: Shared snapshot directory
+        tables_dir: Directory of the normalized tables the snapshot derives from
+        build_store: Callable returning a freshly loaded DataStore
+
+    Returns:
+        True when this process wrote the snapshot
+    """
+    out_dir = Path(snapshot_dir)
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_dir.with_name(out_dir.name + '.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if snapshot_available(snapshot_dir, tables_dir):
+                return False
+            write_snapshot(build_store(), snapshot_dir)
+            return True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_snapshot(snapshot_dir: str = SNAPSHOT_DIR) -> Dict:
+    """
+    Map a snapshot's prepared state
+
+    Returns:
+        Dictionary with 'tables' (raw tables by name) and 'views' (DataStore
+        property values by property name)
+    """
+    root = Path(snapshot_dir)
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot manifest in {snapshot_dir}")
+
+    tables = {name: _read_arrow(root / 'tables' / f"{name}.arrow") for name in DATA_TABLES}
+    views = {name: _read_arrow(root / 'tables' / f"view_{name}.arrow") for name in SNAPSHOT_VIEWS}
+    views.update(manifest['metadata'])
+
+    for name, labels in manifest['indexes'].items():
+        state = {}
+        for key, entry in labels.items():
+            if 'array' in entry:
+                state[key] = np.load(root / 'arrays' / f"{entry['array']}.npy", mmap_mode='r')
+            elif 'table' in entry:
+                state[key] = _read_arrow(root / 'tables' / f"{entry['table']}.arrow")
+            else:
+                state[key] = entry['value']
+        views[name] = SNAPSHOT_INDEXES[name].from_state(state)
+
+    return {'tables': tables, 'views': views}
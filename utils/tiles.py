@@ -0,0 +1,181 @@
+"""
+Local basemap tiles for the Chemical Space Explorer Python Shiny App
+
+By default the selection map loads OpenStreetMap tiles from the internet.
+With a local tile store the tiles are served by the app itself, from a
+route mounted next to the Shiny app, so the tiles need no internet access
+and tile latency is local-disk latency. The map's scripts and stylesheets
+are vendored separately (utils/assets.py).
+
+Two store layouts are supported:
+    MBTiles file          SQLite database in the MBTiles layout (TMS rows)
+    directory pyramid     <z>/<x>/<y>.png (or .jpg, .webp), XYZ rows
+
+The store is taken from CS_EXPLORER_TILES, or from data/tiles.mbtiles or
+data/tiles/ when one of them exists. A pyramid of the low zoom levels of
+the world map is enough; Leaflet scales the deepest zoom level it finds
+up beyond it.
+"""
+
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+# Path of an MBTiles file or a directory pyramid
+TILES_ENV = "CS_EXPLORER_TILES"
+
+# Stores used when CS_EXPLORER_TILES is not set, in order of preference
+DEFAULT_TILE_PATHS = ("./data/tiles.mbtiles", "./data/tiles")
+
+# URL prefix the tile route is mounted at, relative to the app
+TILES_URL = "tiles"
+
+# Tiles of a store do not change while the app runs
+TILE_CACHE_CONTROL = "public, max-age=2592000, immutable"
+
+TILE_MEDIA_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+}
+
+# Attribution shown on the map when the store does not provide one
+DEFAULT_ATTRIBUTION = '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+
+
+class TileStore(ABC):
+    """Read-only store of basemap tiles addressed in the XYZ scheme"""
+
+    tile_format: str = 'png'
+    min_zoom: int = 0
+    max_zoom: int = 0
+    attribution: str = DEFAULT_ATTRIBUTION
+
+    @abstractmethod
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """Image of a tile, or None when the store does not hold it"""
+
+    @property
+    def media_type(self) -> str:
+        return TILE_MEDIA_TYPES.get(self.tile_format, 'application/octet-stream')
+
+
+class MBTilesStore(TileStore):
+    """
+    Tiles of an MBTiles file
+
+    The file is opened read-only and shared by the request threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        metadata = dict(self._connection.execute("SELECT name, value FROM metadata").fetchall())
+        self.tile_format = metadata.get('format', 'png')
+        self.attribution = metadata.get('attribution', DEFAULT_ATTRIBUTION)
+        min_zoom, max_zoom = self._connection.execute("SELECT MIN(zoom_level), MAX(zoom_level) FROM tiles").fetchone()
+        self.min_zoom = int(metadata.get('minzoom', min_zoom or 0))
+        self.max_zoom = int(metadata.get('maxzoom', max_zoom or 0))
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        # MBTiles rows count from the bottom of the map (TMS)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, (1 << z) - 1 - y)
+            ).fetchone()
+        return row[0] if row else None
+
+
+class DirectoryTileStore(TileStore):
+    """Tiles of a <z>/<x>/<y>.<format> directory pyramid"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        zooms = sorted(int(entry.name) for entry in self.path.iterdir() if entry.is_dir() and entry.name.isdigit())
+        if not zooms:
+            raise ValueError(f"No zoom level directories in {path}")
+        self.min_zoom, self.max_zoom = zooms[0], zooms[-1]
+
+        sample = next((tile for tile in (self.path / str(zooms[0])).glob('*/*.*')), None)
+        if sample is not None:
+            self.tile_format = sample.suffix.lstrip('.').lower()
+
+    def get(self, z: int, x: int, y: int) -> Optional[bytes]:
+        try:
+            return (self.path / str(z) / str(x) / f"{y}.{self.tile_format}").read_bytes()
+        except OSError:
+            return None
+
+
+def open_tile_store(path: str) -> TileStore:
+    """Tile store of an MBTiles file or a directory pyramid"""
+    if Path(path).is_dir():
+        return DirectoryTileStore(path)
+    return MBTilesStore(path)
+
+
+@lru_cache(maxsize=1)
+def get_tile_store() -> Optional[TileStore]:
+    """
+    Return the process-wide tile store
+
+    Returns:
+        The store named by CS_EXPLORER_TILES or found at DEFAULT_TILE_PATHS,
+        or None to use the online OpenStreetMap tiles
+    """
+    path = os.environ.get(TILES_ENV) or next((p for p in DEFAULT_TILE_PATHS if Path(p).exists()), None)
+    if not path:
+        return None
+    try:
+        return open_tile_store(path)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error opening tile store {path}, using online tiles: {e}")
+        return None
+
+
+def tile_layer_options() -> Optional[Dict]:
+    """
+    folium.TileLayer arguments for the local tile store
+
+    Returns:
+        Dictionary with tiles (URL template), attr, min_zoom and
+        max_native_zoom, or None when there is no local store
+    """
+    store = get_tile_store()
+    if store is None:
+        return None
+    return {
+        'tiles': TILES_URL + "/{z}/{x}/{y}",
+        'attr': store.attribution,
+        'min_zoom': store.min_zoom,
+        'max_native_zoom': store.max_zoom,
+    }
+
+
+def create_tile_app(store: TileStore) -> Starlette:
+    """
+    ASGI app serving a store's tiles at /{z}/{x}/{y}
+
+    Tiles are sent with long-lived cache headers; missing tiles are 404s.
+    """
+    def tile(request: Request) -> Response:
+        params = request.path_params
+        data = store.get(params['z'], params['x'], params['y'])
+        if data is None:
+            return Response(status_code=404)
+        return Response(data, media_type=store.media_type, headers={'Cache-Control': TILE_CACHE_CONTROL})
+
+    return Starlette(routes=[Route("/{z:int}/{x:int}/{y:int}", tile)])
@@ -0,0 +1,324 @@
+"""
+TopoJSON boundaries for the selection map of the Chemical Space Explorer
+
+The build step (python -m utils.build topology) converts the country
+boundaries into one quantized TopoJSON file per simplification tier:
+
+- borders shared by neighbouring countries are stored once, as arcs that
+  both countries reference;
+- arcs are simplified once, so neighbours stay seamless at every tier;
+- coordinates are integers on a grid of the tier's precision, and every
+  point after the first of an arc is stored as a delta to the previous one.
+
+The files are served from www/boundaries/ and decoded in the browser by
+www/topojson_feature.js, so the map HTML only carries the countries'
+properties.
+
+The same step writes the GeoJSON the Plotly choropleths are drawn with
+(geojson= and featureidkey), so plotly.js does not download its world map
+from a CDN. Everything in www/boundaries/ is served by create_boundaries_app
+with long-lived cache headers, under URLs that carry the file's digest.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.staticfiles import StaticFiles
+
+from utils.geometry import BOUNDARIES_PATH, SIMPLIFY_TIERS, country_shapes, read_boundary_store, simplify_geometries
+
+TOPOLOGY_DIR = "./www/boundaries"
+
+# URL of TOPOLOGY_DIR relative to the app (it lies in the static assets)
+TOPOLOGY_URL = "boundaries"
+
+# Script decoding the topologies in the browser (topojson.feature), served
+# from the static assets
+TOPOLOGY_DECODER_URL = "topojson_feature.js"
+
+# Name of the countries GeometryCollection in every topology
+TOPOLOGY_OBJECT = "countries"
+
+# Coordinates are snapped to this many decimals before borders are matched
+SNAP_DECIMALS = 7
+
+# GeoJSON of the Plotly choropleths, close to plotly's own 1:110m world map
+CHOROPLETH_GEOJSON = "countries.geo.json"
+CHOROPLETH_TIER = 'continental'
+
+# Files are addressed by digest (see boundaries_url), so they never change
+BOUNDARIES_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+Point = Tuple[float, float]
+
+
+def _polygon_rings(geometry) -> List[List[List[Point]]]:
+    # Rings of every polygon (exterior first), without the closing point
+    polygons = geometry.geoms if geometry.geom_type == 'MultiPolygon' else [geometry]
+    return [
+        [
+            list(map(tuple, np.round(np.asarray(ring.coords)[:-1, :2], SNAP_DECIMALS).tolist()))
+            for ring in (polygon.exterior, *polygon.interiors)
+        ]
+        for polygon in polygons
+    ]
+
+
+def _junctions(rings: List[List[Point]]) -> set:
+    # Points where a ring meets a different neighbour than elsewhere: the
+    # ends of shared borders. Borders shared by two rings run through the
+    # same points with the same neighbours (in opposite directions).
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        for i, point in enumerate(ring):
+            pair = frozenset((ring[i - 1], ring[(i + 1) % len(ring)]))
+            if neighbours.setdefault(point, pair) != pair:
+                junctions.add(point)
+    return junctions
+
+
+class _ArcIndex:
+    # Deduplicated arcs; an arc found reversed is referenced as ~index
+
+    def __init__(self):
+        self.arcs: List[List[Point]] = []
+        self._lookup: Dict[Tuple[Point, ...], int] = {}
+
+    def add(self, points: List[Point]) -> int:
+        key = tuple(points)
+        if key in self._lookup:
+            return self._lookup[key]
+        if key[::-1] in self._lookup:
+            return ~self._lookup[key[::-1]]
+        self._lookup[key] = len(self.arcs)
+        self.arcs.append(points)
+        return self._lookup[key]
+
+    def add_ring(self, ring: List[Point], junctions: set) -> List[int]:
+        """Split a ring at its junctions and return its arc references"""
+        cuts = [i for i, point in enumerate(ring) if point in junctions]
+        if not cuts:
+            # Closed arc, started at its smallest point so that a ring
+            # shared whole (e.g. an enclave) is found in either direction
+            start = min(range(len(ring)), key=ring.__getitem__)
+            rotated = ring[start:] + ring[:start]
+            return [self.add(rotated + rotated[:1])]
+
+        rotated = ring[cuts[0]:] + ring[:cuts[0]]
+        closed = rotated + rotated[:1]
+        starts = [i - cuts[0] for i in cuts]
+        ends = starts[1:] + [len(ring)]
+        return [self.add(closed[start:end + 1]) for start, end in zip(starts, ends)]
+
+
+def _quantize(coords: np.ndarray, translate: np.ndarray, scale: float) -> np.ndarray:
+    # Grid coordinates of an arc, without repeated points
+    grid = np.round((coords - translate) / scale).astype(np.int64)
+    keep = np.r_[True, np.any(np.diff(grid, axis=0) != 0, axis=1)]
+    grid = grid[keep]
+    return grid if len(grid) > 1 else np.vstack([grid, grid])
+
+
+def _ring_area(arc_refs: List[int], arcs: List[np.ndarray]) -> float:
+    # Shoelace area of a ring assembled from its (grid) arcs
+    parts = [arcs[ref] if ref >= 0 else arcs[~ref][::-1] for ref in arc_refs]
+    coords = np.vstack([parts[0]] + [part[1:] for part in parts[1:]]).astype(float)
+    x, y = coords[:, 0], coords[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def build_topologies(
+    shapes: gpd.GeoDataFrame,
+    tiers: Dict[str, Tuple[float, int]] = SIMPLIFY_TIERS
+) -> Dict[str, Dict]:
+    """
+    Quantized TopoJSON topologies of country shapes, one per tier
+
+    Each tier simplifies the shared arcs with its tolerance and quantizes
+    them to its coordinate decimals. A country whose shape would collapse
+    at a tier keeps its arcs unsimplified there.
+
+    Args:
+        shapes: Country shapes in EPSG:4326 with an iso2c column (see
+            geometry.country_shapes)
+        tiers: (tolerance in degrees, coordinate decimals) per tier name
+
+    Returns:
+        TopoJSON dictionary per tier name; geometries carry the ISO-2 code
+        as their id
+    """
+    polygons = {iso: _polygon_rings(geometry) for iso, geometry in zip(shapes['iso2c'], shapes.geometry)}
+    junctions = _junctions([ring for rings in polygons.values() for polygon in rings for ring in polygon])
+
+    index = _ArcIndex()
+    arc_refs = {
+        iso: [[index.add_ring(ring, junctions) for ring in polygon] for polygon in rings]
+        for iso, rings in polygons.items()
+    }
+    original = [np.asarray(arc) for arc in index.arcs]
+    lines = shapely.linestrings(np.vstack(original), indices=np.repeat(np.arange(len(original)), [len(arc) for arc in original]))
+
+    bounds = shapes.total_bounds
+    translate = bounds[:2]
+    topologies = {}
+    for tier, (tolerance, decimals) in tiers.items():
+        scale = 10.0 ** -decimals
+        simplified = shapely.simplify(lines, tolerance, preserve_topology=True)
+        arcs = [_quantize(shapely.get_coordinates(line), translate, scale) for line in simplified]
+
+        for iso, rings in arc_refs.items():
+            if all(_ring_area(polygon[0], arcs) == 0 for polygon in rings):
+                for ref in {ref if ref >= 0 else ~ref for polygon in rings for ring in polygon for ref in ring}:
+                    arcs[ref] = _quantize(original[ref], translate, scale)
+
+        topologies[tier] = {
+            'type': 'Topology',
+            'bbox': [round(float(value), SNAP_DECIMALS) for value in bounds],
+            'transform': {'scale': [scale, scale], 'translate': [float(value) for value in translate]},
+            'objects': {
+                TOPOLOGY_OBJECT: {
+                    'type': 'GeometryCollection',
+                    'geometries': [
+                        {'type': 'Polygon', 'id': iso, 'arcs': rings[0]} if len(rings) == 1
+                        else {'type': 'MultiPolygon', 'id': iso, 'arcs': rings}
+                        for iso, rings in arc_refs.items()
+                    ]
+                }
+            },
+            'arcs': [np.vstack([arc[:1], np.diff(arc, axis=0)]).tolist() for arc in arcs],
+        }
+    return topologies
+
+
+def _read_shapes(boundaries_path: str, tiers: Dict[str, Tuple[float, int]]) -> Tuple[gpd.GeoDataFrame, Dict[str, np.ndarray]]:
+    # Country shapes of the boundary store or of a GeoJSON file, with the
+    # store's simplified shapes of the given tiers
+    if boundaries_path.endswith('.parquet'):
+        return read_boundary_store(boundaries_path, tiers=tiers)
+    return country_shapes(gpd.read_file(boundaries_path).to_crs("EPSG:4326")), {}
+
+
+def write_topologies(
+    boundaries_path: str = BOUNDARIES_PATH,
+    out_dir: str = TOPOLOGY_DIR,
+    tiers: Dict[str, Tuple[float, int]] = SIMPLIFY_TIERS
+) -> Dict[str, Path]:
+    """
+    Build step: write the quantized TopoJSON boundaries of every tier
+
+    Args:
+        boundaries_path: Boundary store (see geometry.write_boundary_store)
+            or a boundaries file readable by geopandas
+        out_dir: Output directory (served as TOPOLOGY_URL)
+        tiers: (tolerance in degrees, coordinate decimals) per tier name
+
+    Returns:
+        Dictionary mapping tier names to written file paths
+    """
+    shapes, _ = _read_shapes(boundaries_path, tiers={})
+    out_path = Path(out_dir)
+    out_path.mkdir(parents=True, exist_ok=True)
+
+    paths = {}
+    for tier, topology in build_topologies(shapes, tiers).items():
+        paths[tier] = out_path / f"{tier}.topo.json"
+        with open(paths[tier], 'w') as f:
+            json.dump(topology, f, separators=(',', ':'))
+    return paths
+
+
+def write_choropleth_geojson(
+    boundaries_path: str = BOUNDARIES_PATH,
+    out_dir: str = TOPOLOGY_DIR,
+    tier: str = CHOROPLETH_TIER
+) -> Path:
+    """
+    Build step: write the country shapes of the Plotly choropleths
+
+    Features carry their iso2c and iso3c codes as properties (for
+    featureidkey). Rings are wound clockwise, as plotly.js (d3-geo) expects
+    of the exterior of a polygon.
+
+    Args:
+        boundaries_path: Boundary store (see geometry.write_boundary_store)
+            or a boundaries file readable by geopandas
+        out_dir: Output directory (served as TOPOLOGY_URL)
+        tier: Simplification tier of the shapes
+
+    Returns:
+        Path of the written file
+    """
+    shapes, simplified = _read_shapes(boundaries_path, tiers={tier: SIMPLIFY_TIERS[tier]})
+    geometries = simplified.get(tier)
+    if geometries is None:
+        geometries = simplify_geometries(shapes.geometry.values.to_numpy(), *SIMPLIFY_TIERS[tier])
+    geometries = shapely.orient_polygons(geometries, exterior_cw=True)
+
+    iso3_codes = shapes['iso3c'] if 'iso3c' in shapes.columns else [None] * len(shapes)
+    features = [
+        f'{{"type":"Feature","properties":{json.dumps({"iso2c": iso2, "iso3c": iso3})},"geometry":{geometry}}}'
+        for iso2, iso3, geometry in zip(shapes['iso2c'], iso3_codes, shapely.to_geojson(geometries))
+    ]
+    out_path = Path(out_dir) / CHOROPLETH_GEOJSON
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text('{"type":"FeatureCollection","features":[' + ','.join(features) + ']}')
+    return out_path
+
+
+@lru_cache(maxsize=32)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    # Keyed by modification time and size, so a rebuilt file is hashed again
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:12]
+
+
+def boundaries_url(filename: str, topology_dir: str = TOPOLOGY_DIR) -> Optional[str]:
+    """
+    Versioned URL of a file in the boundaries directory
+
+    Returns:
+        URL relative to the app, with the file's digest as query string so
+        browsers may cache it for good, or None when the file was not built
+    """
+    path = Path(topology_dir) / filename
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return f"{TOPOLOGY_URL}/{filename}?v={_file_digest(str(path), stat.st_mtime_ns, stat.st_size)}"
+
+
+def topology_url(tier: str, topology_dir: str = TOPOLOGY_DIR) -> Optional[str]:
+    """URL of a tier's TopoJSON boundaries, or None when they were not built"""
+    return boundaries_url(f"{tier}.topo.json", topology_dir)
+
+
+def choropleth_geojson_url(topology_dir: str = TOPOLOGY_DIR) -> Optional[str]:
+    """URL of the choropleth GeoJSON, or None when it was not built"""
+    return boundaries_url(CHOROPLETH_GEOJSON, topology_dir)
+
+
+class _ImmutableStaticFiles(StaticFiles):
+    # Static files sent with BOUNDARIES_CACHE_CONTROL
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers['Cache-Control'] = BOUNDARIES_CACHE_CONTROL
+        return response
+
+
+def create_boundaries_app(topology_dir: str = TOPOLOGY_DIR):
+    """
+    ASGI app serving the boundaries directory
+
+    Files are gzip-compressed and sent with long-lived cache headers; they
+    are requested under the versioned URLs of boundaries_url.
+    """
+    return GZipMiddleware(_ImmutableStaticFiles(directory=topology_dir), minimum_size=1024)
@@ -0,0 +1,32 @@
+// Applies the "map_selection" messages sent by the server to the country
+// map, restyling only the countries whose selection changed. The map is
+// not rendered again, so it keeps its pan and zoom.
+(function () {
+    function applyUpdates(frame, updates) {
+        var countryMap = frame.contentWindow && frame.contentWindow.countryMap;
+        if (countryMap) {
+            countryMap.update(updates);
+        } else {
+            // Map still loading: apply once its scripts have run
+            frame.addEventListener('load', function () {
+                if (frame.contentWindow.countryMap) {
+                    frame.contentWindow.countryMap.update(updates);
+                }
+            }, {once: true});
+        }
+    }
+
+    function register() {
+        Shiny.addCustomMessageHandler('map_selection', function (message) {
+            document.querySelectorAll('#map_output iframe').forEach(function (frame) {
+                applyUpdates(frame, message.updates);
+            });
+        });
+    }
+
+    if (window.Shiny && window.Shiny.addCustomMessageHandler) {
+        register();
+    } else {
+        document.addEventListener('DOMContentLoaded', register);
+    }
+})();
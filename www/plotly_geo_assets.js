@@ -0,0 +1,13 @@
+// The choropleths draw countries from the app's own GeoJSON (geojson= and
+// featureidkey) with plotly's base layers turned off, so plotly.js never
+// needs its world topojson. It still loads one for every geo subplot unless
+// it is already registered; empty ones keep it from fetching cdn.plot.ly.
+(function () {
+    var assets = window.PlotlyGeoAssets = window.PlotlyGeoAssets || {topojson: {}};
+    assets.topojson = assets.topojson || {};
+    ['world_110m', 'world_50m'].forEach(function (name) {
+        if (assets.topojson[name] === undefined) {
+            assets.topojson[name] = {type: 'Topology', objects: {}, arcs: []};
+        }
+    });
+})();
@@ -0,0 +1,76 @@
+// Decodes the TopoJSON boundaries of the selection map (utils/topology.py)
+// into GeoJSON, in place of topojson-client: topojson.feature(topology, object)
+// for the quantized, delta-encoded Polygon and MultiPolygon geometries the
+// build step writes.
+(function (global) {
+    function decodeArcs(topology) {
+        var transform = topology.transform;
+        return topology.arcs.map(function (arc) {
+            var x = 0, y = 0;
+            return arc.map(function (position) {
+                if (!transform) {
+                    return position.slice(0, 2);
+                }
+                x += position[0];
+                y += position[1];
+                return [
+                    x * transform.scale[0] + transform.translate[0],
+                    y * transform.scale[1] + transform.translate[1]
+                ];
+            });
+        });
+    }
+
+    function feature(topology, object) {
+        var arcs = decodeArcs(topology);
+
+        // Ring assembled from its arcs; negative references are reversed
+        // arcs, and consecutive arcs share their end point
+        function ring(refs) {
+            var points = [];
+            refs.forEach(function (ref) {
+                var arc = arcs[ref < 0 ? ~ref : ref];
+                if (ref < 0) {
+                    arc = arc.slice().reverse();
+                }
+                if (points.length) {
+                    points.pop();
+                }
+                points.push.apply(points, arc);
+            });
+            while (points.length < 4) {
+                points.push(points[0]);
+            }
+            return points;
+        }
+
+        function polygon(rings) {
+            return rings.map(ring);
+        }
+
+        function geometry(o) {
+            if (o.type === 'Polygon') {
+                return {type: 'Polygon', coordinates: polygon(o.arcs)};
+            }
+            if (o.type === 'MultiPolygon') {
+                return {type: 'MultiPolygon', coordinates: o.arcs.map(polygon)};
+            }
+            return null;
+        }
+
+        function toFeature(o) {
+            var result = {type: 'Feature', properties: o.properties || {}, geometry: geometry(o)};
+            if (o.id != null) {
+                result.id = o.id;
+            }
+            return result;
+        }
+
+        if (object.type === 'GeometryCollection') {
+            return {type: 'FeatureCollection', features: object.geometries.map(toFeature)};
+        }
+        return toFeature(object);
+    }
+
+    global.topojson = {feature: feature};
+})(this);